@@ -0,0 +1,96 @@
+"""
+Rows per second of the file cleaning before and after the fused pass.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_cleaning --sizes 10000 100000 1000000
+"""
+
+import time
+import argparse
+from datetime import datetime
+
+import pandas as pd
+
+from util_funcs.synthetic import make_customers
+from util_funcs.pre_process import (
+    bins,
+    labels,
+    spend_cols,
+    marital_status,
+    clean_file_data,
+    education_level,
+    categorical_ftrs,
+    redundant_features,
+)
+
+
+def legacy_clean_file_data(df):
+    """The multi-pass cleaning the fused pass replaced, kept for timing"""
+    df['Year_Birth'] = pd.to_datetime(df['Year_Birth'], format='%Y')
+    df["Dt_Customer"] = pd.to_datetime(df["Dt_Customer"])
+    df['Age'] = 2014 - df['Year_Birth'].dt.year
+    df['Age_Group'] = pd.cut(df['Age'], bins=bins, labels=labels, right=False)
+    end_fiscal = datetime(2014, 6, 30)
+    df['Tenure'] = (end_fiscal - df['Dt_Customer']).dt.days
+    df['Tenure'] = (df['Tenure'] / 30.44).round(1)
+    df['Spending'] = df[spend_cols].sum(axis=1)
+    df['Marital_Status'] = df['Marital_Status'].replace(marital_status)
+    df['Education'] = df['Education'].replace(education_level)
+    df['Children'] = df['Kidhome'] + df['Teenhome']
+    df['Income'] = df['Income'].fillna(df['Income'].mean())
+    df[categorical_ftrs] = df[categorical_ftrs].astype('category')
+    for col in redundant_features:
+        if col in df.columns:
+            df = df.drop(col, axis=1)
+    return df
+
+
+def best_time(func, df, repeats):
+    """Fastest of several runs, each on a fresh copy of the input"""
+    timings = []
+    for _ in range(repeats):
+        data = df.copy()
+        start = time.perf_counter()
+        func(data)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def mismatched_columns(before, after):
+    """Columns whose values differ between the two cleaning functions"""
+    return [
+        col
+        for col in before.columns
+        if not before[col].astype(object).equals(after[col].astype(object))
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument(
+        '--sizes', type=int, nargs='+', default=[10_000, 100_000, 1_000_000]
+    )
+    parser.add_argument('--repeats', type=int, default=3)
+    args = parser.parse_args()
+
+    header = ['rows', 'before rows/s', 'after rows/s', 'speedup']
+    print(f"{header[0]:>10} {header[1]:>15} {header[2]:>15} {header[3]:>8}")
+    for n_rows in args.sizes:
+        df = make_customers(n_rows)
+        before = best_time(legacy_clean_file_data, df, args.repeats)
+        after = best_time(clean_file_data, df, args.repeats)
+        print(
+            f"{n_rows:>10} {n_rows / before:>15,.0f} {n_rows / after:>15,.0f}"
+            f" {before / after:>7.1f}x"
+        )
+
+        mismatches = mismatched_columns(
+            legacy_clean_file_data(df.copy()), clean_file_data(df)
+        )
+        if mismatches:
+            print(f"{'':>10} values differ in: {', '.join(mismatches)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+"""
+Throughput, latency and parity of the flattened tree models.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_flat_trees --rows 100000 --repeats 2000
+"""
+
+import time
+import argparse
+
+import numpy as np
+
+from util_funcs.encoder import encode, get_encoder
+from util_funcs.registry import get_registry
+from util_funcs.synthetic import make_customers
+from util_funcs.flat_trees import get_flat_forest
+from util_funcs.pre_process import clean_file_data
+
+TREE_MODELS = ['dtc', 'rfc', 'gbc', 'xgb']
+
+
+def rows_per_second(func, X):
+    start = time.perf_counter()
+    func(X)
+    return len(X) / (time.perf_counter() - start)
+
+
+def single_row_p50(func, X, repeats):
+    """Median latency of one-row calls in microseconds"""
+    timings = np.empty(repeats)
+    for i in range(repeats):
+        row = X[i % len(X) : i % len(X) + 1]
+        start = time.perf_counter()
+        func(row)
+        timings[i] = time.perf_counter() - start
+    return np.median(timings) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--models', nargs='+', default=TREE_MODELS)
+    parser.add_argument('--rows', type=int, default=100_000)
+    parser.add_argument('--repeats', type=int, default=2000)
+    args = parser.parse_args()
+
+    registry = get_registry()
+    df_clean = clean_file_data(make_customers(args.rows))
+
+    print(
+        f"{'model':<6} {'rows/s':>12} {'flat rows/s':>12} {'p50 us':>8}"
+        f" {'flat p50':>9} {'max |dp|':>10} {'label diffs':>12}"
+    )
+    for name in args.models:
+        model = registry.get(name)
+        _, estimator = get_encoder(model)
+        forest = get_flat_forest(model)
+        X = encode(model, df_clean)
+
+        proba_diff = np.abs(
+            estimator.predict_proba(X) - forest.predict_proba(X)
+        ).max()
+        label_diffs = np.count_nonzero(
+            estimator.predict(X) != forest.predict(X)
+        )
+        print(
+            f"{name:<6}"
+            f" {rows_per_second(estimator.predict, X):>12,.0f}"
+            f" {rows_per_second(forest.predict, X):>12,.0f}"
+            f" {single_row_p50(estimator.predict, X, args.repeats):>8.1f}"
+            f" {single_row_p50(forest.predict, X, args.repeats):>9.1f}"
+            f" {proba_diff:>10.2e} {label_diffs:>12}"
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+"""
+Time spent in each scoring stage and the gain of the sharded process pool.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_scoring_pool --rows 400000 --workers 2 4 8
+
+Only prediction is sharded across the pool, cleaning and encoding stay in
+the calling process, which needs the cleaned frame and the encoded rows
+for the prediction cache. The table shows how much of a batch each stage
+takes and how much faster the pool predicts than the estimator alone.
+"""
+
+import os
+import argparse
+
+import numpy as np
+
+from benchmarks.suite import best_time
+from util_funcs.encoder import encode, get_encoder
+from util_funcs.parallel import ScoringEngine
+from util_funcs.registry import get_registry
+from util_funcs.synthetic import make_customers
+from util_funcs.pre_process import clean_file_data
+
+
+def pool_predict_time(model_name, workers, X, expected, args):
+    """Fastest sharded prediction of X by a pool of ``workers``"""
+    engine = ScoringEngine(model_name, workers=workers)
+    # start the workers and load the model before timing
+    engine.predict_encoded(X[: workers * engine.shard_size])
+    pool_s, predictions = best_time(
+        engine.predict_encoded, X, repeats=args.repeats
+    )
+    engine.shutdown()
+    assert np.array_equal(predictions, expected)
+    return pool_s
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--model', default='xgb')
+    parser.add_argument('--rows', type=int, default=400_000)
+    parser.add_argument(
+        '--workers', nargs='+', type=int, default=[2, os.cpu_count() or 1]
+    )
+    parser.add_argument('--repeats', type=int, default=3)
+    args = parser.parse_args()
+
+    df = make_customers(args.rows)
+    model = get_registry().get(args.model)
+    _, estimator = get_encoder(model)
+    clean_s, df_clean = best_time(
+        lambda: clean_file_data(df.copy()), repeats=args.repeats
+    )
+    encode_s, X = best_time(encode, model, df_clean, repeats=args.repeats)
+    predict_s, expected = best_time(estimator.predict, X, repeats=args.repeats)
+    total_s = clean_s + encode_s + predict_s
+    print(
+        f"{args.rows:,} rows on {os.cpu_count()} CPUs: clean {clean_s:.2f}s, "
+        f"encode {encode_s:.2f}s, predict {predict_s:.2f}s "
+        f"({predict_s / total_s:.0%} of the batch)"
+    )
+
+    print(f"{'workers':>7} {'predict s':>10} {'speedup':>8} {'batch s':>8}")
+    print(f"{1:>7} {predict_s:>10.2f} {1:>8.2f} {total_s:>8.2f}")
+    for workers in sorted(set(args.workers) - {1}):
+        pool_s = pool_predict_time(args.model, workers, X, expected, args)
+        print(
+            f"{workers:>7} {pool_s:>10.2f} {predict_s / pool_s:>8.2f} "
+            f"{clean_s + encode_s + pool_s:>8.2f}"
+        )
+
+
+if __name__ == '__main__':
+    main()
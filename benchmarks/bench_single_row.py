@@ -0,0 +1,92 @@
+"""
+Latency of a single profile-page prediction, DataFrame path vs fast path.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_single_row --model dtc --repeats 2000
+"""
+
+import time
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from util_funcs.encoder import encode, predict, get_encoder, predict_record
+from util_funcs.registry import get_registry
+from util_funcs.synthetic import make_customers
+from util_funcs.pre_process import (
+    DATE_FORMAT,
+    clean_form_data,
+    clean_form_record,
+)
+
+
+def form_records(n_records, seed=0):
+    """Customer records shaped like the ones the profile form builds"""
+    df = make_customers(n_records, seed=seed).drop(
+        columns=['Z_CostContact', 'Z_Revenue', 'Response']
+    )
+    df['Dt_Customer'] = pd.to_datetime(df['Dt_Customer'], format=DATE_FORMAT)
+    df['Dt_Customer'] = df['Dt_Customer'].dt.date
+    df['Income'] = df['Income'].fillna(0.0)
+    return df.to_dict('records')
+
+
+def frame_path(model, record):
+    df_clean = clean_form_data(pd.DataFrame([record]))
+    return predict(model, df_clean)[0]
+
+
+def fast_path(model, record):
+    return predict_record(model, clean_form_record(record))
+
+
+def latencies(func, model, records, repeats):
+    """Per-call latencies in microseconds, cycling through the records"""
+    timings = np.empty(repeats)
+    for i in range(repeats):
+        record = records[i % len(records)]
+        start = time.perf_counter()
+        func(model, record)
+        timings[i] = time.perf_counter() - start
+    return timings * 1e6
+
+
+def check_parity(model, records):
+    """Number of records whose encoded features differ between the paths"""
+    encoder, _ = get_encoder(model)
+    mismatches = 0
+    for record in records:
+        frame = encode(model, clean_form_data(pd.DataFrame([record])))
+        fast = encoder.transform_record(clean_form_record(record))
+        if not np.array_equal(frame, fast, equal_nan=True):
+            mismatches += 1
+    return mismatches
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--model', default='dtc')
+    parser.add_argument('--repeats', type=int, default=2000)
+    args = parser.parse_args()
+
+    model = get_registry().get(args.model)
+    records = form_records(200)
+
+    # warm up caches and lazy imports before timing
+    for record in records[:20]:
+        frame_path(model, record)
+        fast_path(model, record)
+
+    print(f"{'path':<10} {'p50 us':>10} {'p99 us':>10}")
+    for name, func in [('frame', frame_path), ('fast', fast_path)]:
+        timings = latencies(func, model, records, args.repeats)
+        p50, p99 = np.percentile(timings, [50, 99])
+        print(f"{name:<10} {p50:>10.1f} {p99:>10.1f}")
+
+    print(f"feature mismatches: {check_parity(model, records)}/{len(records)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+"""
+Memory and prediction parity of the narrow file dtypes.
+
+Run from the repository root:
+
+    python -m benchmarks.check_dtype_parity --rows 500000
+
+Exits with status 1 when the encoded features or predictions of any model
+differ from reading the file with the default pandas dtypes.
+"""
+
+import io
+import sys
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from util_funcs.encoder import encode, get_encoder
+from util_funcs.readers import input_columns, read_customer_file
+from util_funcs.registry import get_registry
+from util_funcs.synthetic import make_customers
+from util_funcs.pre_process import clean_file_data
+
+
+def megabytes(df):
+    return df.memory_usage(deep=True).sum() / 2**20
+
+
+def print_memory(frames):
+    """Memory of each (label, default frame, narrow frame)"""
+    print(f"{'frame':<8} {'default MB':>11} {'narrow MB':>10} {'ratio':>6}")
+    for label, wide, narrow in frames:
+        before, after = megabytes(wide), megabytes(narrow)
+        print(
+            f"{label:<8} {before:>11.1f} {after:>10.1f}"
+            f" {before / after:>5.1f}x"
+        )
+
+
+def models_match(names, clean_wide, clean_narrow):
+    """Compare the features and predictions of each model, True if equal"""
+    print(f"{'model':<8} {'features':>9} {'predictions':>12}")
+    failed = False
+    registry = get_registry()
+    for name in names or registry.names():
+        model = registry.get(name)
+        _, estimator = get_encoder(model)
+        X_wide = encode(model, clean_wide)
+        X_narrow = encode(model, clean_narrow)
+        same_features = np.array_equal(X_wide, X_narrow, equal_nan=True)
+        n_diffs = np.count_nonzero(
+            estimator.predict(X_wide) != estimator.predict(X_narrow)
+        )
+        failed |= not same_features or n_diffs > 0
+        print(
+            f"{name:<8} {'same' if same_features else 'DIFFER':>9}"
+            f" {n_diffs:>12}"
+        )
+    return not failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--rows', type=int, default=500_000)
+    parser.add_argument('--models', nargs='+', default=None)
+    args = parser.parse_args()
+
+    buffer = io.BytesIO()
+    make_customers(args.rows).to_csv(buffer, index=False)
+
+    buffer.seek(0)
+    df_wide = pd.read_csv(buffer, usecols=input_columns)
+    df_narrow = read_customer_file(buffer, name='customers.csv')
+    clean_wide = clean_file_data(df_wide)
+    clean_narrow = clean_file_data(df_narrow)
+
+    print_memory(
+        [('input', df_wide, df_narrow), ('cleaned', clean_wide, clean_narrow)]
+    )
+    print()
+    if not models_match(args.models, clean_wide, clean_narrow):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+"""
+Sustained throughput and tail latency of the scoring service.
+
+Start the service, then run from the repository root:
+
+    python -m util_funcs.server --model xgb --port 8080 --income-mean 52000
+    python -m benchmarks.load_test --port 8080 --connections 64 --duration 30
+"""
+
+import json
+import time
+import asyncio
+import argparse
+
+import numpy as np
+
+from util_funcs.synthetic import make_customers
+
+
+def request_bodies(n_records, seed=0):
+    """Single-customer JSON bodies with missing values as null"""
+    df = make_customers(n_records, seed=seed)
+    records = df.astype(object).where(df.notna(), None).to_dict('records')
+    return [json.dumps(record).encode() for record in records]
+
+
+async def post(reader, writer, host, body):
+    """Send one prediction request and return the response status line"""
+    writer.write(
+        f"POST /predict HTTP/1.1\r\nHost: {host}\r\n"
+        f"Content-Type: application/json\r\n"
+        f"Content-Length: {len(body)}\r\n\r\n".encode() + body
+    )
+    await writer.drain()
+
+    status_line = await reader.readline()
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b''):
+            break
+        name, _, value = line.decode().partition(':')
+        if name.lower() == 'content-length':
+            length = int(value)
+    await reader.readexactly(length)
+    return status_line
+
+
+async def client(args, bodies, deadline, latencies, errors):
+    """Send requests over one keep-alive connection until the deadline"""
+    reader, writer = await asyncio.open_connection(args.host, args.port)
+    i = 0
+    while time.perf_counter() < deadline:
+        body = bodies[i % len(bodies)]
+        i += 1
+        start = time.perf_counter()
+        status_line = await post(reader, writer, args.host, body)
+        if b' 200 ' in status_line:
+            latencies.append(time.perf_counter() - start)
+        else:
+            errors.append(status_line.decode().strip())
+    writer.close()
+
+
+async def run(args):
+    bodies = request_bodies(1000)
+    latencies, errors = [], []
+
+    # short warm up so model loading and first batches are not measured
+    warm_up = time.perf_counter() + 2
+    await client(args, bodies, warm_up, [], [])
+
+    start = time.perf_counter()
+    deadline = start + args.duration
+    await asyncio.gather(
+        *(
+            client(args, bodies, deadline, latencies, errors)
+            for _ in range(args.connections)
+        )
+    )
+    elapsed = time.perf_counter() - start
+
+    timings = np.array(latencies) * 1000
+    p50, p99, p999 = np.percentile(timings, [50, 99, 99.9])
+    print(f"connections:  {args.connections}")
+    print(f"requests:     {len(latencies)} ok, {len(errors)} failed")
+    print(f"throughput:   {len(latencies) / elapsed:,.0f} req/s")
+    print(f"latency ms:   p50 {p50:.2f}  p99 {p99:.2f}  p99.9 {p999:.2f}")
+    if errors:
+        print(f"first error:  {errors[0]}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--connections', type=int, default=64)
+    parser.add_argument('--duration', type=float, default=30.0)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == '__main__':
+    main()
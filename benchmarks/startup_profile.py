@@ -0,0 +1,128 @@
+"""
+Import times and time-to-first-prediction of a cold app process.
+
+Run from the repository root:
+
+    python -m benchmarks.startup_profile --top 15
+
+Every measurement runs in a fresh interpreter. Exits with status 1 when
+a target is missed: the modules main.py imports on top of streamlit must
+load within --import-target seconds, and a new process must predict its
+first profile within --prediction-target seconds.
+"""
+
+import os
+import sys
+import json
+import argparse
+import subprocess
+
+# what main.py imports on top of streamlit, before any page runs
+APP_MODULES = ['util_funcs.warmup', 'util_funcs.metrics']
+
+# the heavy modules the pages and models need
+HEAVY_MODULES = ['pandas', 'sklearn', 'xgboost', 'util_funcs.pre_process']
+
+FIRST_PREDICTION = """
+import json, time
+start = time.perf_counter()
+from util_funcs.warmup import SAMPLE_RECORD
+from util_funcs.registry import get_registry
+from util_funcs.encoder import predict_record
+from util_funcs.pre_process import clean_form_record
+imported = time.perf_counter()
+model = get_registry().get('dtc')
+loaded = time.perf_counter()
+predict_record(model, clean_form_record(SAMPLE_RECORD))
+done = time.perf_counter()
+print(json.dumps({
+    'imports_s': imported - start,
+    'model_load_s': loaded - imported,
+    'first_predict_s': done - loaded,
+    'total_s': done - start,
+}))
+"""
+
+
+def _run(args, **kwargs):
+    env = dict(os.environ)
+    src = os.path.abspath(os.path.join(os.path.dirname(__file__), '../src'))
+    env['PYTHONPATH'] = os.pathsep.join(
+        filter(None, [src, env.get('PYTHONPATH')])
+    )
+    return subprocess.run(
+        [sys.executable, *args],
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+        **kwargs,
+    )
+
+
+def import_times(modules):
+    """
+    Self and cumulative import seconds of every module loaded by
+    importing ``modules`` in a fresh interpreter, from -X importtime.
+    """
+    code = '; '.join(f'import {module}' for module in modules)
+    stderr = _run(['-X', 'importtime', '-c', code]).stderr
+    times = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:') :].split('|')
+        times[name.strip()] = (int(self_us) / 1e6, int(cumulative_us) / 1e6)
+    return times
+
+
+def print_import_times(title, modules, top):
+    times = import_times(modules)
+    print(f"{title}: {', '.join(modules)}")
+    print(f"  {'module':<45} {'self s':>8} {'cumul. s':>9}")
+    slowest = sorted(times.items(), key=lambda item: -item[1][1])[:top]
+    for name, (self_s, cumulative_s) in slowest:
+        print(f"  {name:<45} {self_s:>8.3f} {cumulative_s:>9.3f}")
+    print()
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--top', type=int, default=15)
+    parser.add_argument('--import-target', type=float, default=0.05)
+    parser.add_argument('--prediction-target', type=float, default=3.0)
+    args = parser.parse_args()
+
+    # cost of the app modules alone, streamlit is loaded first
+    baseline = import_times(['streamlit'])
+    app = print_import_times(
+        'main.py imports', ['streamlit', *APP_MODULES], args.top
+    )
+    app_s = sum(
+        self_s for name, (self_s, _) in app.items() if name not in baseline
+    )
+    print_import_times('deferred imports', HEAVY_MODULES, args.top)
+
+    first = json.loads(_run(['-c', FIRST_PREDICTION]).stdout)
+    print("first prediction in a new process")
+    for key, value in first.items():
+        print(f"  {key:<20} {value:>8.3f}")
+    print()
+
+    missed = []
+    for label, value, target in [
+        ('app imports on top of streamlit', app_s, args.import_target),
+        ('time to first prediction', first['total_s'], args.prediction_target),
+    ]:
+        status = 'ok' if value <= target else 'MISSED'
+        print(f"{label:<35} {value:>7.3f} s  target {target:.3f} s  {status}")
+        if value > target:
+            missed.append(label)
+
+    if missed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,221 @@
+"""
+Scoring benchmark of every shipped model, with regression checks.
+
+Run from the repository root, then compare a later run with the first:
+
+    python -m benchmarks.suite --output baseline.json
+    python -m benchmarks.suite --output current.json --compare baseline.json
+
+Each model runs in a fresh process, so its peak RSS is its own. Compare
+mode exits with status 1 when a metric is worse than the baseline by more
+than the tolerance.
+"""
+
+import sys
+import json
+import time
+import argparse
+import platform
+import resource
+import multiprocessing
+from datetime import datetime, timezone
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from util_funcs.encoder import encode, get_encoder, predict_record
+from util_funcs.registry import get_registry
+from util_funcs.synthetic import make_customers
+from util_funcs.validation import validate_customers
+from util_funcs.pre_process import clean_file_data, clean_form_record
+from benchmarks.bench_single_row import form_records
+
+SIZES = [1_000, 100_000, 1_000_000]
+STAGES = ['validate', 'clean', 'encode', 'predict', 'total']
+
+# total covers the scoring stages only, validation is reported on its own
+# so totals stay comparable with baselines recorded before it existed
+SCORING_STAGES = ['clean', 'encode', 'predict']
+
+# metrics where a larger value is better, the others are costs
+HIGHER_IS_BETTER = {f'{stage}_rows_per_s' for stage in STAGES}
+
+
+def best_time(func, *args, repeats=3):
+    """Fastest of several runs and the result of the last one"""
+    best = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def single_row_latency(model, repeats):
+    """p50 and p99 of the profile page fast path, in microseconds"""
+    records = form_records(200)
+    for record in records[:20]:
+        predict_record(model, clean_form_record(record))
+
+    timings = np.empty(repeats)
+    for i in range(repeats):
+        record = records[i % len(records)]
+        start = time.perf_counter()
+        predict_record(model, clean_form_record(record))
+        timings[i] = time.perf_counter() - start
+    p50, p99 = np.percentile(timings * 1e6, [50, 99])
+    return {'p50_us': p50, 'p99_us': p99}
+
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2**20 if sys.platform == 'darwin' else peak / 2**10
+
+
+def bench_model(name, sizes, repeats, latency_repeats):
+    """Time each scoring stage of one model, meant for a fresh process"""
+    model = get_registry().get(name)
+    _, estimator = get_encoder(model)
+
+    results = {'sizes': {}}
+    for n_rows in sizes:
+        df = make_customers(n_rows)
+        seconds = {}
+        seconds['validate'], _ = best_time(
+            validate_customers, df, repeats=repeats
+        )
+        seconds['clean'], df_clean = best_time(
+            clean_file_data, df, repeats=repeats
+        )
+        seconds['encode'], X = best_time(
+            encode, model, df_clean, repeats=repeats
+        )
+        seconds['predict'], _ = best_time(estimator.predict, X, repeats=repeats)
+        seconds['total'] = sum(seconds[stage] for stage in SCORING_STAGES)
+        results['sizes'][str(n_rows)] = {
+            f'{stage}_rows_per_s': n_rows / seconds[stage] for stage in STAGES
+        }
+
+    results['latency'] = single_row_latency(model, latency_repeats)
+    results['peak_rss_mb'] = peak_rss_mb()
+    return results
+
+
+def run_suite(models, sizes, repeats, latency_repeats):
+    context = multiprocessing.get_context('spawn')
+    report = {
+        'meta': {
+            'created': datetime.now(timezone.utc).isoformat(),
+            'python': platform.python_version(),
+            'machine': platform.machine(),
+            'processor': platform.processor(),
+            'sizes': sizes,
+            'repeats': repeats,
+        },
+        'models': {},
+    }
+    for name in models:
+        print(f"benchmarking {name}", file=sys.stderr)
+        with ProcessPoolExecutor(1, mp_context=context) as pool:
+            report['models'][name] = pool.submit(
+                bench_model, name, sizes, repeats, latency_repeats
+            ).result()
+    return report
+
+
+def flatten(model_report):
+    """Map metric paths such as '1000/clean_rows_per_s' to their values"""
+    metrics = {}
+    for n_rows, values in model_report['sizes'].items():
+        for metric, value in values.items():
+            metrics[f'{n_rows}/{metric}'] = value
+    for metric, value in model_report['latency'].items():
+        metrics[f'latency/{metric}'] = value
+    metrics['peak_rss_mb'] = model_report['peak_rss_mb']
+    return metrics
+
+
+def regressions(baseline, current, tolerance):
+    """Metrics of the current run worse than the baseline beyond tolerance"""
+    found = []
+    for name, model_report in current['models'].items():
+        if name not in baseline['models']:
+            continue
+        before = flatten(baseline['models'][name])
+        for path, value in flatten(model_report).items():
+            if path not in before or not before[path]:
+                continue
+            change = value / before[path] - 1
+            if path.rsplit('/', 1)[-1] in HIGHER_IS_BETTER:
+                worse = change < -tolerance
+            else:
+                worse = change > tolerance
+            if worse:
+                found.append((name, path, before[path], value, change))
+    return found
+
+
+def print_report(report):
+    header = f"{'model':<8} {'rows':>9}" + ''.join(
+        f" {stage + ' rows/s':>17}" for stage in STAGES
+    )
+    print(header)
+    for name, model_report in report['models'].items():
+        for n_rows, values in model_report['sizes'].items():
+            print(
+                f"{name:<8} {int(n_rows):>9}"
+                + ''.join(
+                    f" {values[f'{stage}_rows_per_s']:>17,.0f}"
+                    for stage in STAGES
+                )
+            )
+    print()
+    print(f"{'model':<8} {'p50 us':>10} {'p99 us':>10} {'peak RSS MB':>12}")
+    for name, model_report in report['models'].items():
+        latency = model_report['latency']
+        print(
+            f"{name:<8} {latency['p50_us']:>10.1f} {latency['p99_us']:>10.1f}"
+            f" {model_report['peak_rss_mb']:>12.1f}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--models', nargs='+', default=None)
+    parser.add_argument('--sizes', type=int, nargs='+', default=SIZES)
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--latency-repeats', type=int, default=2000)
+    parser.add_argument('--output', default='benchmark.json')
+    parser.add_argument('--compare', metavar='BASELINE', default=None)
+    parser.add_argument(
+        '--tolerance',
+        type=float,
+        default=0.10,
+        help='relative change allowed before a metric counts as a regression',
+    )
+    args = parser.parse_args()
+
+    models = args.models or get_registry().names()
+    report = run_suite(models, args.sizes, args.repeats, args.latency_repeats)
+    with open(args.output, 'w', encoding='utf-8') as f_out:
+        json.dump(report, f_out, indent=2)
+    print_report(report)
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f_in:
+            baseline = json.load(f_in)
+        found = regressions(baseline, report, args.tolerance)
+        print()
+        for name, path, before, after, change in found:
+            print(
+                f"REGRESSION {name} {path}: {before:,.1f} -> {after:,.1f}"
+                f" ({change:+.1%})"
+            )
+        if found:
+            sys.exit(1)
+        print(f"no regressions beyond {args.tolerance:.0%}")
+
+
+if __name__ == '__main__':
+    main()
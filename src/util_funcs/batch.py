@@ -0,0 +1,41 @@
+import numpy as np
+
+from util_funcs.encoder import predict
+from util_funcs.readers import iter_customer_chunks
+from util_funcs.validation import validate_customers
+from util_funcs.pre_process import clean_file_data
+
+# number of rows read, cleaned and scored at a time
+CHUNK_SIZE = 50_000
+
+
+def income_mean(source, chunksize=CHUNK_SIZE, name=None):
+    """
+    Compute the mean income of a customer file without loading it whole.
+
+    Only the customers passing ``validate_customers`` are averaged, as
+    they are the ones imputed and scored. Returns the mean and the number
+    of rows read. The running sum may differ from ``Series.mean`` of the
+    valid incomes in the last bits of precision.
+    """
+    total, count, n_rows = 0.0, 0, 0
+    for chunk in iter_customer_chunks(source, name, chunksize):
+        valid, _ = validate_customers(chunk)
+        total += valid['Income'].sum()
+        count += valid['Income'].count()
+        n_rows += len(chunk)
+    return (total / count if count else float('nan')), n_rows
+
+
+def score_chunk(chunk, model, mean_income):
+    """
+    Validate a chunk of customers and add a ``Prediction`` column to the
+    valid ones. Returns the scored rows and the rejected rows.
+    """
+    valid, rejects = validate_customers(chunk)
+    if valid.empty:
+        valid['Prediction'] = np.array([], dtype=np.int64)
+        return valid, rejects
+    chunk_clean = clean_file_data(valid, income_mean=mean_income)
+    valid['Prediction'] = predict(model, chunk_clean)
+    return valid, rejects
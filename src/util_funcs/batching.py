@@ -0,0 +1,149 @@
+import time
+import queue
+import threading
+from concurrent.futures import Future
+
+import numpy as np
+
+from util_funcs.encoder import get_encoder
+from util_funcs.registry import get_registry
+
+# defaults, overridable per scheduler
+MAX_BATCH_SIZE = 64
+MAX_WAIT_MS = 2.0
+
+
+def _stack(items):
+    """Join the rows of several requests into one batch"""
+    if all(isinstance(item, np.ndarray) for item in items):
+        return np.concatenate(items)
+    return [row for item in items for row in item]
+
+
+class BatchScheduler:
+    """
+    Merges concurrent predict calls into vectorized batches.
+
+    Callers submit encoded rows and get a future back. A background
+    thread runs ``predict_fn`` once per batch and hands each caller the
+    slice of results for its own rows. A request alone in the queue is
+    predicted at once; when others are queued behind it the thread waits
+    up to ``max_wait_ms`` for up to ``max_batch_size`` rows. Requests
+    arriving while a batch is predicted queue up and form the next one.
+    """
+
+    def __init__(
+        self,
+        predict_fn,
+        max_batch_size=MAX_BATCH_SIZE,
+        max_wait_ms=MAX_WAIT_MS,
+    ):
+        self.predict_fn = predict_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._counters = {
+            'requests': 0,
+            'rows': 0,
+            'batches': 0,
+            'max_queue_depth': 0,
+        }
+        self._thread = threading.Thread(
+            target=self._run, name='batch-scheduler', daemon=True
+        )
+        self._thread.start()
+
+    def submit(self, rows):
+        """Queue encoded rows for prediction, return a future of results"""
+        future = Future()
+        self._queue.put((rows, future))
+        with self._lock:
+            self._counters['requests'] += 1
+            self._counters['max_queue_depth'] = max(
+                self._counters['max_queue_depth'], self._queue.qsize()
+            )
+        return future
+
+    def predict(self, rows, timeout=None):
+        """Submit rows and wait for their predictions"""
+        return self.submit(rows).result(timeout)
+
+    def stats(self):
+        """Counters of the scheduler, including the mean batch fill ratio"""
+        with self._lock:
+            counters = dict(self._counters)
+        batches = counters['batches']
+        mean_size = counters['rows'] / batches if batches else 0.0
+        counters['queue_depth'] = self._queue.qsize()
+        counters['mean_batch_size'] = mean_size
+        counters['fill_ratio'] = mean_size / self.max_batch_size
+        return counters
+
+    def _collect(self):
+        """Block for a first request, then gather more until full or late"""
+        batch = [self._queue.get()]
+        n_rows = len(batch[0][0])
+        if self._queue.empty():
+            # no concurrent callers, waiting would only add latency
+            return batch, n_rows
+        deadline = time.monotonic() + self.max_wait
+        while n_rows < self.max_batch_size:
+            timeout = deadline - time.monotonic()
+            try:
+                if timeout > 0:
+                    item = self._queue.get(timeout=timeout)
+                else:
+                    # past the deadline, only take what is already queued
+                    item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            batch.append(item)
+            n_rows += len(item[0])
+        return batch, n_rows
+
+    def _run(self):
+        while True:
+            batch, n_rows = self._collect()
+            with self._lock:
+                self._counters['batches'] += 1
+                self._counters['rows'] += n_rows
+
+            try:
+                results = self.predict_fn(_stack([rows for rows, _ in batch]))
+            except Exception:  # pylint: disable=broad-except
+                # predict requests one by one so a bad one fails on its own
+                for rows, future in batch:
+                    try:
+                        future.set_result(self.predict_fn(rows))
+                    except Exception as exc:  # pylint: disable=broad-except
+                        future.set_exception(exc)
+                continue
+
+            start = 0
+            for rows, future in batch:
+                future.set_result(results[start : start + len(rows)])
+                start += len(rows)
+
+
+# one scheduler per model name, shared by every session
+_schedulers = {}
+_schedulers_lock = threading.Lock()
+
+
+def get_scheduler(model_name, **kwargs):
+    """
+    Return the shared scheduler of a registry model.
+
+    The model is looked up for every batch, so new versions swapped into
+    the registry are picked up without a restart.
+    """
+
+    def predict_fn(rows):
+        _, estimator = get_encoder(get_registry().get(model_name))
+        return estimator.predict(rows)
+
+    with _schedulers_lock:
+        if model_name not in _schedulers:
+            _schedulers[model_name] = BatchScheduler(predict_fn, **kwargs)
+        return _schedulers[model_name]
@@ -0,0 +1,371 @@
+"""
+Compact the fitted pipelines into smaller, compressed artifacts.
+
+Run from the ``src`` directory, checking agreement on a holdout customer
+file or, for a dry run without --data, on synthetic customers:
+
+    python -m util_funcs.compact --models rfc gbc xgb --data holdout.csv
+
+Tree models are flattened with float32 thresholds and leaf values, the
+trees that barely change the predictions are pruned and the vectorizer
+keeps only the features the remaining trees split on. Other models are
+kept as they are. The customers are split in two, trees are pruned on
+one part and agreement is checked on the other. Every artifact is
+written as a compressed joblib file next to the pickles, which
+``load_model`` and the registry both read, unless its predictions agree
+with the original on fewer than --min-agreement of the checked
+customers. --install points the manifest at the
+written artifacts and requires --data, synthetic customers are not
+trusted to vouch for a model that will be served.
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import joblib
+from sklearn.pipeline import Pipeline
+from sklearn.feature_extraction import DictVectorizer
+
+from util_funcs.encoder import encode, predict, get_encoder
+from util_funcs.metrics import rss_bytes
+from util_funcs.readers import read_customer_file
+from util_funcs.registry import MANIFEST, file_checksum, read_model_file
+from util_funcs.synthetic import make_customers
+from util_funcs.flat_trees import FlatForest, flatten_model
+from util_funcs.pre_process import clean_file_data
+
+# share of customers a compact model must predict like the original
+MIN_AGREEMENT = float(os.environ.get('COMPACT_MIN_AGREEMENT', 0.999))
+
+# agreement pruning alone may cost, float32 rounding takes the rest
+PRUNE_AGREEMENT = 0.9995
+
+# share of the customers trees are pruned on, agreement is checked on
+# the others
+PRUNE_SHARE = 0.5
+
+# joblib compression of the written artifacts
+COMPRESSION = ('zlib', 3)
+
+
+def float32_thresholds(thresholds, strict=False):
+    """
+    Round split thresholds to float32 without moving any float32 input
+    to the other side of a split.
+
+    Inputs are compared in float32, so ``x <= t`` holds exactly when ``x``
+    is at most the largest float32 not above ``t``, and ``x < t`` when it
+    is below the smallest float32 not under ``t``.
+    """
+    rounded = thresholds.astype(np.float32)
+    if strict:
+        low = rounded < thresholds
+        rounded[low] = np.nextafter(rounded[low], np.float32(np.inf))
+    else:
+        high = rounded > thresholds
+        rounded[high] = np.nextafter(rounded[high], np.float32(-np.inf))
+    return rounded
+
+
+def _float32_forest(forest, nodes=None, n_features=None):
+    """Copy of a flat forest with float32 thresholds and values"""
+    nodes = forest.nodes if nodes is None else nodes
+    dtype = [
+        (name, np.float32 if name == 'threshold' else nodes.dtype[name])
+        for name in nodes.dtype.names
+    ]
+    compact_nodes = np.zeros(len(nodes), dtype=np.dtype(dtype, align=True))
+    for name in nodes.dtype.names:
+        compact_nodes[name] = nodes[name]
+    compact_nodes['threshold'] = float32_thresholds(
+        nodes['threshold'], forest.strict
+    )
+    return FlatForest(
+        compact_nodes,
+        forest.values.astype(np.float32),
+        forest.roots,
+        forest.classes_,
+        forest.base.astype(np.float32),
+        aggregation=forest.aggregation,
+        link=forest.link,
+        strict=forest.strict,
+        n_features=forest.n_features if n_features is None else n_features,
+    )
+
+
+def prune_trees(forest, X, min_agreement=PRUNE_AGREEMENT):
+    """
+    Drop the trees contributing least while predictions on ``X`` still
+    agree with the whole forest on ``min_agreement`` of the rows.
+
+    Boosted trees are dropped by ascending mean absolute contribution to
+    the margin, which is folded into the base so the margins stay
+    centred. Averaged forests are unbiased on any subset of trees, the
+    last ones are dropped first.
+    """
+    leaves = forest.apply(X)
+    # output of every tree for every row, as (rows, trees, outputs)
+    contributions = forest.values[leaves]
+    reference = forest.predict(X)
+    if forest.aggregation == 'mean':
+        order = np.arange(forest.n_trees)[::-1]
+    else:
+        order = np.argsort(
+            np.abs(contributions).mean(axis=(0, 2)), kind='stable'
+        )
+
+    def pruned(n_dropped):
+        kept = np.sort(order[n_dropped:])
+        base = forest.base
+        if forest.aggregation != 'mean':
+            dropped = contributions[:, order[:n_dropped]]
+            base = base + dropped.sum(axis=1).mean(axis=0)
+        return kept, base.astype(forest.base.dtype)
+
+    def pruned_agreement(n_dropped):
+        kept, base = pruned(n_dropped)
+        raw = contributions[:, kept].sum(axis=1)
+        if forest.aggregation == 'mean':
+            raw = raw / len(kept)
+        proba = forest.proba_from_raw(base + raw)
+        labels = forest.classes_.take(np.argmax(proba, axis=1))
+        return np.mean(labels == reference)
+
+    # largest number of trees that can go, at least one tree is kept
+    low, high = 0, forest.n_trees - 1
+    while low < high:
+        middle = (low + high + 1) // 2
+        if pruned_agreement(middle) >= min_agreement:
+            low = middle
+        else:
+            high = middle - 1
+    if low == 0:
+        return forest
+    kept, base = pruned(low)
+    return forest.subset(kept, base)
+
+
+def trim_features(forest, vectorizer):
+    """
+    Keep only the features a forest splits on, in the forest and in a
+    float32 copy of its vectorizer.
+    """
+    features = forest.nodes['feature']
+    used = np.unique(features[features >= 0])
+    remap = np.full(forest.n_features, -1, dtype=np.int32)
+    remap[used] = np.arange(len(used))
+    nodes = forest.nodes.copy()
+    nodes['feature'] = np.where(features >= 0, remap[features], -1)
+
+    trimmed = DictVectorizer(
+        dtype=np.float32, separator=vectorizer.separator, sparse=False
+    )
+    trimmed.feature_names_ = [vectorizer.feature_names_[i] for i in used]
+    trimmed.vocabulary_ = {
+        name: i for i, name in enumerate(trimmed.feature_names_)
+    }
+    return _float32_forest(forest, nodes, len(used)), trimmed
+
+
+def compact_model(model, df_clean, prune_agreement=PRUNE_AGREEMENT):
+    """
+    Compact version of a fitted pipeline and what changed in it.
+
+    Tree models become a trimmed vectorizer and a float32 ``FlatForest``
+    pruned on the cleaned customers ``df_clean``. Other models and
+    pipelines without a dense vectorizer are returned unchanged.
+    """
+    encoder, _ = get_encoder(model)
+    try:
+        forest = flatten_model(model)
+    except (TypeError, ValueError):
+        forest = None
+    if encoder is None or forest is None:
+        return model, {}
+
+    forest = _float32_forest(forest)
+    X = encode(model, df_clean).astype(np.float32)
+    pruned = prune_trees(forest, X, prune_agreement)
+    compact, vectorizer = trim_features(pruned, encoder.vectorizer)
+    changes = {
+        'trees': [forest.n_trees, compact.n_trees],
+        'nodes': [len(forest.nodes), len(compact.nodes)],
+        'features': [forest.n_features, compact.n_features],
+    }
+    pipeline = Pipeline([('vectorizer', vectorizer), ('forest', compact)])
+    return pipeline, changes
+
+
+def agreement(model, compact, df_clean):
+    """Share of equal predictions and largest probability difference"""
+    report = {
+        'agreement': float(
+            np.mean(predict(model, df_clean) == predict(compact, df_clean))
+        ),
+        'max_proba_diff': None,
+    }
+    if hasattr(model, 'predict_proba') and hasattr(compact, 'predict_proba'):
+        _, estimator = get_encoder(model)
+        _, compact_estimator = get_encoder(compact)
+        proba = estimator.predict_proba(encode(model, df_clean))[:, -1]
+        compact_proba = compact_estimator.predict_proba(
+            encode(compact, df_clean)
+        )[:, -1]
+        report['max_proba_diff'] = float(np.abs(proba - compact_proba).max())
+    return report
+
+
+def split_holdout(df_clean, prune_share=PRUNE_SHARE, seed=0):
+    """
+    Split cleaned customers into disjoint parts to prune on and to check
+    agreement on, so the check does not grade the rows pruning fitted.
+    """
+    order = np.random.default_rng(seed).permutation(len(df_clean))
+    n_prune = int(round(len(df_clean) * prune_share))
+    prune_rows = df_clean.iloc[np.sort(order[:n_prune])]
+    check_rows = df_clean.iloc[np.sort(order[n_prune:])]
+    return prune_rows, check_rows
+
+
+def _load_stats(path):
+    """Load time and resident memory of one artifact, in a fresh process"""
+    # pylint: disable=import-outside-toplevel,unused-import
+    import xgboost
+    import sklearn.pipeline
+
+    before = rss_bytes()
+    start = time.perf_counter()
+    read_model_file(path)
+    load_s = time.perf_counter() - start
+    after = rss_bytes()
+    rss_mb = None if before is None else (after - before) / 2**20
+    return load_s, rss_mb
+
+
+def load_stats(path):
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(1, mp_context=context) as pool:
+        return pool.submit(_load_stats, path).result()
+
+
+def _reference_customers(path, n_rows):
+    if path is None:
+        return clean_file_data(make_customers(n_rows))
+    return clean_file_data(read_customer_file(path))
+
+
+def _print_row(name, report):
+    """One line of the compaction table, original>compact per column"""
+    sizes = [size / 1024 for size in report['size_bytes']]
+    loads = [load_s * 1e3 for load_s in report['load_s']]
+    rss = [
+        '?' if rss_mb is None else f"{rss_mb:.1f}"
+        for rss_mb in report['rss_mb']
+    ]
+    trees = '-'.join(str(n) for n in report.get('trees', ['', '']))
+    print(
+        f"{name:<8} {sizes[0]:>7.0f}>{sizes[1]:<7.0f} "
+        f"{loads[0]:>6.0f}>{loads[1]:<6.0f} "
+        f"{rss[0]:>6}>{rss[1]:<6} {trees:>11} "
+        f"{report['agreement']:>10.4f}"
+    )
+
+
+def compact_entry(name, entry, model_dir, df_clean, args):
+    """
+    Compact one manifest model and write its artifact.
+
+    Trees are pruned on part of ``df_clean`` and agreement is measured on
+    the rest. Returns the artifact file name, None when the compact model
+    agrees with the original on fewer than ``args.min_agreement`` of the
+    checked customers, and the report of the compaction.
+    """
+    path = os.path.join(model_dir, entry['file'])
+    model = read_model_file(path)
+    prune_rows, check_rows = split_holdout(df_clean)
+    compact, changes = compact_model(model, prune_rows, args.prune_agreement)
+    report = agreement(model, compact, check_rows)
+    report.update(changes, checked_rows=len(check_rows))
+    if report['agreement'] < args.min_agreement:
+        print(
+            f"{name:<8} refused, agreement {report['agreement']:.4f} "
+            f"is below {args.min_agreement}"
+        )
+        return None, report
+
+    file_name = f"{name}-{entry['version']}-compact.joblib"
+    compact_path = os.path.join(model_dir, file_name)
+    joblib.dump(compact, compact_path + '.tmp', compress=COMPRESSION)
+    os.replace(compact_path + '.tmp', compact_path)
+
+    loads = [load_stats(path), load_stats(compact_path)]
+    report.update(
+        size_bytes=[os.path.getsize(path), os.path.getsize(compact_path)],
+        load_s=[round(load_s, 4) for load_s, _ in loads],
+        rss_mb=[
+            None if rss_mb is None else round(rss_mb, 2) for _, rss_mb in loads
+        ],
+    )
+    _print_row(name, report)
+    return file_name, report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--models', nargs='+', default=None)
+    parser.add_argument(
+        '--data', default=None, help='holdout customer file, for --install'
+    )
+    parser.add_argument('--rows', type=int, default=20_000)
+    parser.add_argument('--min-agreement', type=float, default=MIN_AGREEMENT)
+    parser.add_argument(
+        '--prune-agreement', type=float, default=PRUNE_AGREEMENT
+    )
+    parser.add_argument('--manifest', default=MANIFEST)
+    parser.add_argument('--install', action='store_true')
+    args = parser.parse_args()
+    if args.install and args.data is None:
+        parser.error('--install needs a holdout customer file in --data')
+
+    with open(args.manifest, 'r', encoding='utf-8') as f_in:
+        manifest = json.load(f_in)
+    model_dir = os.path.dirname(args.manifest)
+    df_clean = _reference_customers(args.data, args.rows)
+
+    refused = []
+    print(
+        f"{'model':<8} {'size KB':>15} {'load ms':>13} {'RSS MB':>13} "
+        f"{'trees':>11} {'agreement':>10}"
+    )
+    for name in args.models or sorted(manifest['models']):
+        entry = manifest['models'][name]
+        file_name, report = compact_entry(
+            name, entry, model_dir, df_clean, args
+        )
+        if file_name is None:
+            refused.append(name)
+        elif args.install:
+            manifest['models'][name] = {
+                **entry,
+                'file': file_name,
+                'sha256': file_checksum(os.path.join(model_dir, file_name)),
+                'compacted_from': entry['file'],
+                'compaction': report,
+            }
+
+    if args.install:
+        with open(args.manifest + '.tmp', 'w', encoding='utf-8') as f_out:
+            json.dump(manifest, f_out, indent=4)
+        os.replace(args.manifest + '.tmp', args.manifest)
+    if refused:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from util_funcs.encoder import get_encoder
+
+
+def _shared_inputs(models, df_clean):
+    """
+    Encode a cleaned frame once per distinct feature vocabulary.
+
+    The shipped pipelines share one vocabulary, so the frame is encoded
+    a single time. Pipelines without a dense vectorizer get records.
+    """
+    inputs = {}
+    matrices = {}
+    records = None
+    for name, model in models.items():
+        encoder, _ = get_encoder(model)
+        if encoder is None:
+            if records is None:
+                records = df_clean.to_dict('records')
+            inputs[name] = records
+            continue
+        vocabulary = tuple(encoder.vectorizer.feature_names_)
+        if vocabulary not in matrices:
+            matrices[vocabulary] = encoder.transform(df_clean)
+        inputs[name] = matrices[vocabulary]
+    return inputs
+
+
+def _score(estimator, X, probabilities):
+    """Predictions and positive class probabilities of one estimator"""
+    start = time.perf_counter()
+    labels = estimator.predict(X)
+    proba = None
+    if probabilities and hasattr(estimator, 'predict_proba'):
+        proba = estimator.predict_proba(X)[:, -1]
+    return labels, proba, time.perf_counter() - start
+
+
+def _score_all(jobs, max_workers):
+    """Run ``_score`` for every job, in a thread pool when asked to"""
+    if not max_workers or max_workers <= 1:
+        return {name: _score(*job) for name, job in jobs.items()}
+    with ThreadPoolExecutor(max_workers) as pool:
+        futures = {
+            name: pool.submit(_score, *job) for name, job in jobs.items()
+        }
+        return {name: future.result() for name, future in futures.items()}
+
+
+def _majority_vote(votes):
+    """Majority label of each row, ties vote 0, and the share agreeing"""
+    positive = votes.mean(axis=1)
+    majority = (positive > 0.5).astype(votes.dtype)
+    return majority, np.where(majority == 1, positive, 1 - positive)
+
+
+def compare_models(models, df_clean, max_workers=None, probabilities=True):
+    """
+    Score a cleaned frame with several models from one shared encoding.
+
+    ``models`` maps names to fitted pipelines. The encoded matrix is fanned
+    out to the final estimators, in a thread pool when ``max_workers`` is
+    above one, as the estimators release the GIL while predicting.
+    Returns a frame with a ``Prediction_<name>`` and ``Probability_<name>``
+    column per model, the ``Majority_Vote`` (ties vote 0) and the share
+    of models agreeing with it as ``Agreement``, and the seconds spent in
+    encoding and in each model.
+    """
+    if not models:
+        raise ValueError("At least one model is needed for a comparison")
+
+    start = time.perf_counter()
+    inputs = _shared_inputs(models, df_clean)
+    timings = {'encode': time.perf_counter() - start}
+
+    jobs = {
+        name: (get_encoder(model)[1], inputs[name], probabilities)
+        for name, model in models.items()
+    }
+    results = _score_all(jobs, max_workers)
+
+    scores = pd.DataFrame(index=df_clean.index)
+    for name, (labels, proba, seconds) in results.items():
+        scores[f'Prediction_{name}'] = labels
+        if proba is not None:
+            scores[f'Probability_{name}'] = proba
+        timings[name] = seconds
+
+    votes = np.column_stack([labels for labels, _, _ in results.values()])
+    scores['Majority_Vote'], scores['Agreement'] = _majority_vote(votes)
+    return scores, timings
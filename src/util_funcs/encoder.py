@@ -0,0 +1,166 @@
+import weakref
+from numbers import Number
+
+import numpy as np
+import pandas as pd
+from sklearn.feature_extraction import DictVectorizer
+
+
+class FeatureEncoder:
+    """
+    Column-wise replacement for ``DictVectorizer.transform`` on DataFrames.
+
+    The lookup tables are compiled once from the fitted vectorizer's
+    ``vocabulary_`` so a cleaned frame is written straight into a dense
+    float64 matrix without building one dict per row. Values follow the
+    vectorizer's rules: strings are one-hot encoded as ``column=value``,
+    numbers (including missing values) go to the ``column`` feature and
+    anything not in the vocabulary is ignored.
+    """
+
+    def __init__(self, vectorizer):
+        self.vectorizer = vectorizer
+        self.n_features = len(vectorizer.feature_names_)
+        self.separator = vectorizer.separator
+        self.dtype = vectorizer.dtype
+
+        # numeric features are stored under the bare column name
+        self.numeric = {}
+        # one-hot features are stored as column -> {value: index}
+        self.one_hot = {}
+        for name, index in vectorizer.vocabulary_.items():
+            column, sep, value = name.partition(self.separator)
+            if sep:
+                self.one_hot.setdefault(column, {})[value] = index
+            else:
+                self.numeric[column] = index
+
+    def transform(self, df):
+        """Encode a cleaned DataFrame into the vectorizer's feature matrix"""
+        X = np.zeros((len(df), self.n_features), dtype=self.dtype)
+
+        for column in df.columns:
+            if column not in self.numeric and column not in self.one_hot:
+                continue
+            if not self._fill_column(X, df[column]):
+                # mixed or unsupported values, defer to the vectorizer
+                return self.vectorizer.transform(df.to_dict('records'))
+        return X
+
+    def transform_record(self, record):
+        """Encode a single mapping of feature values into a (1, n) matrix"""
+        X = np.zeros((1, self.n_features), dtype=self.dtype)
+
+        for column, value in record.items():
+            if isinstance(value, str):
+                index = self.one_hot.get(column, {}).get(value)
+                if index is not None:
+                    X[0, index] = 1
+            elif isinstance(value, Number) or value is None:
+                index = self.numeric.get(column)
+                if index is not None:
+                    X[0, index] = np.nan if value is None else value
+            else:
+                # let the vectorizer raise its own error
+                return self.vectorizer.transform([record])
+        return X
+
+    def _fill_column(self, X, values):
+        """Write one column into X, return False when it is not supported"""
+        column = values.name
+        is_categorical = isinstance(values.dtype, pd.CategoricalDtype)
+
+        # numeric columns, including categories holding numbers
+        if (
+            is_categorical
+            and pd.api.types.is_numeric_dtype(values.cat.categories)
+        ) or (
+            not is_categorical
+            and pd.api.types.is_numeric_dtype(values)
+            and not pd.api.types.is_complex_dtype(values)
+        ):
+            if column in self.numeric:
+                X[:, self.numeric[column]] = np.asarray(values, dtype=X.dtype)
+            return True
+
+        # string columns, looked up through their category codes
+        if is_categorical:
+            codes = values.cat.codes.to_numpy()
+            categories = values.cat.categories
+        elif values.dtype == object:
+            codes, categories = pd.factorize(values)
+        else:
+            return False
+
+        if not all(isinstance(category, str) for category in categories):
+            return False
+
+        # translate category codes into matrix columns, -1 when unknown
+        lookup = np.full(len(categories) + 1, -1, dtype=np.intp)
+        one_hot = self.one_hot.get(column, {})
+        for code, category in enumerate(categories):
+            lookup[code] = one_hot.get(category, -1)
+        target = lookup[codes]
+
+        rows = np.flatnonzero(target >= 0)
+        X[rows, target[rows]] = 1
+
+        # missing values are numbers to the vectorizer
+        if column in self.numeric:
+            X[codes < 0, self.numeric[column]] = np.nan
+        return True
+
+
+# encoders compiled per loaded pipeline
+_encoders = weakref.WeakKeyDictionary()
+
+
+def get_encoder(model):
+    """
+    Return the cached encoder and final estimator of a fitted pipeline.
+
+    Pipelines that do not start with a dense ``DictVectorizer`` return
+    ``None`` as encoder and must be called with records.
+    """
+    if model not in _encoders:
+        vectorizer = model.steps[0][1]
+        if isinstance(vectorizer, DictVectorizer) and not vectorizer.sparse:
+            estimator = model[1:] if len(model.steps) > 2 else model[-1]
+            _encoders[model] = (FeatureEncoder(vectorizer), estimator)
+        else:
+            _encoders[model] = (None, model)
+    return _encoders[model]
+
+
+def encode(model, df):
+    """Encode a cleaned DataFrame for the final estimator of a pipeline"""
+    encoder, _ = get_encoder(model)
+    if encoder is None:
+        return df.to_dict('records')
+    return encoder.transform(df)
+
+
+def predict(model, df):
+    """Predict on a cleaned DataFrame, bypassing the per-row dicts"""
+    _, estimator = get_encoder(model)
+    return estimator.predict(encode(model, df))
+
+
+def predict_proba(model, df):
+    """Predict class probabilities on a cleaned DataFrame"""
+    _, estimator = get_encoder(model)
+    return estimator.predict_proba(encode(model, df))
+
+
+def predict_record(model, features):
+    """Predict a single customer from a mapping of cleaned features"""
+    _, estimator = get_encoder(model)
+    return estimator.predict(encode_record(model, features))[0]
+
+
+def encode_record(model, features):
+    """Encode a single customer for the final estimator of a pipeline"""
+    encoder, _ = get_encoder(model)
+    if encoder is None:
+        return [features]
+    return encoder.transform_record(features)
@@ -0,0 +1,404 @@
+import json
+import weakref
+
+import numpy as np
+from scipy import special
+from sklearn.tree import DecisionTreeClassifier
+from sklearn.dummy import DummyClassifier
+from sklearn.ensemble import RandomForestClassifier, GradientBoostingClassifier
+from sklearn.pipeline import Pipeline
+
+# one tree node, leaves have feature -1
+node_dtype = np.dtype(
+    [
+        ('threshold', np.float64),
+        ('feature', np.int32),
+        ('left', np.int32),
+        ('right', np.int32),
+        ('missing_left', np.bool_),
+    ],
+    align=True,
+)
+
+# rows traversed together, keeps the (rows, trees) work arrays in cache
+BLOCK_ROWS = 2048
+
+
+# the arrays and evaluation settings are the model, kept as attributes
+# pylint: disable-next=too-many-instance-attributes
+class FlatForest:
+    """
+    Tree ensemble flattened into contiguous NumPy arrays.
+
+    All trees share one array of nodes, ``roots`` holds the offset of
+    each tree's root and ``values`` the output of every node. A block of
+    rows walks all trees at once, one tree level per step, and the leaf
+    values are then averaged (random forests) or summed onto a base
+    margin and passed through a link function (boosting).
+    """
+
+    def __init__(  # pylint: disable=too-many-arguments
+        self,
+        nodes,
+        values,
+        roots,
+        classes,
+        base,
+        aggregation='sum',
+        link=None,
+        strict=False,
+        n_features=None,
+    ):
+        self.nodes = nodes
+        self.values = values
+        self.roots = np.asarray(roots, dtype=np.int32)
+        self.classes_ = np.asarray(classes)
+        self.base = np.asarray(base, dtype=values.dtype)
+        self.aggregation = aggregation
+        self.link = link
+        # xgboost goes left on x < threshold, sklearn on x <= threshold
+        self.strict = strict
+        self.n_features = n_features
+        self.max_depth = _max_depth(nodes, self.roots)
+
+    @property
+    def n_trees(self):
+        return len(self.roots)
+
+    def _apply_block(self, X):
+        """Leaf index reached by every row of X in every tree"""
+        idx = np.tile(self.roots, (len(X), 1))
+        rows = np.arange(len(X))[:, None]
+        for _ in range(self.max_depth):
+            node = self.nodes[idx]
+            internal = node['feature'] >= 0
+            if not internal.any():
+                break
+            x = X[rows, np.maximum(node['feature'], 0)]
+            if self.strict:
+                go_left = x < node['threshold']
+            else:
+                go_left = x <= node['threshold']
+            go_left = np.where(np.isnan(x), node['missing_left'], go_left)
+            child = np.where(go_left, node['left'], node['right'])
+            idx = np.where(internal, child, idx)
+        return idx
+
+    def _raw_block(self, X):
+        leaves = self._apply_block(X)
+        raw = np.tile(self.base, (len(X), 1))
+        # add trees in order, as the original estimators do
+        for tree in range(self.n_trees):
+            raw += self.values[leaves[:, tree]]
+        if self.aggregation == 'mean':
+            raw /= self.n_trees
+        return raw
+
+    def _check_input(self, X):
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim != 2 or (
+            self.n_features is not None and X.shape[1] != self.n_features
+        ):
+            raise ValueError(
+                f"X has shape {X.shape}, expected (n_rows, {self.n_features})"
+            )
+        return X
+
+    def apply(self, X):
+        """Leaf index of every row in every tree, as (n_rows, n_trees)"""
+        X = self._check_input(X)
+        return np.concatenate(
+            [
+                self._apply_block(X[start : start + BLOCK_ROWS])
+                for start in range(0, len(X), BLOCK_ROWS)
+            ]
+            or [np.empty((0, self.n_trees), dtype=np.int32)]
+        )
+
+    def raw_predict(self, X):
+        """Averaged leaf values or summed margins, before the link"""
+        X = self._check_input(X)
+        blocks = [
+            self._raw_block(X[start : start + BLOCK_ROWS])
+            for start in range(0, len(X), BLOCK_ROWS)
+        ]
+        if not blocks:
+            return np.empty((0, self.values.shape[1]), self.values.dtype)
+        return np.concatenate(blocks)
+
+    def proba_from_raw(self, raw):
+        """Apply the link function to the output of ``raw_predict``"""
+        if self.link == 'logistic':
+            proba = special.expit(raw[:, 0])
+            return np.column_stack([1 - proba, proba])
+        if self.link == 'softmax':
+            return np.nan_to_num(
+                np.exp(raw - special.logsumexp(raw, axis=1)[:, np.newaxis])
+            )
+        return raw
+
+    def predict_proba(self, X):
+        return self.proba_from_raw(self.raw_predict(X))
+
+    def predict(self, X):
+        return self.classes_.take(np.argmax(self.predict_proba(X), axis=1))
+
+    def tree_slices(self):
+        """Node range of every tree, trees are stored one after another"""
+        ends = np.append(self.roots[1:], len(self.nodes))
+        return [slice(start, end) for start, end in zip(self.roots, ends)]
+
+    def subset(self, trees, base=None):
+        """New forest with only the given trees, and optionally a new base"""
+        slices = self.tree_slices()
+        kept = []
+        for tree in trees:
+            nodes = self.nodes[slices[tree]].copy()
+            start = slices[tree].start
+            for child in ('left', 'right'):
+                nodes[child] = np.where(
+                    nodes[child] >= 0, nodes[child] - start, -1
+                )
+            kept.append((nodes, self.values[slices[tree]]))
+        nodes, values, roots = _pack(kept)
+        return FlatForest(
+            nodes,
+            values,
+            roots,
+            self.classes_,
+            self.base if base is None else base,
+            aggregation=self.aggregation,
+            link=self.link,
+            strict=self.strict,
+            n_features=self.n_features,
+        )
+
+    def save(self, path):
+        """Write the arrays to an ``.npz`` file, readable without pickle"""
+        meta = {
+            'aggregation': self.aggregation,
+            'link': self.link,
+            'strict': self.strict,
+            'n_features': self.n_features,
+        }
+        np.savez(
+            path,
+            nodes=self.nodes,
+            values=self.values,
+            roots=self.roots,
+            classes=self.classes_,
+            base=self.base,
+            meta=np.array(json.dumps(meta)),
+        )
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            meta = json.loads(str(data['meta']))
+            return cls(
+                data['nodes'],
+                data['values'],
+                data['roots'],
+                data['classes'],
+                data['base'],
+                **meta,
+            )
+
+
+def _max_depth(nodes, roots):
+    """Number of levels below the deepest root"""
+    depth = 0
+    frontier = roots
+    while True:
+        frontier = frontier[nodes['feature'][frontier] >= 0]
+        if frontier.size == 0:
+            return depth
+        frontier = np.concatenate(
+            [nodes['left'][frontier], nodes['right'][frontier]]
+        )
+        depth += 1
+
+
+def _pack(trees):
+    """Concatenate (nodes, values) of several trees, return the roots"""
+    roots = np.cumsum([0] + [len(nodes) for nodes, _ in trees[:-1]])
+    all_nodes = []
+    for root, (nodes, _) in zip(roots, trees):
+        nodes = nodes.copy()
+        for child in ('left', 'right'):
+            nodes[child] = np.where(nodes[child] >= 0, nodes[child] + root, -1)
+        all_nodes.append(nodes)
+    values = np.concatenate([values for _, values in trees])
+    return np.concatenate(all_nodes), values, roots
+
+
+def _sklearn_nodes(tree):
+    nodes = np.zeros(tree.node_count, dtype=node_dtype)
+    is_leaf = tree.children_left < 0
+    nodes['feature'] = np.where(is_leaf, -1, tree.feature)
+    nodes['threshold'] = tree.threshold
+    nodes['left'] = tree.children_left
+    nodes['right'] = tree.children_right
+    # sklearn 1.2 trees have no missing value support, NaN goes right
+    nodes['missing_left'] = False
+    return nodes
+
+
+def _class_probabilities(tree):
+    """Leaf class fractions, normalized as DecisionTreeClassifier does"""
+    values = tree.value[:, 0, :]
+    normalizer = values.sum(axis=1, keepdims=True)
+    normalizer[normalizer == 0.0] = 1.0
+    return values / normalizer
+
+
+def _flatten_sklearn_trees(estimator):
+    if isinstance(estimator, DecisionTreeClassifier):
+        trees = [estimator]
+    else:
+        trees = estimator.estimators_
+    nodes, values, roots = _pack(
+        [
+            (_sklearn_nodes(tree.tree_), _class_probabilities(tree.tree_))
+            for tree in trees
+        ]
+    )
+    return FlatForest(
+        nodes,
+        values,
+        roots,
+        estimator.classes_,
+        np.zeros(values.shape[1]),
+        aggregation='mean',
+        n_features=estimator.n_features_in_,
+    )
+
+
+def _flatten_gradient_boosting(estimator):
+    init = estimator.init_
+    if not isinstance(init, (str, DummyClassifier)):
+        raise ValueError(
+            "Only gradient boosting with a constant init can be flattened"
+        )
+    # the init estimator predicts a constant margin
+    base = estimator._raw_predict_init(  # pylint: disable=protected-access
+        np.zeros((1, estimator.n_features_in_), dtype=np.float32)
+    )[0]
+
+    n_outputs = estimator.estimators_.shape[1]
+    trees = []
+    for stage in estimator.estimators_:
+        for output, tree in enumerate(stage):
+            values = np.zeros((tree.tree_.node_count, n_outputs))
+            values[:, output] = (
+                estimator.learning_rate * tree.tree_.value[:, 0, 0]
+            )
+            trees.append((_sklearn_nodes(tree.tree_), values))
+    nodes, values, roots = _pack(trees)
+    return FlatForest(
+        nodes,
+        values,
+        roots,
+        estimator.classes_,
+        base,
+        link='logistic' if n_outputs == 1 else 'softmax',
+        n_features=estimator.n_features_in_,
+    )
+
+
+def _xgboost_link(learner):
+    """Number of outputs, base margin and link of an xgboost learner"""
+    objective = learner['objective']['name']
+    n_outputs = max(int(learner['learner_model_param']['num_class']), 1)
+    base_score = np.float32(learner['learner_model_param']['base_score'])
+    if objective == 'binary:logistic':
+        base = np.log(base_score / (np.float32(1) - base_score))
+        return n_outputs, base, 'logistic'
+    if objective in ('multi:softprob', 'multi:softmax'):
+        return n_outputs, base_score, 'softmax'
+    raise ValueError(f"Cannot flatten the '{objective}' objective")
+
+
+def _xgboost_tree(tree, output, n_outputs):
+    """Nodes and values of one tree of an xgboost JSON model"""
+    if any(tree.get('split_type', [])):
+        raise ValueError("Categorical splits cannot be flattened")
+    left = np.asarray(tree['left_children'], dtype=np.int32)
+    nodes = np.zeros(len(left), dtype=node_dtype)
+    is_leaf = left < 0
+    conditions = np.asarray(tree['split_conditions'], dtype=np.float32)
+    nodes['feature'] = np.where(is_leaf, -1, tree['split_indices'])
+    nodes['threshold'] = np.where(is_leaf, 0.0, conditions)
+    nodes['left'] = left
+    nodes['right'] = tree['right_children']
+    nodes['missing_left'] = np.asarray(tree['default_left'], dtype=bool)
+    # leaves keep their value in split_conditions, accumulated in float32
+    values = np.zeros((len(left), n_outputs), dtype=np.float32)
+    values[:, output] = np.where(is_leaf, conditions, 0.0)
+    return nodes, values
+
+
+def _flatten_xgboost(estimator):
+    learner = json.loads(estimator.get_booster().save_raw('json'))['learner']
+    booster = learner['gradient_booster']
+    if booster['name'] != 'gbtree':
+        raise ValueError(f"Cannot flatten the '{booster['name']}' booster")
+    n_outputs, base, link = _xgboost_link(learner)
+
+    model = booster['model']
+    trees = model['trees']
+    # predict stops at the best iteration when early stopping was used
+    n_parallel = int(model['gbtree_model_param']['num_parallel_tree'])
+    try:
+        n_rounds = estimator.best_iteration + 1
+        trees = trees[: n_rounds * n_outputs * n_parallel]
+    except AttributeError:
+        pass
+
+    nodes, values, roots = _pack(
+        [
+            _xgboost_tree(tree, output, n_outputs)
+            for tree, output in zip(trees, model['tree_info'])
+        ]
+    )
+    return FlatForest(
+        nodes,
+        values,
+        roots,
+        estimator.classes_,
+        np.full(n_outputs, base, dtype=np.float32),
+        link=link,
+        strict=True,
+        n_features=estimator.n_features_in_,
+    )
+
+
+def flatten_model(model):
+    """
+    Export the tree estimator of a fitted model into a ``FlatForest``.
+
+    Pipelines are flattened from their final step, which then takes the
+    matrix produced by the steps before it. Decision trees, random
+    forests, gradient boosting and xgboost classifiers are supported.
+    """
+    estimator = model[-1] if isinstance(model, Pipeline) else model
+    if isinstance(estimator, FlatForest):
+        return estimator
+    if isinstance(estimator, (DecisionTreeClassifier, RandomForestClassifier)):
+        return _flatten_sklearn_trees(estimator)
+    if isinstance(estimator, GradientBoostingClassifier):
+        return _flatten_gradient_boosting(estimator)
+    if type(estimator).__name__ == 'XGBClassifier':
+        return _flatten_xgboost(estimator)
+    raise TypeError(f"Cannot flatten a {type(estimator).__name__}")
+
+
+# flat forests exported per loaded model
+_forests = weakref.WeakKeyDictionary()
+
+
+def get_flat_forest(model):
+    """Return the cached ``FlatForest`` of a model"""
+    if model not in _forests:
+        _forests[model] = flatten_model(model)
+    return _forests[model]
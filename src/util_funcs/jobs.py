@@ -0,0 +1,220 @@
+import os
+import re
+import json
+import time
+import uuid
+import shutil
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from util_funcs.batch import CHUNK_SIZE, income_mean, score_chunk
+from util_funcs.readers import iter_customer_chunks
+from util_funcs.registry import get_registry
+
+# where jobs are persisted and how many run at once, from the environment
+JOBS_DIR = os.environ.get(
+    'SCORING_JOBS_DIR',
+    os.path.join(tempfile.gettempdir(), 'customer-response-jobs'),
+)
+JOB_WORKERS = int(os.environ.get('SCORING_JOB_WORKERS', 2))
+
+# job states
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+RESULTS_FILE = 'predictions.csv'
+REJECTS_FILE = 'rejects.csv'
+STATE_FILE = 'state.json'
+
+# job IDs are the first hex digits of a uuid4, nothing else names a job
+JOB_ID = re.compile(r'[0-9a-f]{12}')
+
+
+class JobQueue:
+    """
+    Persisted batch scoring jobs, run by a pool of worker threads.
+
+    Each job is a directory holding the uploaded file, the results CSV,
+    the rejected rows with their reasons and a ``state.json`` checkpoint
+    rewritten after every scored chunk. The checkpoint records the chunks
+    done and the size of both CSVs written so far, so a job interrupted
+    by a restart resumes after its last finished chunk when the queue
+    starts again. Finished chunks are read again on resume but not
+    re-scored.
+    """
+
+    def __init__(
+        self, jobs_dir=JOBS_DIR, workers=JOB_WORKERS, chunksize=CHUNK_SIZE
+    ):
+        self.jobs_dir = jobs_dir
+        self.chunksize = chunksize
+        self._pool = ThreadPoolExecutor(
+            workers, thread_name_prefix='scoring-job'
+        )
+        os.makedirs(jobs_dir, exist_ok=True)
+        self._resume()
+
+    def _job_dir(self, job_id):
+        if not JOB_ID.fullmatch(job_id):
+            raise ValueError(f"Invalid job ID {job_id!r}")
+        return os.path.join(self.jobs_dir, job_id)
+
+    def _save(self, state):
+        """Write a job's checkpoint atomically"""
+        path = os.path.join(self._job_dir(state['id']), STATE_FILE)
+        with open(path + '.tmp', 'w', encoding='utf-8') as f_out:
+            json.dump(state, f_out)
+        os.replace(path + '.tmp', path)
+
+    def status(self, job_id):
+        """
+        Return the last checkpoint of a job, None when it is unknown.
+        Raises ValueError for a string that is not a job ID.
+        """
+        path = os.path.join(self._job_dir(job_id), STATE_FILE)
+        try:
+            with open(path, 'r', encoding='utf-8') as f_in:
+                return json.load(f_in)
+        except FileNotFoundError:
+            return None
+
+    def jobs(self):
+        """Checkpoints of all jobs, oldest first"""
+        states = [
+            self.status(job_id)
+            for job_id in os.listdir(self.jobs_dir)
+            if JOB_ID.fullmatch(job_id)
+        ]
+        return sorted(
+            (state for state in states if state is not None),
+            key=lambda state: state['created'],
+        )
+
+    def result_path(self, job_id):
+        return os.path.join(self._job_dir(job_id), RESULTS_FILE)
+
+    def rejects_path(self, job_id):
+        return os.path.join(self._job_dir(job_id), REJECTS_FILE)
+
+    def submit(self, source, name=None, model_name='xgb'):
+        """Persist an uploaded file and queue it for scoring"""
+        if name is None:
+            name = getattr(source, 'name', source)
+        name = os.path.basename(str(name))
+        job_id = uuid.uuid4().hex[:12]
+        os.makedirs(self._job_dir(job_id))
+
+        # keep the file name, its suffix tells the reader the format
+        input_file = 'input-' + name
+        input_path = os.path.join(self._job_dir(job_id), input_file)
+        if hasattr(source, 'read'):
+            source.seek(0)
+            with open(input_path, 'wb') as f_out:
+                shutil.copyfileobj(source, f_out, 1 << 20)
+        else:
+            shutil.copyfile(source, input_path)
+
+        self._save(
+            {
+                'id': job_id,
+                'name': name,
+                'input': input_file,
+                'model': model_name,
+                'version': None,
+                'status': QUEUED,
+                'created': time.time(),
+                'finished': None,
+                'error': None,
+                'mean_income': None,
+                'total_rows': None,
+                'rows_done': 0,
+                'chunks_done': 0,
+                'positives': 0,
+                'rows_rejected': 0,
+                'bytes_written': 0,
+                'rejects_bytes_written': 0,
+                'rows_per_s': None,
+            }
+        )
+        self._pool.submit(self._run, job_id)
+        return job_id
+
+    def _resume(self):
+        """Queue again the jobs a previous process did not finish"""
+        for state in self.jobs():
+            if state['status'] in (QUEUED, RUNNING):
+                self._pool.submit(self._run, state['id'])
+
+    def _run(self, job_id):
+        state = self.status(job_id)
+        try:
+            self._score(state)
+        except Exception as exc:  # pylint: disable=broad-except
+            state.update(status=FAILED, error=repr(exc), finished=time.time())
+            self._save(state)
+
+    def _score(self, state):
+        source = os.path.join(self._job_dir(state['id']), state['input'])
+        registry = get_registry()
+        model = registry.get(state['model'])
+        state['status'] = RUNNING
+        # checkpoints written before rows could be rejected
+        state.setdefault('rows_rejected', 0)
+        state.setdefault('rejects_bytes_written', 0)
+        state['version'] = registry.version(state['model'])
+
+        # missing incomes are imputed with the mean of the whole file
+        if state['mean_income'] is None:
+            state['mean_income'], state['total_rows'] = income_mean(
+                source, self.chunksize
+            )
+        self._save(state)
+
+        start, n_scored = time.monotonic(), 0
+        with (
+            open(self.result_path(state['id']), 'ab') as f_out,
+            open(self.rejects_path(state['id']), 'ab') as f_rejects,
+        ):
+            # drop anything written after the last checkpoint
+            f_out.truncate(state['bytes_written'])
+            f_rejects.truncate(state['rejects_bytes_written'])
+            chunks = iter_customer_chunks(source, chunksize=self.chunksize)
+            for i, chunk in enumerate(chunks):
+                if i < state['chunks_done']:
+                    continue
+                chunk, rejects = score_chunk(chunk, model, state['mean_income'])
+                for f_csv, rows in [(f_out, chunk), (f_rejects, rejects)]:
+                    f_csv.write(
+                        rows.to_csv(index=False, header=i == 0).encode('utf-8')
+                    )
+                    f_csv.flush()
+                    os.fsync(f_csv.fileno())
+
+                n_scored += len(chunk) + len(rejects)
+                state['chunks_done'] = i + 1
+                state['rows_done'] += len(chunk)
+                state['rows_rejected'] += len(rejects)
+                state['positives'] += int((chunk['Prediction'] == 1).sum())
+                state['bytes_written'] = f_out.tell()
+                state['rejects_bytes_written'] = f_rejects.tell()
+                state['rows_per_s'] = n_scored / (time.monotonic() - start)
+                self._save(state)
+
+        state.update(status=DONE, finished=time.time())
+        self._save(state)
+
+
+_queue = None
+_queue_lock = threading.Lock()
+
+
+def get_job_queue():
+    """Return the process-wide job queue, resuming unfinished jobs"""
+    global _queue  # pylint: disable=global-statement
+    with _queue_lock:
+        if _queue is None:
+            _queue = JobQueue()
+        return _queue
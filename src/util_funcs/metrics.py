@@ -0,0 +1,224 @@
+import os
+import time
+import bisect
+import functools
+import threading
+from numbers import Integral
+
+# stage timings are only recorded when switched on, from the environment
+# or with enable()
+_enabled = os.environ.get('SCORING_METRICS', '').lower() in ('1', 'true')
+
+# upper bounds of the latency histogram buckets, in seconds
+BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    float('inf'),
+)
+
+_PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+
+def enable(flag=True):
+    """Switch the recording of stage timings on or off"""
+    global _enabled  # pylint: disable=global-statement
+    _enabled = flag
+
+
+def enabled():
+    return _enabled
+
+
+def rss_bytes():
+    """Resident set size of this process, None where /proc is missing"""
+    try:
+        with open('/proc/self/statm', 'rb') as f_in:
+            return int(f_in.read().split()[1]) * _PAGE_SIZE
+    except (OSError, IndexError, ValueError):
+        return None
+
+
+class StageMetrics:
+    """Latency histogram, row count and memory growth of one stage"""
+
+    def __init__(self):
+        self.bucket_counts = [0] * len(BUCKETS)
+        self.count = 0
+        self.seconds = 0.0
+        self.rows = 0
+        self.rss_growth = 0
+        self.max_rss_growth = 0
+
+    def observe(self, seconds, rows=None, rss_delta=None):
+        self.bucket_counts[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.count += 1
+        self.seconds += seconds
+        if rows is not None:
+            self.rows += rows
+        if rss_delta is not None and rss_delta > 0:
+            self.rss_growth += rss_delta
+            self.max_rss_growth = max(self.max_rss_growth, rss_delta)
+
+    def quantile(self, q):
+        """Upper bucket bound below which a share q of the timings fall"""
+        if not self.count:
+            return 0.0
+        seen = 0
+        for bound, count in zip(BUCKETS, self.bucket_counts):
+            seen += count
+            if seen >= q * self.count:
+                return bound
+        return BUCKETS[-1]
+
+
+class MetricsRegistry:
+    """Thread-safe collection of per-stage metrics"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stages = {}
+
+    def observe(self, stage, seconds, rows=None, rss_delta=None):
+        with self._lock:
+            if stage not in self._stages:
+                self._stages[stage] = StageMetrics()
+            self._stages[stage].observe(seconds, rows, rss_delta)
+
+    def reset(self):
+        with self._lock:
+            self._stages = {}
+
+    def summary(self):
+        """One dict per stage, with call count, mean and p50/p99 seconds"""
+        with self._lock:
+            stages = sorted(self._stages.items())
+            return [
+                {
+                    'stage': stage,
+                    'calls': metrics.count,
+                    'mean_s': metrics.seconds / metrics.count,
+                    'p50_s': metrics.quantile(0.5),
+                    'p99_s': metrics.quantile(0.99),
+                    'total_s': metrics.seconds,
+                    'rows': metrics.rows,
+                    'rss_growth_mb': metrics.rss_growth / 2**20,
+                }
+                for stage, metrics in stages
+            ]
+
+    def to_prometheus(self):
+        """Render all stages in the Prometheus text exposition format"""
+        lines = [
+            '# HELP scoring_stage_seconds Time spent in each scoring stage.',
+            '# TYPE scoring_stage_seconds histogram',
+        ]
+        with self._lock:
+            stages = sorted(self._stages.items())
+            for stage, metrics in stages:
+                cumulative = 0
+                for bound, count in zip(BUCKETS, metrics.bucket_counts):
+                    cumulative += count
+                    le = '+Inf' if bound == float('inf') else repr(bound)
+                    lines.append(
+                        f'scoring_stage_seconds_bucket{{stage="{stage}",'
+                        f'le="{le}"}} {cumulative}'
+                    )
+                lines.append(
+                    f'scoring_stage_seconds_sum{{stage="{stage}"}} '
+                    f'{metrics.seconds!r}'
+                )
+                lines.append(
+                    f'scoring_stage_seconds_count{{stage="{stage}"}} '
+                    f'{metrics.count}'
+                )
+
+            lines.append(
+                '# HELP scoring_stage_rows_total Rows processed by each stage.'
+            )
+            lines.append('# TYPE scoring_stage_rows_total counter')
+            for stage, metrics in stages:
+                lines.append(
+                    f'scoring_stage_rows_total{{stage="{stage}"}} '
+                    f'{metrics.rows}'
+                )
+
+            lines.append(
+                '# HELP scoring_stage_rss_growth_bytes_total Resident memory '
+                'added while in each stage.'
+            )
+            lines.append('# TYPE scoring_stage_rss_growth_bytes_total counter')
+            for stage, metrics in stages:
+                lines.append(
+                    'scoring_stage_rss_growth_bytes_total'
+                    f'{{stage="{stage}"}} {metrics.rss_growth}'
+                )
+        return '\n'.join(lines) + '\n'
+
+
+_registry = MetricsRegistry()
+
+
+def get_metrics():
+    """Return the process-wide metrics registry"""
+    return _registry
+
+
+class timed:  # pylint: disable=invalid-name
+    """
+    Record the duration of a stage, as a context manager or decorator.
+
+    As a context manager, set ``rows`` on the returned object once the
+    row count is known. As a decorator, ``rows`` may be a function of the
+    result, e.g. ``len``. Nothing is measured while metrics are disabled,
+    which costs one flag check per call.
+    """
+
+    def __init__(self, stage, rows=None):
+        self.stage = stage
+        self.rows = rows
+        self._start = None
+        self._rss = None
+
+    def __enter__(self):
+        if _enabled:
+            self._rss = rss_bytes()
+            self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        if self._start is None:
+            return
+        seconds = time.perf_counter() - self._start
+        rss = rss_bytes()
+        rss_delta = None
+        if rss is not None and self._rss is not None:
+            rss_delta = rss - self._rss
+        rows = self.rows if isinstance(self.rows, Integral) else None
+        _registry.observe(self.stage, seconds, rows, rss_delta)
+        self._start = None
+
+    def __call__(self, func):
+        stage, rows = self.stage, self.rows
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            with timed(stage) as timer:
+                result = func(*args, **kwargs)
+                timer.rows = rows(result) if callable(rows) else rows
+            return result
+
+        return wrapper
@@ -0,0 +1,87 @@
+import os
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from util_funcs.encoder import get_encoder
+from util_funcs.registry import get_registry
+
+# pool size and rows per shard, overridable from the environment
+WORKERS = int(os.environ.get('SCORING_WORKERS', os.cpu_count() or 1))
+SHARD_SIZE = int(os.environ.get('SCORING_SHARD_SIZE', 50_000))
+
+# model loaded once in each worker process
+_worker_model = None
+
+
+def _init_worker(model_name):
+    """Load the model when a worker process starts"""
+    global _worker_model  # pylint: disable=global-statement
+    _worker_model = get_registry().get(model_name)
+
+    # the pool provides the parallelism, keep estimators single threaded
+    estimator = _worker_model.steps[-1][1]
+    # compacted pipelines end with a flat forest, which has no n_jobs
+    if 'n_jobs' in getattr(estimator, 'get_params', dict)():
+        estimator.set_params(n_jobs=1)
+
+
+def _predict_rows(X):
+    """Score already encoded rows inside a worker"""
+    _, estimator = get_encoder(_worker_model)
+    return estimator.predict(X)
+
+
+class ScoringEngine:
+    """
+    Long-lived process pool that scores encoded batches in shards.
+
+    Batches are cleaned and encoded by the caller, which needs the cleaned
+    frame and checks the prediction cache first, so only the rows the
+    cache misses are sent. Every worker loads the registry model once when
+    it starts. Shards are mapped in order, so predictions line up with the
+    rows of the input. The pool is restarted when the registry swaps in a
+    new model version. With a single worker the pool would only add the
+    transfer of every shard, rows are then scored in this process.
+    """
+
+    def __init__(self, model_name, workers=WORKERS, shard_size=SHARD_SIZE):
+        self.model_name = model_name
+        self.workers = workers
+        self.shard_size = shard_size
+        self._version = None
+        self._pool = None
+
+    def _get_pool(self):
+        version = get_registry().version(self.model_name)
+        if self._pool is None or version != self._version:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False)
+            # spawn rather than fork the threaded Streamlit server
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_worker,
+                initargs=(self.model_name,),
+            )
+            self._version = version
+        return self._pool
+
+    def predict_encoded(self, X):
+        """Return the predictions for rows already cleaned and encoded"""
+        if self.workers <= 1:
+            _, estimator = get_encoder(get_registry().get(self.model_name))
+            return estimator.predict(X)
+        pool = self._get_pool()
+        shards = [
+            X[start : start + self.shard_size]
+            for start in range(0, len(X), self.shard_size)
+        ]
+        if not shards:
+            return np.empty(0, dtype=np.int64)
+        return np.concatenate(list(pool.map(_predict_rows, shards)))
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown()
@@ -1,10 +1,13 @@
 import os
-import pickle
-from datetime import date, datetime
+import bisect
+from datetime import date, time, datetime
 
 import numpy as np
 import pandas as pd
 
+from util_funcs.metrics import timed
+from util_funcs.registry import read_model_file
+
 # fmt: off
 # define the bin edges for age groups
 bins = [18, 25, 35, 45, 55, 66, np.inf]
@@ -34,96 +37,257 @@ categorical_ftrs = ['Education', 'Marital_Status', 'Age_Group', 'Children', 'Acc
 # redundant features
 redundant_features = ['Z_CostContact', 'Z_Revenue', 'Year_Birth', 'Dt_Customer', 'Age',
                           'ID', 'Kidhome', 'Teenhome', 'Response'] + spend_cols
+
+# columns of the customer files
+file_columns = ['ID', 'Year_Birth', 'Education', 'Marital_Status', 'Income', 'Kidhome',
+                'Teenhome', 'Dt_Customer', 'Recency'] + spend_cols + [
+                'NumDealsPurchases', 'NumWebPurchases', 'NumCatalogPurchases',
+                'NumStorePurchases', 'NumWebVisitsMonth', 'AcceptedCmp3', 'AcceptedCmp4',
+                'AcceptedCmp5', 'AcceptedCmp1', 'AcceptedCmp2', 'Complain', 'Z_CostContact',
+                'Z_Revenue', 'Response']
 # fmt: on
 
+# reference date of the customer files, collected up to mid 2014
+FILE_REFERENCE_DATE = date(2014, 6, 30)
 
-def clean_form_data(df):
-    """This function cleans and pre-processes the input DataFrame"""
-    # Conversions into 'datetime' data type
-    df['Year_Birth'] = pd.to_datetime(df['Year_Birth'], format='%Y')
-    df["Dt_Customer"] = pd.to_datetime(df["Dt_Customer"])
+# format of the enrollment dates in customer files
+DATE_FORMAT = '%Y-%m-%d'
 
-    # get customer age
-    # assuming analysis was conducted in recent time
-    now = date.today()
-    df['Age'] = now.year - df['Year_Birth'].dt.year
 
-    # create the age groups column
-    df['Age_Group'] = pd.cut(df['Age'], bins=bins, labels=labels, right=False)
+def _code_table(mapping):
+    """
+    Precompute the integer codes of a re-coding dictionary.
 
-    # number of days since customer enrolled converted to months
-    end_fiscal = pd.to_datetime(now)
-    df['Tenure'] = (end_fiscal - df['Dt_Customer']).dt.days
-    df['Tenure'] = (df['Tenure'] / 30.44).round(1)
+    Returns the accepted raw values, the recoded categories and the code
+    of each raw value, followed by -1 for values that are not accepted.
+    Recoded values are accepted as they are.
+    """
+    targets = sorted(set(mapping.values()))
+    sources = list(mapping) + [t for t in targets if t not in mapping]
+    codes = [targets.index(mapping.get(value, value)) for value in sources]
+    return pd.Index(sources), targets, np.array(codes + [-1], dtype=np.int8)
+
+
+# code tables for the re-coded columns
+marital_codes = _code_table(marital_status)
+education_codes = _code_table(education_level)
+
+# narrow dtypes of the customer file columns, applied after reading. Counts
+# and amounts fit in int16 and flags in int8, strings repeat so they are
+# read as categories. Income stays float64, its mean imputes missing values,
+# and IDs stay int64 so no customer ID is ever changed
+file_dtypes = {
+    'ID': 'int64',
+    'Year_Birth': 'int16',
+    'Education': 'category',
+    'Marital_Status': 'category',
+    'Income': 'float64',
+    'Kidhome': 'int8',
+    'Teenhome': 'int8',
+    'Dt_Customer': 'category',
+    'Recency': 'int16',
+    **{col: 'int16' for col in spend_cols},
+    'NumDealsPurchases': 'int16',
+    'NumWebPurchases': 'int16',
+    'NumCatalogPurchases': 'int16',
+    'NumStorePurchases': 'int16',
+    'NumWebVisitsMonth': 'int16',
+    'AcceptedCmp3': 'int8',
+    'AcceptedCmp4': 'int8',
+    'AcceptedCmp5': 'int8',
+    'AcceptedCmp1': 'int8',
+    'AcceptedCmp2': 'int8',
+    'Complain': 'int8',
+    'Z_CostContact': 'int8',
+    'Z_Revenue': 'int8',
+    'Response': 'int8',
+}
+
+
+def _recode(values, code_table):
+    """Map raw values to their recoded categories, unknown values to NaN"""
+    sources, targets, codes = code_table
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        # only the categories need looking up
+        positions = sources.get_indexer(values.cat.categories)
+        lookup = np.append(codes[positions], -1)
+        new_codes = lookup[values.cat.codes.to_numpy()]
+    else:
+        new_codes = codes[sources.get_indexer(values)]
+    return pd.Categorical.from_codes(new_codes, categories=targets)
+
+
+def _parse_dates(values, date_format):
+    """Parse dates with an explicit format, inferring it if that fails"""
+    if pd.api.types.infer_dtype(values, skipna=True) == 'string':
+        try:
+            return pd.to_datetime(values, format=date_format)
+        except ValueError:
+            pass
+    return pd.to_datetime(values)
+
+
+def _tenure(values, reference_date, date_format):
+    """Months between enrollment and the reference date, to one decimal"""
+    # enrollment dates repeat a lot, only the distinct ones are parsed
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        codes, uniques = values.cat.codes.to_numpy(), values.cat.categories
+    else:
+        codes, uniques = pd.factorize(values)
+    if not pd.api.types.is_datetime64_any_dtype(uniques):
+        uniques = _parse_dates(uniques, date_format)
+
+    days = (pd.Timestamp(reference_date) - pd.DatetimeIndex(uniques)).days
+    tenure = np.round(np.asarray(days, dtype=np.float64) / 30.44, 1)
+    return np.append(tenure, np.nan)[codes]
+
+
+def clean_data(
+    df, reference_date, impute_income='mean', date_format=DATE_FORMAT
+):
+    """
+    Clean and pre-process customer data in a single pass.
 
-    # use overall spending
-    df['Spending'] = df[spend_cols].sum(axis=1)
+    Ages and tenures are computed relative to ``reference_date``. Missing
+    incomes are filled with the column mean when ``impute_income`` is
+    'mean', with ``impute_income`` itself when it is a number and left
+    as they are when it is None. The input DataFrame is not modified and
+    unrecognised education or marital status values become missing.
+    """
+    # get customer age and create the age groups column
+    age = reference_date.year - np.asarray(df['Year_Birth'], dtype=np.float64)
+    age_codes = np.searchsorted(bins, age, side='right') - 1
+    age_codes[age_codes >= len(labels)] = -1
+    age_group = pd.Categorical.from_codes(
+        age_codes, categories=labels, ordered=True
+    )
 
-    # reduce categories in marital status
-    df['Marital_Status'] = df['Marital_Status'].replace(marital_status)
+    # number of days since customer enrolled converted to months
+    tenure = _tenure(df['Dt_Customer'], reference_date, date_format)
 
-    # reduce categories in education
-    df['Education'] = df['Education'].replace(education_level)
+    # use overall spending, narrowed back when read with narrow amounts
+    spending = df[spend_cols].sum(axis=1)
+    if all(
+        pd.api.types.is_integer_dtype(df[col]) and df[col].dtype.itemsize <= 2
+        for col in spend_cols
+    ):
+        spending = spending.astype(np.int32)
 
     # get the total count of children
-    df['Children'] = df['Kidhome'] + df['Teenhome']
-
-    # convert categorical features as categories
-    df[categorical_ftrs] = df[categorical_ftrs].astype('category')
+    children = (df['Kidhome'] + df['Teenhome']).astype('category')
+
+    # fill missing values of income
+    income = df['Income']
+    if isinstance(impute_income, str) and impute_income == 'mean':
+        income = income.fillna(income.mean())
+    elif impute_income is not None:
+        income = income.fillna(impute_income)
+
+    replaced = {
+        'Education': _recode(df['Education'], education_codes),
+        'Marital_Status': _recode(df['Marital_Status'], marital_codes),
+        'Income': income,
+    }
+    derived = {
+        'Age_Group': age_group,
+        'Tenure': tenure,
+        'Spending': spending,
+        'Children': children,
+    }
+
+    # remaining categorical features as category dtype
+    for col in categorical_ftrs:
+        if col not in replaced and col not in derived:
+            replaced[col] = df[col].astype('category')
+
+    # keep the useful columns in their original order, then the new ones
+    columns = {
+        col: replaced.get(col, df[col])
+        for col in df.columns
+        if col not in redundant_features and col not in derived
+    }
+    columns.update(derived)
+    return pd.DataFrame(columns, index=df.index)
+
+
+@timed('clean_form_data', rows=len)
+def clean_form_data(df):
+    """This function cleans and pre-processes the input DataFrame"""
+    # assuming analysis was conducted in recent time
+    return clean_data(df, reference_date=date.today(), impute_income=None)
 
-    # drop redundant features
-    for col in redundant_features:
-        if col in df.columns:
-            df = df.drop(col, axis=1)
 
-    return df
+def _recode_value(value, mapping, targets):
+    """Scalar counterpart of _recode"""
+    if value in mapping:
+        return mapping[value]
+    return value if value in targets else np.nan
 
 
-# function to clean the file data
-def clean_file_data(df):
-    """This function cleans and pre-processes the input CSV DataFrame"""
-    # Conversions into 'datetime' data type
-    df['Year_Birth'] = pd.to_datetime(df['Year_Birth'], format='%Y')
-    df["Dt_Customer"] = pd.to_datetime(df["Dt_Customer"])
+@timed('clean_form_record', rows=1)
+def clean_form_record(record, reference_date=None):
+    """
+    Clean a single customer given as a mapping of form fields.
 
-    # get customer age
-    # assuming analysis was conducted in 2014
-    now = 2014
-    df['Age'] = now - df['Year_Birth'].dt.year
+    Scalar fast path of ``clean_form_data``: returns the same features as
+    its one-row DataFrame, as a dict, without going through pandas.
+    """
+    if reference_date is None:
+        reference_date = date.today()
 
-    # create the age groups column
-    df['Age_Group'] = pd.cut(df['Age'], bins=bins, labels=labels, right=False)
+    # get customer age and its age group
+    age = reference_date.year - record['Year_Birth']
+    age_index = bisect.bisect_right(bins, age) - 1
+    if 0 <= age_index < len(labels):
+        age_group = labels[age_index]
+    else:
+        age_group = np.nan
 
     # number of days since customer enrolled converted to months
-    end_fiscal = datetime(2014, 6, 30)
-    df['Tenure'] = (end_fiscal - df['Dt_Customer']).dt.days
-    df['Tenure'] = (df['Tenure'] / 30.44).round(1)
-
-    # use overall spending
-    df['Spending'] = df[spend_cols].sum(axis=1)
-
-    # reduce categories in marital status
-    df['Marital_Status'] = df['Marital_Status'].replace(marital_status)
-
-    # reduce categories in education
-    df['Education'] = df['Education'].replace(education_level)
-
-    # get the total count of children
-    df['Children'] = df['Kidhome'] + df['Teenhome']
-
-    # fill missing values of income with the mean
-    income_mean = df['Income'].mean()
-    df['Income'] = df['Income'].fillna(income_mean)
+    enrolled = record['Dt_Customer']
+    if isinstance(enrolled, str):
+        try:
+            enrolled = datetime.strptime(enrolled, DATE_FORMAT)
+        except ValueError:
+            enrolled = pd.Timestamp(enrolled).to_pydatetime()
+    if isinstance(enrolled, datetime):
+        reference_date = datetime.combine(reference_date, time())
+    days = (reference_date - enrolled).days
+
+    derived = {
+        'Age_Group': age_group,
+        'Tenure': float(np.round(days / 30.44, 1)),
+        'Spending': sum(record[col] for col in spend_cols),
+        'Children': record['Kidhome'] + record['Teenhome'],
+    }
+
+    features = {
+        col: value
+        for col, value in record.items()
+        if col not in redundant_features and col not in derived
+    }
+    features['Education'] = _recode_value(
+        record['Education'], education_level, education_codes[1]
+    )
+    features['Marital_Status'] = _recode_value(
+        record['Marital_Status'], marital_status, marital_codes[1]
+    )
+    features.update(derived)
+    return features
 
-    # turn categories into category dtype
-    df[categorical_ftrs] = df[categorical_ftrs].astype('category')
 
-    # drop redundant features
-    for col in redundant_features:
-        if col in df.columns:
-            df = df.drop(col, axis=1)
+# function to clean the file data
+@timed('clean_file_data', rows=len)
+def clean_file_data(df, income_mean=None):
+    """
+    This function cleans and pre-processes the input CSV DataFrame.
 
-    return df
+    Missing incomes are filled with ``income_mean``, or with the mean of
+    the frame itself when it is not given.
+    """
+    # assuming analysis was conducted in 2014
+    impute_income = 'mean' if income_mean is None else income_mean
+    return clean_data(df, FILE_REFERENCE_DATE, impute_income=impute_income)
 
 
 def load_model(model_prefix="model_"):
@@ -136,11 +300,11 @@ def load_model(model_prefix="model_"):
         os.path.join(os.path.dirname(__file__), '../..', 'models')
     )
 
-    model_files = [
+    model_files = sorted(
         f
         for f in os.listdir(model_dir)
-        if f.startswith(model_prefix) and f.endswith('.pkl')
-    ]
+        if f.startswith(model_prefix) and f.endswith(('.pkl', '.joblib'))
+    )
 
     if not model_files:
         raise FileNotFoundError(
@@ -151,6 +315,4 @@ def load_model(model_prefix="model_"):
     # Assuming the latest model is the last one alphabetically
     selected_model = model_files[-1]
     model_path = os.path.join(model_dir, selected_model)
-    with open(model_path, 'rb') as f_in:
-        model = pickle.load(f_in)
-    return model
+    return read_model_file(model_path)
@@ -0,0 +1,256 @@
+import os
+import hashlib
+import sqlite3
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+# rows kept in memory per model and optional on-disk tier, from the
+# environment, an entry takes about 150 bytes
+MAX_ENTRIES = int(os.environ.get('PREDICTION_CACHE_ENTRIES', 200_000))
+DB_PATH = os.environ.get('PREDICTION_CACHE_DB')
+
+# keys per SQLite query, below its bound parameter limit
+_DB_BATCH = 500
+
+# rows hashed at a time, few enough for a block to stay in cache
+_HASH_BLOCK = 8192
+
+# odd multipliers of the two 64-bit lanes of a key and of the final mix
+_LANE_MULTIPLIERS = [
+    np.uint64(0x9E3779B97F4A7C15),
+    np.uint64(0xC2B2AE3D27D4EB4F),
+]
+_MIX = [
+    (np.uint64(30), np.uint64(0xBF58476D1CE4E5B9)),
+    (np.uint64(27), np.uint64(0x94D049BB133111EB)),
+    (np.uint64(31), np.uint64(1)),
+]
+
+
+def _hash_block(words, seed, multiplier):
+    """64-bit hash of each column of ``words``, one row per feature"""
+    lane = np.full(words.shape[1], seed, dtype=np.uint64)
+    shifted = np.empty_like(lane)
+    for feature in words:
+        lane ^= feature
+        lane *= multiplier
+        np.right_shift(lane, np.uint64(29), out=shifted)
+        lane ^= shifted
+    # splitmix64 finalizer, so every input bit reaches every output bit
+    for shift, factor in _MIX:
+        np.right_shift(lane, shift, out=shifted)
+        lane ^= shifted
+        lane *= factor
+    return lane
+
+
+def _first_missing_rows(keys, results):
+    """Index of the first row of every distinct key not in ``results``"""
+    first_row = {}
+    for i, key in enumerate(keys):
+        if key not in results and key not in first_row:
+            first_row[key] = i
+    return first_row
+
+
+def _tier_counts(keys, from_memory, from_disk):
+    """Rows found in memory, found on disk and missing from both"""
+    counts = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0}
+    for key in keys:
+        if key in from_memory:
+            counts['memory_hits'] += 1
+        elif key in from_disk:
+            counts['disk_hits'] += 1
+        else:
+            counts['misses'] += 1
+    return counts
+
+
+class PredictionCache:
+    """
+    Content-addressed cache of predictions.
+
+    Entries are keyed by the model version and a hash of the encoded
+    feature row, so a re-scored customer hits the cache whatever its ID
+    and a new model version never sees stale results. Each model has a
+    bounded LRU in memory, backed by an optional SQLite file. Entries of
+    a model's old version are dropped when its new version is first used.
+    """
+
+    def __init__(self, max_entries=MAX_ENTRIES, db_path=DB_PATH):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        # model name -> (version, LRU of key -> prediction)
+        self._memory = {}
+        self._counters = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0}
+
+        self._db = None
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute(
+                'CREATE TABLE IF NOT EXISTS predictions ('
+                'key BLOB PRIMARY KEY, model TEXT, version TEXT, prediction)'
+            )
+            self._db.commit()
+
+    @staticmethod
+    def row_keys(version, X):
+        """
+        Hash each encoded row together with the model version.
+
+        Keys are 16 bytes, two 64-bit lanes seeded from the version and
+        computed for blocks of rows at once. Rows are hashed by value as
+        float64, so only numeric matrices are accepted.
+        """
+        X = np.asarray(X)
+        if X.ndim != 2 or X.dtype.kind not in 'biuf':
+            raise TypeError(
+                f"Expected a 2-D numeric feature matrix, got {X.ndim}-D "
+                f"{X.dtype}"
+            )
+        seeds = np.frombuffer(
+            hashlib.blake2b(version.encode(), digest_size=16).digest(),
+            dtype=np.uint64,
+        )
+        keys = np.empty((len(X), 2), dtype=np.uint64)
+        for start in range(0, len(X), _HASH_BLOCK):
+            block = np.ascontiguousarray(
+                X[start : start + _HASH_BLOCK].T, dtype=np.float64
+            )
+            # -0.0 and every NaN payload hash like 0.0 and NaN
+            block += 0.0
+            block[np.isnan(block)] = np.nan
+            words = block.view(np.uint64)
+            for lane, (seed, multiplier) in enumerate(
+                zip(seeds, _LANE_MULTIPLIERS)
+            ):
+                keys[start : start + _HASH_BLOCK, lane] = _hash_block(
+                    words, seed, multiplier
+                )
+        return keys.view('V16').ravel().tolist()
+
+    def _lru(self, model_name, version):
+        """Return the in-memory LRU of a model, invalidating old versions"""
+        cached_version, lru = self._memory.get(model_name, (None, None))
+        if cached_version != version:
+            lru = OrderedDict()
+            self._memory[model_name] = (version, lru)
+            if self._db is not None:
+                self._db.execute(
+                    'DELETE FROM predictions WHERE model = ? AND version != ?',
+                    (model_name, version),
+                )
+                self._db.commit()
+        return lru
+
+    def _disk_lookup(self, keys):
+        found = {}
+        for start in range(0, len(keys), _DB_BATCH):
+            batch = keys[start : start + _DB_BATCH]
+            placeholders = ','.join('?' * len(batch))
+            found.update(
+                self._db.execute(
+                    'SELECT key, prediction FROM predictions '
+                    f'WHERE key IN ({placeholders})',
+                    batch,
+                )
+            )
+        return found
+
+    def _remember(self, lru, entries):
+        """Add entries to an in-memory LRU, evicting the oldest ones"""
+        for key, value in entries.items():
+            lru[key] = value
+            lru.move_to_end(key)
+        while len(lru) > self.max_entries:
+            lru.popitem(last=False)
+
+    def _store(self, model_name, version, entries):
+        self._remember(self._lru(model_name, version), entries)
+        if self._db is not None and entries:
+            self._db.executemany(
+                'INSERT OR REPLACE INTO predictions VALUES (?, ?, ?, ?)',
+                [
+                    (key, model_name, version, value)
+                    for key, value in entries.items()
+                ],
+            )
+            self._db.commit()
+
+    def _lookup(self, model_name, version, keys):
+        """Predictions found in memory and on disk, by key"""
+        with self._lock:
+            lru = self._lru(model_name, version)
+
+            from_memory = {}
+            for key in keys:
+                if key in lru and key not in from_memory:
+                    lru.move_to_end(key)
+                    from_memory[key] = lru[key]
+
+            from_disk = {}
+            if self._db is not None:
+                missing = [
+                    key for key in dict.fromkeys(keys) if key not in from_memory
+                ]
+                from_disk = self._disk_lookup(missing)
+                self._remember(lru, from_disk)
+        return from_memory, from_disk
+
+    def predict(self, model_name, version, X, predict_fn):
+        """
+        Return predictions of a model version for the encoded rows ``X``
+        and how many of the rows were found in the cache.
+
+        Only rows missing from both tiers are passed to ``predict_fn``,
+        once per distinct row.
+        """
+        keys = self.row_keys(f'{model_name}:{version}', X)
+        from_memory, from_disk = self._lookup(model_name, version, keys)
+        results = {**from_memory, **from_disk}
+
+        # score the first row of every distinct key still missing
+        first_row = _first_missing_rows(keys, results)
+        fresh = {}
+        if first_row:
+            values = np.asarray(predict_fn(X[list(first_row.values())]))
+            fresh = dict(zip(first_row, values.tolist()))
+            results.update(fresh)
+
+        counts = _tier_counts(keys, from_memory, from_disk)
+        with self._lock:
+            self._store(model_name, version, fresh)
+            self._counters = {
+                name: total + counts[name]
+                for name, total in self._counters.items()
+            }
+
+        n_hits = len(keys) - counts['misses']
+        return np.asarray([results[key] for key in keys]), n_hits
+
+    def stats(self):
+        """Hit counters and rates since the cache was created"""
+        with self._lock:
+            counters = dict(self._counters)
+            counters['entries'] = sum(
+                len(lru) for _, lru in self._memory.values()
+            )
+        lookups = sum(counters[name] for name in self._counters)
+        hits = counters['memory_hits'] + counters['disk_hits']
+        counters['hit_rate'] = hits / lookups if lookups else 0.0
+        return counters
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_prediction_cache():
+    """Return the process-wide prediction cache"""
+    global _cache  # pylint: disable=global-statement
+    with _cache_lock:
+        if _cache is None:
+            _cache = PredictionCache()
+        return _cache
@@ -0,0 +1,142 @@
+import numpy as np
+import pandas as pd
+
+from util_funcs.batch import CHUNK_SIZE, income_mean
+from util_funcs.encoder import predict_proba
+from util_funcs.readers import iter_customer_chunks
+from util_funcs.validation import validate_customers
+from util_funcs.pre_process import clean_file_data
+
+# cleaned columns quotas can be set on
+quota_columns = ['Age_Group', 'Education']
+
+
+def top_positions(scores, order, k):
+    """
+    Positions of the k highest scores, without sorting all of them.
+
+    Ties at the cut-off go to the rows that came first in ``order``.
+    """
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    if len(scores) <= k:
+        return np.arange(len(scores))
+    kth = np.partition(scores, len(scores) - k)[len(scores) - k]
+    above = np.flatnonzero(scores > kth)
+    tied = np.flatnonzero(scores == kth)
+    tied = tied[np.argsort(order[tied], kind='stable')][: k - len(above)]
+    return np.concatenate([above, tied])
+
+
+class TopK:
+    """
+    Bounded selection of the k most likely responders across chunks.
+
+    Each chunk is reduced to its own top k with a partial selection and
+    merged with the rows kept so far, so memory stays proportional to k.
+    Rows need a ``Probability`` and an ``_order`` column.
+    """
+
+    def __init__(self, k):
+        self.k = k
+        self.rows = None
+
+    def _select(self, rows):
+        keep = top_positions(
+            rows['Probability'].to_numpy(), rows['_order'].to_numpy(), self.k
+        )
+        return rows.iloc[keep]
+
+    def push(self, rows):
+        if self.k <= 0 or rows.empty:
+            return
+        rows = self._select(rows)
+        if self.rows is not None:
+            rows = self._select(pd.concat([self.rows, rows]))
+        self.rows = rows
+
+    def result(self):
+        """Kept rows, most likely responders first"""
+        if self.rows is None:
+            return pd.DataFrame(columns=['Probability', '_order'])
+        return self.rows.sort_values(
+            ['Probability', '_order'], ascending=[False, True], kind='stable'
+        )
+
+
+class SegmentedTopK:
+    """
+    Top customers under an overall budget and per-segment quotas.
+
+    Each segment keeps its own top ``quota`` rows, segments without a
+    quota are bounded by the budget only. The budget is then filled with
+    the best of the per-segment selections.
+    """
+
+    def __init__(self, budget, column, quotas):
+        self.budget = budget
+        self.column = column
+        self.quotas = quotas
+        self._segments = {}
+
+    def push(self, rows):
+        for segment, segment_rows in rows.groupby(self.column, sort=False):
+            if segment not in self._segments:
+                quota = min(self.quotas.get(segment, self.budget), self.budget)
+                self._segments[segment] = TopK(quota)
+            self._segments[segment].push(segment_rows)
+
+    def result(self):
+        overall = TopK(self.budget)
+        for selection in self._segments.values():
+            if selection.rows is not None:
+                overall.push(selection.rows)
+        return overall.result()
+
+
+# the options are independent and passed by keyword from the ranking form
+def rank_customers(  # pylint: disable=too-many-arguments
+    source,
+    model,
+    budget,
+    segment_column=None,
+    quotas=None,
+    chunksize=CHUNK_SIZE,
+    name=None,
+):
+    """
+    Return the ``budget`` customers of a file most likely to respond.
+
+    The file is scored chunk by chunk with ``predict_proba``, so it never
+    has to fit in memory. With a ``segment_column`` from
+    ``quota_columns``, ``quotas`` caps the customers taken per segment;
+    customers with a missing segment are grouped as 'Unknown'. Customers
+    failing ``validate_customers`` are left out of the ranking. The result
+    holds a 1-based ``Rank``, the input columns, the cleaned ``Segment``
+    when quotas are used and the ``Probability``.
+    """
+    if segment_column is not None and segment_column not in quota_columns:
+        raise ValueError(f"Quotas can only be set on {quota_columns}")
+    if segment_column is None:
+        selection = TopK(budget)
+    else:
+        selection = SegmentedTopK(budget, 'Segment', quotas or {})
+
+    mean_income, _ = income_mean(source, chunksize, name)
+    n_seen = 0
+    for chunk in iter_customer_chunks(source, name, chunksize):
+        chunk, _ = validate_customers(chunk)
+        if chunk.empty:
+            continue
+        chunk_clean = clean_file_data(chunk, income_mean=mean_income)
+        chunk['Probability'] = predict_proba(model, chunk_clean)[:, 1]
+        chunk['_order'] = np.arange(n_seen, n_seen + len(chunk))
+        if segment_column is not None:
+            segments = chunk_clean[segment_column].astype(object)
+            chunk['Segment'] = segments.fillna('Unknown').to_numpy()
+        n_seen += len(chunk)
+        selection.push(chunk)
+
+    ranked = selection.result().drop(columns='_order')
+    ranked.insert(0, 'Rank', np.arange(1, len(ranked) + 1))
+    return ranked.reset_index(drop=True)
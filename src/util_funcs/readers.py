@@ -0,0 +1,237 @@
+import io
+import os
+
+import numpy as np
+import pandas as pd
+
+from util_funcs.pre_process import file_dtypes, file_columns
+
+# columns needed to clean, score and identify customers
+input_columns = [
+    col
+    for col in file_columns
+    if col not in ('Z_CostContact', 'Z_Revenue', 'Response')
+]
+
+# compressed CSV suffixes and their pandas compression names
+csv_compressions = {
+    '.gz': 'gzip',
+    '.bz2': 'bz2',
+    '.xz': 'xz',
+    '.zip': 'zip',
+    '.zst': 'zstd',
+}
+
+# columnar formats by file suffix
+columnar_suffixes = {
+    '.parquet': 'parquet',
+    '.pq': 'parquet',
+    '.feather': 'feather',
+    '.arrow': 'feather',
+    '.ipc': 'feather',
+}
+
+# extensions accepted by the upload widget
+upload_types = (
+    ['csv']
+    + [s[1:] for s in csv_compressions]
+    + [s[1:] for s in columnar_suffixes]
+)
+
+# mime type and file extension of each export format
+export_formats = {
+    'csv': ('text/csv', '.csv'),
+    'parquet': ('application/vnd.apache.parquet', '.parquet'),
+    'feather': ('application/vnd.apache.arrow.file', '.feather'),
+}
+
+
+def _pyarrow(purpose):
+    """Import pyarrow, which is only needed for the columnar formats"""
+    try:
+        import pyarrow  # pylint: disable=import-outside-toplevel
+        import pyarrow.ipc  # pylint: disable=import-outside-toplevel
+        import pyarrow.parquet  # pylint: disable=import-outside-toplevel
+    except ImportError as exc:
+        raise ImportError(
+            f"{purpose} requires pyarrow, install it with "
+            "'poetry install --extras columnar'"
+        ) from exc
+    return pyarrow
+
+
+def _name(source, name):
+    if name is None:
+        name = getattr(source, 'name', source)
+    return os.path.basename(str(name)).lower()
+
+
+def file_format(source, name=None):
+    """Return 'csv', 'parquet' or 'feather' and the CSV compression"""
+    name = _name(source, name)
+    _, suffix = os.path.splitext(name)
+    if suffix in columnar_suffixes:
+        return columnar_suffixes[suffix], None
+    if suffix in csv_compressions:
+        return 'csv', csv_compressions[suffix]
+    return 'csv', None
+
+
+def _rewind(source):
+    if hasattr(source, 'seek'):
+        source.seek(0)
+
+
+def narrow_dtypes(df):
+    """
+    Convert the columns of a customer frame to the narrow file dtypes.
+
+    Integer columns are only narrowed when they have no missing values
+    and fit the narrow type, the others keep their dtype. Strings become
+    categories. Already narrow columns are left untouched.
+    """
+    for col, dtype in file_dtypes.items():
+        if col not in df.columns or df[col].dtype == dtype:
+            continue
+        values = df[col]
+        if dtype == 'category':
+            if values.dtype == object:
+                df[col] = values.astype('category')
+        elif np.dtype(dtype).kind == 'i':
+            info = np.iinfo(dtype)
+            if (
+                pd.api.types.is_numeric_dtype(values)
+                and values.notna().all()
+                and (values % 1 == 0).all()
+                and info.min <= values.min()
+                and values.max() <= info.max
+            ):
+                df[col] = values.astype(dtype)
+    return df
+
+
+def _wide(dtypes, lenient=False):
+    """
+    Dtypes integer columns are read with, before ``narrow_dtypes``.
+
+    read_csv wraps values that overflow a narrow integer type, so they are
+    read as int64. With missing values they can only be read as float64,
+    exact up to 2**53, except IDs which are read as nullable integers.
+    """
+    wide = {}
+    for col, dtype in dtypes.items():
+        if not dtype.startswith('int'):
+            wide[col] = dtype
+        elif not lenient:
+            wide[col] = 'int64'
+        else:
+            wide[col] = 'Int64' if col == 'ID' else 'float64'
+    return wide
+
+
+def _csv_chunks(source, compression, chunksize, wanted):
+    """
+    Read a CSV file and narrow its dtypes.
+
+    Integer columns are read as int64 and narrowed when their values fit.
+    When an integer column turns out to have missing values the file is
+    read again from the first row not yet returned, with integer columns
+    as float64. When a numeric column holds text, it is read once more
+    with pandas' own types and the text is left to the validation.
+    """
+    narrow = {col: file_dtypes[col] for col in wanted if col in file_dtypes}
+    dtypes = _wide(narrow)
+    n_read = 0
+    for attempt in ('narrow', 'lenient', 'inferred'):
+        if attempt == 'lenient':
+            dtypes = _wide(narrow, lenient=True)
+            _rewind(source)
+        elif attempt == 'inferred':
+            dtypes = {
+                col: dtype
+                for col, dtype in dtypes.items()
+                if dtype == 'category'
+            }
+            _rewind(source)
+        try:
+            reader = pd.read_csv(
+                source,
+                usecols=lambda col: col in wanted,
+                dtype=dtypes,
+                compression=compression,
+                chunksize=chunksize,
+                skiprows=range(1, n_read + 1) if n_read else None,
+            )
+            for chunk in [reader] if chunksize is None else reader:
+                n_read += len(chunk)
+                yield narrow_dtypes(chunk)
+            return
+        except ValueError:
+            if attempt == 'inferred':
+                raise
+
+
+def _arrow_frame(table):
+    # keep dates as datetime64 and dictionaries as categoricals
+    return narrow_dtypes(table.to_pandas(date_as_object=False))
+
+
+def iter_customer_chunks(source, name=None, chunksize=None, columns=None):
+    """
+    Yield DataFrames of customers read from a CSV, Parquet or Feather file.
+
+    Only ``columns`` (by default the ones scoring needs) are read when
+    the file has them, narrowed to ``file_dtypes`` where values fit. Columnar files
+    keep their native date and category types. Without ``chunksize`` the
+    whole file is one chunk.
+    """
+    fmt, compression = file_format(source, name)
+    wanted = input_columns if columns is None else columns
+    _rewind(source)
+
+    if fmt == 'csv':
+        yield from _csv_chunks(source, compression, chunksize, wanted)
+
+    elif fmt == 'parquet':
+        pa = _pyarrow('Reading Parquet files')
+        parquet_file = pa.parquet.ParquetFile(source)
+        present = [c for c in parquet_file.schema_arrow.names if c in wanted]
+        if chunksize is None:
+            yield _arrow_frame(parquet_file.read(columns=present))
+        else:
+            for batch in parquet_file.iter_batches(chunksize, columns=present):
+                yield _arrow_frame(pa.Table.from_batches([batch]))
+
+    else:
+        pa = _pyarrow('Reading Feather files')
+        ipc_file = pa.ipc.open_file(source)
+        present = [c for c in ipc_file.schema.names if c in wanted]
+        if chunksize is None:
+            yield _arrow_frame(ipc_file.read_all().select(present))
+        else:
+            # record batches are as large as the writer made them
+            for i in range(ipc_file.num_record_batches):
+                table = pa.Table.from_batches([ipc_file.get_batch(i)])
+                yield _arrow_frame(table.select(present))
+
+    _rewind(source)
+
+
+def read_customer_file(source, name=None, columns=None):
+    """Read a whole customer file, see ``iter_customer_chunks``"""
+    return next(iter_customer_chunks(source, name, columns=columns))
+
+
+def write_results(df, fmt='csv'):
+    """Serialize scored customers, return the bytes, mime type and suffix"""
+    buffer = io.BytesIO()
+    if fmt == 'parquet':
+        _pyarrow('Writing Parquet files')
+        df.to_parquet(buffer, index=False)
+    elif fmt == 'feather':
+        _pyarrow('Writing Feather files')
+        df.reset_index(drop=True).to_feather(buffer)
+    else:
+        buffer.write(df.to_csv(index=False).encode('utf-8'))
+    mime, suffix = export_formats[fmt]
+    return buffer.getvalue(), mime, suffix
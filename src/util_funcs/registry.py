@@ -0,0 +1,185 @@
+import os
+import json
+import pickle
+import hashlib
+import tempfile
+import threading
+
+# directory holding the pickled pipelines and their manifest
+MODEL_DIR = os.path.abspath(
+    os.path.join(os.path.dirname(__file__), '../..', 'models')
+)
+MANIFEST = os.path.join(MODEL_DIR, 'manifest.json')
+
+# memory-mappable copies of the models, shared by all worker processes,
+# each next to a ``.sha256`` file with the digest it was written with
+MMAP_DIR = os.environ.get(
+    'MODEL_MMAP_DIR',
+    os.path.join(tempfile.gettempdir(), 'customer-response-models'),
+)
+
+
+def file_checksum(path):
+    """Return the SHA-256 hex digest of a file"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f_in:
+        for block in iter(lambda: f_in.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def verify_checksum(path, expected, name):
+    """Raise ValueError unless the file at ``path`` has the given digest"""
+    checksum = file_checksum(path)
+    if checksum != expected:
+        raise ValueError(
+            f"Checksum mismatch for model '{name}' in {path}: "
+            f"expected {expected}, got {checksum}"
+        )
+
+
+def read_model_file(path):
+    """Load a pickled model, or a compressed joblib one from compaction"""
+    if path.endswith('.joblib'):
+        import joblib  # pylint: disable=import-outside-toplevel
+
+        return joblib.load(path)
+    with open(path, 'rb') as f_in:
+        return pickle.load(f_in)
+
+
+def read_manifest(path=MANIFEST):
+    """Read the name -> {file, version, sha256} entries of a manifest"""
+    with open(path, 'r', encoding='utf-8') as f_in:
+        return json.load(f_in)['models']
+
+
+class ModelRegistry:
+    """
+    Pinned and hot-swappable set of models.
+
+    The manifest maps each model name to its pickle, version and
+    checksum. Every pickle is verified and converted once into a joblib
+    file under ``mmap_dir``, whose own digest is recorded when written
+    and verified on every load, a copy that does not match is written
+    again. Copies are loaded with ``mmap_mode='r'``, so numpy arrays kept
+    as estimator attributes, such as coefficients and support vectors,
+    are shared between processes through the page cache. sklearn trees
+    and xgboost boosters copy their nodes into their own structures when
+    unpickled, so every process still holds its own copy of those.
+
+    Models load outside the registry lock, one load at a time per name.
+    Editing the manifest swaps models on the next ``get`` without
+    restarting the server.
+    """
+
+    def __init__(self, manifest_path=MANIFEST, mmap_dir=MMAP_DIR):
+        self.manifest_path = manifest_path
+        self.mmap_dir = mmap_dir
+        self._lock = threading.RLock()
+        # (mtime, entries) of the manifest last read
+        self._manifest = (None, {})
+        # name -> (manifest entry, loaded model)
+        self._models = {}
+        # name -> lock held while that model loads
+        self._load_locks = {}
+
+    @property
+    def model_dir(self):
+        return os.path.dirname(self.manifest_path)
+
+    def _refresh_manifest(self):
+        """Return the manifest entries, re-read when changed on disk"""
+        mtime = os.stat(self.manifest_path).st_mtime_ns
+        if mtime != self._manifest[0]:
+            self._manifest = (mtime, read_manifest(self.manifest_path))
+        return self._manifest[1]
+
+    def _mmap_path(self, name, entry):
+        file_name = f"{name}-{entry['version']}-{entry['sha256'][:16]}.joblib"
+        return os.path.join(self.mmap_dir, file_name)
+
+    @staticmethod
+    def _mmap_copy_is_valid(mmap_path):
+        try:
+            with open(mmap_path + '.sha256', 'r', encoding='utf-8') as f_in:
+                expected = f_in.read().strip()
+            return file_checksum(mmap_path) == expected
+        except FileNotFoundError:
+            return False
+
+    def _load(self, name, entry):
+        """Verify a pinned pickle and its copy, load the copy memory-mapped"""
+        import joblib  # pylint: disable=import-outside-toplevel
+
+        model_path = os.path.join(self.model_dir, entry['file'])
+        verify_checksum(model_path, entry['sha256'], name)
+        mmap_path = self._mmap_path(name, entry)
+        if not self._mmap_copy_is_valid(mmap_path):
+            # missing, partly written or altered copies are made again,
+            # under temporary names as other processes may be reading
+            model = read_model_file(model_path)
+            os.makedirs(self.mmap_dir, mode=0o700, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=self.mmap_dir, suffix='.tmp')
+            os.close(fd)
+            joblib.dump(model, tmp_path)
+            checksum = file_checksum(tmp_path)
+            os.replace(tmp_path, mmap_path)
+
+            fd, tmp_path = tempfile.mkstemp(dir=self.mmap_dir, suffix='.tmp')
+            with os.fdopen(fd, 'w', encoding='utf-8') as f_out:
+                f_out.write(checksum)
+            os.replace(tmp_path, mmap_path + '.sha256')
+        return joblib.load(mmap_path, mmap_mode='r')
+
+    def names(self):
+        with self._lock:
+            return sorted(self._refresh_manifest())
+
+    def get(self, name):
+        """Return the model pinned under ``name``, loading it if needed"""
+        with self._lock:
+            manifest = self._refresh_manifest()
+            if name not in manifest:
+                raise KeyError(
+                    f"Model '{name}' is not listed in {self.manifest_path}"
+                )
+            entry = manifest[name]
+            loaded = self._models.get(name)
+            if loaded is not None and loaded[0] == entry:
+                return loaded[1]
+            load_lock = self._load_locks.setdefault(name, threading.Lock())
+
+        # other models and loaded ones stay available during the load
+        with load_lock:
+            with self._lock:
+                loaded = self._models.get(name)
+            if loaded is not None and loaded[0] == entry:
+                return loaded[1]
+            model = self._load(name, entry)
+            with self._lock:
+                self._models[name] = (entry, model)
+            return model
+
+    def entry(self, name):
+        """Return a copy of the manifest entry pinned for ``name``"""
+        with self._lock:
+            return dict(self._refresh_manifest()[name])
+
+    def version(self, name):
+        """Return the version and checksum pinned for ``name``"""
+        entry = self.entry(name)
+        return f"{entry['version']}-{entry['sha256'][:12]}"
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_registry():
+    """Return the process-wide model registry"""
+    global _registry  # pylint: disable=global-statement
+    with _registry_lock:
+        if _registry is None:
+            _registry = ModelRegistry()
+        return _registry
@@ -0,0 +1,66 @@
+import numpy as np
+import pandas as pd
+
+# cleaned columns the results are summarized by
+segment_columns = ['Age_Group', 'Education', 'Marital_Status']
+
+PAGE_SIZES = [25, 50, 100, 500]
+
+
+def segment_summary(predictions, segments, by=None):
+    """
+    Customers, likely acceptances and acceptance rate per segment.
+
+    ``segments`` holds the cleaned segment columns of the scored rows,
+    in the same order as ``predictions``.
+    """
+    by = segment_columns if by is None else by
+    # missing segments get their own group
+    frame = pd.DataFrame(
+        {
+            col: segments[col].astype(object).fillna('Unknown').to_numpy()
+            for col in by
+        }
+    )
+    frame['Likely to accept'] = (np.asarray(predictions) == 1).astype(int)
+    summary = frame.groupby(by)['Likely to accept'].agg(['size', 'sum'])
+    summary.columns = ['Customers', 'Likely to accept']
+    summary['Acceptance rate'] = (
+        summary['Likely to accept'] / summary['Customers']
+    )
+    return summary.reset_index()
+
+
+def row_order(df, sort_by=None, ascending=True, prediction=None):
+    """
+    Positions of the rows to show, filtered and sorted on the server.
+
+    Only the sort column is sorted, the frame itself is never copied.
+    Missing values sort last.
+    """
+    positions = np.arange(len(df))
+    if prediction is not None:
+        positions = np.flatnonzero(df['Prediction'].to_numpy() == prediction)
+    if sort_by is not None:
+        values = df[sort_by].iloc[positions].reset_index(drop=True)
+        order = values.sort_values(
+            ascending=ascending, kind='stable', na_position='last'
+        ).index.to_numpy()
+        positions = positions[order]
+    return positions
+
+
+def n_pages(n_rows, page_size):
+    return max(1, -(-n_rows // page_size))
+
+
+def page_rows(df, positions, page, page_size):
+    """Rows of a 1-based page, taken from the ordered positions"""
+    start = (page - 1) * page_size
+    return df.iloc[positions[start : start + page_size]]
+
+
+def positive_ids(df):
+    """IDs of the customers predicted to accept, as a one-column CSV"""
+    ids = pd.DataFrame({'ID': df.loc[df['Prediction'] == 1, 'ID']})
+    return ids.to_csv(index=False)
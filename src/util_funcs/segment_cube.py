@@ -0,0 +1,502 @@
+"""
+Precomputed customer statistics by segment.
+
+Build the cube from a reference customer file with a Response column,
+then fold scored batches into it as they arrive:
+
+    python -m util_funcs.segment_cube build marketing_campaign.csv
+    python -m util_funcs.segment_cube update predictions.csv
+
+Cells are indexed by Age_Group x Education x Marital_Status x Children,
+with the features derived by ``clean_file_data``.
+"""
+
+import os
+import json
+import argparse
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import fcntl
+
+    msvcrt = None
+except ImportError:  # Windows
+    import msvcrt  # pylint: disable=import-error
+
+    fcntl = None
+
+import numpy as np
+import pandas as pd
+
+from util_funcs.readers import input_columns, read_customer_file
+from util_funcs.registry import MODEL_DIR
+from util_funcs.pre_process import (
+    labels,
+    marital_codes,
+    clean_file_data,
+    education_codes,
+)
+
+# the cube changes with every scored batch, it is kept out of the models
+CUBE_PATH = os.environ.get(
+    'SEGMENT_CUBE_PATH',
+    os.path.join(os.path.dirname(MODEL_DIR), 'data', 'segment_cube.npz'),
+)
+
+# scored customers remembered by ID, so a re-scored one replaces itself
+MAX_SCORED_IDS = int(os.environ.get('SEGMENT_CUBE_MAX_IDS', 100_000))
+
+# cube dimensions and the values along each of them
+dimensions = {
+    'Age_Group': list(labels),
+    'Education': list(education_codes[1]),
+    'Marital_Status': list(marital_codes[1]),
+    'Children': ['0', '1', '2', '3+'],
+}
+SHAPE = tuple(len(values) for values in dimensions.values())
+
+# histogram bin edges of the distributions
+SPEND_EDGES = np.array([0, 50, 100, 250, 500, 750, 1000, 1500, 2000, np.inf])
+TENURE_EDGES = np.array([0, 3, 6, 9, 12, 15, 18, 21, 24, np.inf])
+
+# per-cell totals; responses come from labelled data, predictions from
+# scored batches
+_totals = [
+    'customers',
+    'labelled',
+    'responses',
+    'scored',
+    'predicted_positive',
+    'spend_sum',
+    'spend_sq_sum',
+    'tenure_sum',
+    'tenure_sq_sum',
+]
+
+
+def _cell_codes(df_clean):
+    """Flat cell index of each cleaned row, -1 when a segment is missing"""
+    codes = [
+        df_clean['Age_Group'].cat.codes.to_numpy(),
+        _category_codes(df_clean['Education'], dimensions['Education']),
+        _category_codes(
+            df_clean['Marital_Status'], dimensions['Marital_Status']
+        ),
+    ]
+    children = np.asarray(df_clean['Children'], dtype=np.float64)
+    codes.append(
+        np.where(np.isnan(children), -1, np.clip(children, 0, 3)).astype(int)
+    )
+    codes = np.column_stack(codes)
+    valid = (codes >= 0).all(axis=1)
+    cells = np.full(len(df_clean), -1)
+    cells[valid] = np.ravel_multi_index(codes[valid].T, SHAPE)
+    return cells
+
+
+def _category_codes(values, categories):
+    return pd.Categorical(values.astype(object), categories=categories).codes
+
+
+def segment_of(features):
+    """Cube coordinates of one cleaned customer, None when incomplete"""
+    segment = {
+        name: features.get(name)
+        for name in ['Age_Group', 'Education', 'Marital_Status']
+    }
+    children = features.get('Children')
+    if children is not None and not pd.isna(children):
+        segment['Children'] = dimensions['Children'][min(int(children), 3)]
+    else:
+        segment['Children'] = None
+    for name, value in segment.items():
+        if value not in dimensions[name]:
+            return None
+    return segment
+
+
+def _measures(df_clean):
+    """
+    Cell, spending and tenure of cleaned customers, and the mask of the
+    ones with a complete segment and measures.
+    """
+    rows = pd.DataFrame(
+        {
+            'cell': _cell_codes(df_clean),
+            'spend': np.asarray(df_clean['Spending'], dtype=np.float64),
+            'tenure': np.asarray(df_clean['Tenure'], dtype=np.float64),
+        }
+    )
+    keep = (
+        (rows['cell'] >= 0)
+        & np.isfinite(rows['spend'])
+        & np.isfinite(rows['tenure'])
+    )
+    return rows, keep.to_numpy()
+
+
+def _fold(arrays, rows, responses=None, predictions=None, sign=1):
+    """
+    Add the totals of complete ``_measures`` rows to ``arrays``, or take
+    them back with ``sign=-1``.
+    """
+    n_cells = int(np.prod(SHAPE))
+    cells = rows['cell'].to_numpy()
+    spend = rows['spend'].to_numpy()
+    tenure = rows['tenure'].to_numpy()
+
+    def total(weights=None):
+        if weights is not None:
+            weights = np.asarray(weights, dtype=np.float64)
+        counts = np.bincount(cells, weights, minlength=n_cells)
+        return counts.reshape(SHAPE)
+
+    def histogram(values, edges):
+        bins = np.searchsorted(edges, values, side='right') - 1
+        bins = np.clip(bins, 0, len(edges) - 2)
+        counts = np.bincount(
+            cells * (len(edges) - 1) + bins,
+            minlength=n_cells * (len(edges) - 1),
+        )
+        return counts.reshape(SHAPE + (len(edges) - 1,))
+
+    added = {
+        'customers': total(),
+        'spend_sum': total(spend),
+        'spend_sq_sum': total(spend**2),
+        'tenure_sum': total(tenure),
+        'tenure_sq_sum': total(tenure**2),
+        'spend_hist': histogram(spend, SPEND_EDGES),
+        'tenure_hist': histogram(tenure, TENURE_EDGES),
+    }
+    if responses is not None:
+        added['labelled'] = total()
+        added['responses'] = total(np.asarray(responses) == 1)
+    if predictions is not None:
+        added['scored'] = total()
+        added['predicted_positive'] = total(np.asarray(predictions) == 1)
+
+    for name, values in added.items():
+        arrays[name] += sign * values
+
+
+def _no_scored_rows():
+    return pd.DataFrame(
+        {
+            'cell': np.empty(0, dtype=np.int64),
+            'spend': np.empty(0),
+            'tenure': np.empty(0),
+            'prediction': np.empty(0, dtype=np.int8),
+        },
+        index=pd.Index(np.empty(0, dtype=np.int64), name='ID'),
+    )
+
+
+def scored_rows(df_clean, predictions, ids):
+    """
+    The delta of a scored batch: cell, measures and prediction by ID, the
+    last row of an ID winning. Rows with a missing segment or measure get
+    cell -1, they only take back an earlier row of their ID.
+    """
+    rows, keep = _measures(df_clean)
+    rows.loc[~keep, 'cell'] = -1
+    rows.index = pd.Index(np.asarray(ids, dtype=np.int64), name='ID')
+    rows['prediction'] = (np.asarray(predictions) == 1).astype(np.int8)
+    return rows[~rows.index.duplicated(keep='last')]
+
+
+class SegmentCube:
+    """
+    Dense cube of customer counts, response rates and spending and
+    tenure distributions per segment.
+
+    Every statistic is an additive total, so queries over any subset of
+    dimensions are sums and batches are folded in as deltas. Reference
+    customers are added with ``add``, scored ones with ``add_scored``.
+    The cell, measures and prediction of the last ``max_scored`` scored
+    IDs are remembered, so a customer scored again takes back their
+    earlier contribution. Older customers stay in the totals and count
+    twice if they are scored again.
+    """
+
+    def __init__(self, arrays=None, scored=None, max_scored=MAX_SCORED_IDS):
+        if arrays is None:
+            arrays = {name: np.zeros(SHAPE) for name in _totals}
+            arrays['spend_hist'] = np.zeros(SHAPE + (len(SPEND_EDGES) - 1,))
+            arrays['tenure_hist'] = np.zeros(SHAPE + (len(TENURE_EDGES) - 1,))
+        self.arrays = arrays
+        self.scored = _no_scored_rows() if scored is None else scored
+        self.max_scored = max_scored
+
+    def copy(self):
+        arrays = {name: values.copy() for name, values in self.arrays.items()}
+        return SegmentCube(arrays, self.scored.copy(), self.max_scored)
+
+    def add(self, df_clean, responses=None):
+        """Fold cleaned reference customers, with their responses"""
+        rows, keep = _measures(df_clean)
+        if responses is not None:
+            responses = np.asarray(responses)[keep]
+        # customers with a missing segment or measure are left out
+        _fold(self.arrays, rows[keep], responses)
+        return self
+
+    def add_scored(self, df_clean, predictions, ids):
+        """Fold cleaned scored customers, replacing earlier rows by ID"""
+        return self.apply_scored(scored_rows(df_clean, predictions, ids))
+
+    def apply_scored(self, rows):
+        """Fold the delta of a scored batch, see ``scored_rows``"""
+        replaced = self.scored.index.isin(rows.index)
+        earlier = self.scored[replaced]
+        _fold(self.arrays, earlier, predictions=earlier['prediction'], sign=-1)
+        rows = rows[rows['cell'] >= 0]
+        _fold(self.arrays, rows, predictions=rows['prediction'])
+        # the least recently scored customers are forgotten first
+        scored = pd.concat([self.scored[~replaced], rows])
+        self.scored = scored.iloc[max(len(scored) - self.max_scored, 0) :]
+        return self
+
+    def query(self, **segment):
+        """
+        Statistics of one segment, summed from the precomputed cells.
+
+        Dimensions left out of ``segment`` are summed over, e.g.
+        ``query(Age_Group='35-44', Children='1')``.
+        """
+        index = tuple(
+            (
+                values.index(str(segment[name]))
+                if name in segment
+                else slice(None)
+            )
+            for name, values in dimensions.items()
+        )
+        sums = {}
+        for name, values in self.arrays.items():
+            cell = values[index]
+            if name.endswith('_hist'):
+                sums[name] = cell.reshape(-1, cell.shape[-1]).sum(axis=0)
+            else:
+                sums[name] = float(np.sum(cell))
+
+        def ratio(numerator, denominator):
+            return numerator / denominator if denominator else float('nan')
+
+        customers = sums['customers']
+        spend_mean = ratio(sums['spend_sum'], customers)
+        tenure_mean = ratio(sums['tenure_sum'], customers)
+        return {
+            'customers': int(customers),
+            'response_rate': ratio(sums['responses'], sums['labelled']),
+            'predicted_rate': ratio(sums['predicted_positive'], sums['scored']),
+            'spend_mean': spend_mean,
+            'spend_std': np.sqrt(
+                max(ratio(sums['spend_sq_sum'], customers) - spend_mean**2, 0)
+            ),
+            'tenure_mean': tenure_mean,
+            'tenure_std': np.sqrt(
+                max(
+                    ratio(sums['tenure_sq_sum'], customers) - tenure_mean**2,
+                    0,
+                )
+            ),
+            'spend_hist': sums['spend_hist'],
+            'tenure_hist': sums['tenure_hist'],
+        }
+
+    def save(self, path=CUBE_PATH):
+        """Write the cube atomically as a compressed ``.npz`` file"""
+        meta = {
+            'dimensions': dimensions,
+            'spend_edges': SPEND_EDGES.tolist(),
+            'tenure_edges': TENURE_EDGES.tolist(),
+        }
+        scored = {
+            f'scored_{name}': values.to_numpy()
+            for name, values in self.scored.items()
+        }
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp_path = path + '.tmp.npz'
+        np.savez_compressed(
+            tmp_path,
+            meta=np.array(json.dumps(meta)),
+            scored_ID=self.scored.index.to_numpy(),
+            **scored,
+            **self.arrays,
+        )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path=CUBE_PATH):
+        with np.load(path, allow_pickle=False) as data:
+            meta = json.loads(str(data['meta']))
+            if meta['dimensions'] != dimensions:
+                raise ValueError(f"{path} was built with other segments")
+            arrays = {
+                name: data[name]
+                for name in data.files
+                if name != 'meta' and not name.startswith('scored_')
+            }
+            # cubes saved before scored rows were kept by ID have none
+            scored = None
+            if 'scored_ID' in data.files:
+                scored = pd.DataFrame(
+                    {
+                        name: data[f'scored_{name}']
+                        for name in _no_scored_rows().columns
+                    },
+                    index=pd.Index(data['scored_ID'], name='ID'),
+                )
+            return cls(arrays, scored)
+
+
+def _lock(f_lock):
+    if fcntl is not None:
+        fcntl.flock(f_lock, fcntl.LOCK_EX)
+        return
+    # msvcrt locks the first byte and gives up after 10 seconds, retry
+    f_lock.seek(0)
+    while True:
+        try:
+            msvcrt.locking(f_lock.fileno(), msvcrt.LK_LOCK, 1)
+            return
+        except OSError:
+            continue
+
+
+def _unlock(f_lock):
+    if fcntl is not None:
+        fcntl.flock(f_lock, fcntl.LOCK_UN)
+    else:
+        f_lock.seek(0)
+        msvcrt.locking(f_lock.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+@contextmanager
+def _file_lock(path):
+    """Exclusive lock shared by every process writing the cube at ``path``"""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path + '.lock', 'a+', encoding='utf-8') as f_lock:
+        _lock(f_lock)
+        try:
+            yield
+        finally:
+            _unlock(f_lock)
+
+
+# one cube per path, shared by every session, with the file mtime it
+# was loaded at; cached cubes are replaced, never modified
+_cubes = {}
+_cubes_lock = threading.Lock()
+
+
+def _cached(path, mtime):
+    with _cubes_lock:
+        mtime_cube = _cubes.get(path)
+    if mtime_cube is not None and mtime_cube[0] == mtime:
+        return mtime_cube[1]
+    return None
+
+
+def get_cube(path=CUBE_PATH):
+    """Return the cube stored at ``path``, None when it was not built"""
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+    cube = _cached(path, mtime)
+    # reload when another process updated the file
+    if cube is None:
+        cube = SegmentCube.load(path)
+        with _cubes_lock:
+            _cubes[path] = (mtime, cube)
+    return cube
+
+
+def _apply(path, batches):
+    """Fold the ``scored_rows`` of several batches into a stored cube"""
+    with _file_lock(path):
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+        cube = _cached(path, mtime)
+        cube = SegmentCube.load(path) if cube is None else cube.copy()
+        for rows in batches:
+            cube.apply_scored(rows)
+        cube.save(path)
+        mtime = os.stat(path).st_mtime_ns
+    with _cubes_lock:
+        _cubes[path] = (mtime, cube)
+    return cube
+
+
+def update_cube(df_clean, predictions, ids, path=CUBE_PATH):
+    """
+    Fold a scored batch into the stored cube, if one was built.
+
+    The file is updated and replaced under a lock, so concurrent sessions
+    and processes do not lose each other's batches. Sessions only wait
+    for the lock, readers keep the cube they have until the new one is
+    saved.
+    """
+    return _apply(path, [scored_rows(df_clean, predictions, ids)])
+
+
+# batches waiting for the background writer, by cube path
+_pending = {}
+_pending_lock = threading.Lock()
+_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='segment-cube')
+
+
+def _write_pending(path):
+    with _pending_lock:
+        batches = _pending.pop(path, [])
+    # batches queued while the last write ran all go in this one
+    if batches:
+        return _apply(path, batches)
+    return None
+
+
+def submit_update(df_clean, predictions, ids, path=CUBE_PATH):
+    """
+    Fold a scored batch into the stored cube in the background.
+
+    Only the batch's delta is computed on the caller's thread. Returns a
+    future that completes once the batch is written, or raises what the
+    write raised.
+    """
+    rows = scored_rows(df_clean, predictions, ids)
+    with _pending_lock:
+        _pending.setdefault(path, []).append(rows)
+    return _writer.submit(_write_pending, path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('command', choices=['build', 'update'])
+    parser.add_argument('source', help='customer file')
+    parser.add_argument('--cube', default=CUBE_PATH)
+    args = parser.parse_args()
+
+    df = read_customer_file(
+        args.source, columns=input_columns + ['Response', 'Prediction']
+    )
+    if args.command == 'update' and 'Prediction' not in df.columns:
+        parser.error(f"{args.source} has no Prediction column")
+    df_clean = clean_file_data(df)
+
+    if args.command == 'build':
+        responses = df['Response'] if 'Response' in df.columns else None
+        with _file_lock(args.cube):
+            SegmentCube().add(df_clean, responses=responses).save(args.cube)
+    elif update_cube(df_clean, df['Prediction'], df['ID'], args.cube) is None:
+        parser.error(f"{args.cube} was not built")
+    print(f"{len(df)} customers added to {args.cube}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,368 @@
+"""
+Headless HTTP scoring service.
+
+Run alongside the Streamlit app with:
+
+    python -m util_funcs.server --model xgb --port 8080
+
+Missing incomes are imputed with the training mean stored in the
+manifest by ``util_funcs.train``, or with --income-mean for models
+trained before it was recorded.
+
+Endpoints:
+
+- ``GET /health``: model name and pinned version.
+- ``GET /metrics``: stage timings in the Prometheus text format, recorded
+  when ``SCORING_METRICS=1``.
+- ``POST /predict``: one customer as a JSON object, answered with its
+  prediction and probability.
+- ``POST /predict/batch``: customers as NDJSON (``application/x-ndjson``)
+  or CSV (``text/csv``), answered in the same format.
+
+Customers use the columns of the uploaded CSV files. Concurrent requests
+are micro-batched into a single ``predict`` call, a customer is scored
+the same whatever other requests share its batch.
+"""
+
+import io
+import json
+import time
+import asyncio
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from util_funcs.encoder import encode, get_encoder
+from util_funcs.metrics import get_metrics
+from util_funcs.registry import get_registry
+from util_funcs.pre_process import clean_file_data
+
+# largest accepted request body
+MAX_BODY_SIZE = 256 * 1024 * 1024
+
+reasons = {
+    200: 'OK',
+    400: 'Bad Request',
+    404: 'Not Found',
+    405: 'Method Not Allowed',
+    500: 'Internal Server Error',
+}
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+class MicroBatcher:
+    """
+    Collects the frames of concurrent requests and scores them together.
+
+    A batch is scored once ``max_rows`` rows are waiting or ``max_wait``
+    seconds passed since its first request, whichever comes first.
+    Missing incomes are filled with the fixed ``income_mean``.
+    """
+
+    def __init__(self, model_name, income_mean, max_rows=512, max_wait=0.005):
+        self.model_name = model_name
+        self.income_mean = income_mean
+        self.max_rows = max_rows
+        self.max_wait = max_wait
+        self._queue = asyncio.Queue()
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def score(self, df):
+        """Return predictions and probabilities for the rows of ``df``"""
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((df, future))
+        return await future
+
+    async def _collect(self, loop):
+        """Wait for the next batch of (frame, future) requests"""
+        batch = [await self._queue.get()]
+        n_rows = len(batch[0][0])
+        deadline = loop.time() + self.max_wait
+        while n_rows < self.max_rows:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                item = await asyncio.wait_for(self._queue.get(), timeout)
+            except asyncio.TimeoutError:
+                break
+            batch.append(item)
+            n_rows += len(item[0])
+        return batch
+
+    async def _score_each(self, loop, batch):
+        """Score requests one by one so a bad one fails on its own"""
+        for df, future in batch:
+            try:
+                result = await loop.run_in_executor(None, self._score, [df])
+            except Exception as exc:  # pylint: disable=broad-except
+                if not future.done():
+                    future.set_exception(exc)
+            else:
+                if not future.done():
+                    future.set_result(result)
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect(loop)
+            frames = [df for df, _ in batch]
+            try:
+                # keep the event loop free while the model runs
+                predictions, probabilities = await loop.run_in_executor(
+                    None, self._score, frames
+                )
+            except Exception:  # pylint: disable=broad-except
+                await self._score_each(loop, batch)
+                continue
+
+            start = 0
+            for df, future in batch:
+                stop = start + len(df)
+                if not future.done():
+                    future.set_result(
+                        (predictions[start:stop], probabilities[start:stop])
+                    )
+                start = stop
+
+    def _score(self, frames):
+        """Clean, encode and score the frames of one batch at once"""
+        model = get_registry().get(self.model_name)
+        _, estimator = get_encoder(model)
+
+        df = pd.concat(frames, ignore_index=True)
+        X = encode(model, clean_file_data(df, income_mean=self.income_mean))
+        predictions = estimator.predict(X)
+        if hasattr(estimator, 'predict_proba'):
+            probabilities = estimator.predict_proba(X)[:, 1]
+        else:
+            probabilities = np.full(len(df), np.nan)
+        return predictions, probabilities
+
+
+def _records_frame(records):
+    """Build a frame from customer records, null incomes become NaN"""
+    df = pd.DataFrame.from_records(records)
+    if 'Income' in df.columns:
+        df['Income'] = pd.to_numeric(df['Income'])
+    return df
+
+
+def _json_value(value):
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and np.isnan(value):
+        return None
+    return value
+
+
+class ScoringServer:
+    def __init__(self, batcher):
+        self.batcher = batcher
+
+    async def listen(self, host, port):
+        """Start scoring and accepting connections on ``host:port``"""
+        self.batcher.start()
+        return await asyncio.start_server(self.handle, host, port)
+
+    async def handle(self, reader, writer):
+        """Serve the requests of one keep-alive connection"""
+        try:
+            while True:
+                try:
+                    request = await self._read_request(reader)
+                except HTTPError as exc:
+                    # the body cannot be delimited, answer and hang up
+                    payload = json.dumps({'error': exc.message}).encode()
+                    await self._respond(
+                        writer, exc.status, 'application/json', payload, False
+                    )
+                    break
+                if request is None:
+                    break
+                method, path, headers, body = request
+                try:
+                    status, content_type, payload = await self._route(
+                        method, path, headers, body
+                    )
+                except HTTPError as exc:
+                    status, content_type = exc.status, 'application/json'
+                    payload = json.dumps({'error': exc.message}).encode()
+                except (ValueError, KeyError, TypeError) as exc:
+                    # malformed customers or payloads
+                    status, content_type = 400, 'application/json'
+                    payload = json.dumps({'error': repr(exc)}).encode()
+                except Exception as exc:  # pylint: disable=broad-except
+                    status, content_type = 500, 'application/json'
+                    payload = json.dumps({'error': repr(exc)}).encode()
+
+                keep_alive = headers.get('connection', '').lower() != 'close'
+                await self._respond(
+                    writer, status, content_type, payload, keep_alive
+                )
+                if not keep_alive:
+                    break
+        except (ConnectionError, ValueError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def _respond(writer, status, content_type, payload, keep_alive):
+        head = (
+            f"HTTP/1.1 {status} {reasons[status]}\r\n"
+            f"Content-Type: {content_type}\r\n"
+            f"Content-Length: {len(payload)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}"
+            "\r\n\r\n"
+        )
+        writer.write(head.encode('latin-1') + payload)
+        await writer.drain()
+
+    @staticmethod
+    async def _read_request(reader):
+        line = await reader.readline()
+        if not line:
+            return None
+        method, path, _ = line.decode('latin-1').split(' ', 2)
+
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        try:
+            length = int(headers.get('content-length', 0))
+        except ValueError:
+            length = -1
+        if length < 0:
+            raise HTTPError(400, 'Content-Length is not a valid length')
+        if length > MAX_BODY_SIZE:
+            # drop the connection rather than reading the body
+            raise ConnectionError('request body too large')
+        body = await reader.readexactly(length) if length else b''
+        return method, path.split('?', 1)[0], headers, body
+
+    async def _route(self, method, path, headers, body):
+        if path == '/health':
+            registry = get_registry()
+            name = self.batcher.model_name
+            payload = {'model': name, 'version': registry.version(name)}
+            return 200, 'application/json', json.dumps(payload).encode()
+
+        if path == '/metrics':
+            payload = get_metrics().to_prometheus().encode()
+            return 200, 'text/plain; version=0.0.4', payload
+
+        if path not in ('/predict', '/predict/batch'):
+            raise HTTPError(404, f'No endpoint at {path}')
+        if method != 'POST':
+            raise HTTPError(405, f'{path} only accepts POST')
+
+        if path == '/predict':
+            df = _records_frame([json.loads(body)])
+            predictions, probabilities = await self.batcher.score(df)
+            payload = {
+                'prediction': _json_value(predictions[0]),
+                'probability': _json_value(probabilities[0]),
+            }
+            return 200, 'application/json', json.dumps(payload).encode()
+
+        content_type = headers.get('content-type', '').split(';')[0].strip()
+        if content_type == 'text/csv':
+            df = pd.read_csv(io.BytesIO(body))
+        else:
+            lines = body.decode('utf-8').splitlines()
+            df = _records_frame([json.loads(line) for line in lines if line])
+        if df.empty:
+            raise HTTPError(400, 'No customers in the request body')
+
+        predictions, probabilities = await self.batcher.score(df)
+        if content_type == 'text/csv':
+            df['Prediction'] = predictions
+            df['Probability'] = probabilities
+            return 200, 'text/csv', df.to_csv(index=False).encode()
+
+        ids = df['ID'] if 'ID' in df.columns else range(len(df))
+        lines = [
+            json.dumps(
+                {
+                    'ID': _json_value(customer_id),
+                    'prediction': _json_value(prediction),
+                    'probability': _json_value(probability),
+                }
+            )
+            for customer_id, prediction, probability in zip(
+                ids, predictions, probabilities
+            )
+        ]
+        return 200, 'application/x-ndjson', ('\n'.join(lines) + '\n').encode()
+
+
+def training_income_mean(model_name):
+    """Mean income the pinned model was trained with, None if unrecorded"""
+    return get_registry().entry(model_name).get('income_mean')
+
+
+async def serve(batcher, host, port):
+    # keep the model resident before accepting traffic
+    start = time.perf_counter()
+    get_registry().get(batcher.model_name)
+    print(
+        f"Loaded model '{batcher.model_name}' in "
+        f"{time.perf_counter() - start:.2f}s"
+    )
+
+    server = await ScoringServer(batcher).listen(host, port)
+    print(f"Serving on http://{host}:{port}")
+    async with server:
+        await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Headless scoring service')
+    parser.add_argument('--model', default='xgb')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--max-batch-rows', type=int, default=512)
+    parser.add_argument('--max-wait-ms', type=float, default=5.0)
+    parser.add_argument(
+        '--income-mean',
+        type=float,
+        default=None,
+        help='imputed income, defaults to the training mean in the manifest',
+    )
+    args = parser.parse_args()
+    income_mean = args.income_mean
+    if income_mean is None:
+        income_mean = training_income_mean(args.model)
+    if income_mean is None:
+        parser.error(
+            f"the manifest has no training income mean for '{args.model}', "
+            "pass --income-mean"
+        )
+
+    batcher = MicroBatcher(
+        args.model,
+        income_mean,
+        max_rows=args.max_batch_rows,
+        max_wait=args.max_wait_ms / 1000,
+    )
+    asyncio.run(serve(batcher, args.host, args.port))
+
+
+if __name__ == '__main__':
+    main()
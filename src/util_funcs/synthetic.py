@@ -0,0 +1,62 @@
+import numpy as np
+import pandas as pd
+
+from util_funcs.pre_process import spend_cols, file_columns
+
+# exclusive upper bounds of the count columns, one above the largest value
+# of the campaign data, the profile form and validation allow more
+count_limits = {
+    'Recency': 100,
+    'NumDealsPurchases': 16,
+    'NumWebPurchases': 28,
+    'NumCatalogPurchases': 29,
+    'NumStorePurchases': 14,
+    'NumWebVisitsMonth': 21,
+}
+
+# raw category values with their approximate frequencies
+education_values = ['Graduation', 'PhD', 'Master', '2n Cycle', 'Basic']
+education_weights = [0.50, 0.22, 0.17, 0.09, 0.02]
+marital_values = ['Married', 'Together', 'Single', 'Divorced', 'Widow']
+marital_weights = [0.39, 0.26, 0.21, 0.10, 0.04]
+
+
+def make_customers(n_rows, seed=0, missing_income=0.01):
+    """
+    Generate a customer file with the same schema as the uploaded CSVs.
+
+    Values are drawn independently and only aim at realistic ranges and
+    category frequencies, which is what cleaning and scoring costs depend
+    on. Enrollment dates are ``YYYY-MM-DD`` strings as read from a CSV.
+    """
+    rng = np.random.default_rng(seed)
+    data = {
+        'ID': np.arange(n_rows),
+        'Year_Birth': rng.integers(1940, 1996, n_rows),
+        'Education': rng.choice(education_values, n_rows, p=education_weights),
+        'Marital_Status': rng.choice(marital_values, n_rows, p=marital_weights),
+        'Income': rng.normal(52_000, 21_000, n_rows).clip(1_730, 160_000),
+        'Kidhome': rng.integers(0, 3, n_rows),
+        'Teenhome': rng.integers(0, 3, n_rows),
+    }
+    data['Income'][rng.random(n_rows) < missing_income] = np.nan
+
+    # enrolled between mid 2012 and mid 2014
+    days = rng.integers(0, 700, n_rows)
+    enrolled = np.datetime64('2012-07-30') + days.astype('timedelta64[D]')
+    data['Dt_Customer'] = np.datetime_as_string(enrolled, unit='D')
+
+    for col in spend_cols:
+        data[col] = rng.exponential(80, n_rows).astype(np.int64)
+    for col, limit in count_limits.items():
+        data[col] = rng.integers(0, limit, n_rows)
+    for col in ['AcceptedCmp3', 'AcceptedCmp4', 'AcceptedCmp5']:
+        data[col] = (rng.random(n_rows) < 0.07).astype(np.int64)
+    for col in ['AcceptedCmp1', 'AcceptedCmp2']:
+        data[col] = (rng.random(n_rows) < 0.04).astype(np.int64)
+    data['Complain'] = (rng.random(n_rows) < 0.01).astype(np.int64)
+    data['Z_CostContact'] = np.full(n_rows, 3)
+    data['Z_Revenue'] = np.full(n_rows, 11)
+    data['Response'] = (rng.random(n_rows) < 0.15).astype(np.int64)
+
+    return pd.DataFrame(data, columns=file_columns)
@@ -0,0 +1,440 @@
+"""
+Retrain the seven pipelines from a labelled customer file.
+
+Run from the ``src`` directory, with the campaign file holding a
+Response column:
+
+    python -m util_funcs.train marketing_campaign.csv --folds 5
+
+The file is cleaned with ``clean_file_data``, encoded once and cached as
+``.npy`` files that every worker memory-maps, until the file or the code
+reading, cleaning and encoding it changes. Each parameter set and
+fold of each estimator is one task of a process pool, so the sweep
+scales with the available cores. The best parameters of every estimator
+are refit on all rows and written as versioned pickles next to a
+manifest the model registry reads, with the metrics and timings of the
+search and the mean income the scoring service imputes with.
+"""
+
+import os
+import json
+import time
+import pickle
+import shutil
+import hashlib
+import inspect
+import argparse
+import tempfile
+import multiprocessing
+from datetime import datetime, timezone
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from xgboost import XGBClassifier
+from sklearn.svm import SVC
+from sklearn.base import clone
+from sklearn.tree import DecisionTreeClassifier
+from sklearn.metrics import f1_score, roc_auc_score, accuracy_score
+from sklearn.ensemble import RandomForestClassifier, GradientBoostingClassifier
+from sklearn.pipeline import Pipeline
+from sklearn.naive_bayes import GaussianNB
+from sklearn.linear_model import LogisticRegression
+from sklearn.model_selection import ParameterGrid, StratifiedKFold
+from sklearn.feature_extraction import DictVectorizer
+
+from util_funcs.encoder import FeatureEncoder
+from util_funcs.readers import input_columns, read_customer_file
+from util_funcs.registry import MANIFEST, file_checksum
+from util_funcs.pre_process import clean_file_data
+
+# seed of the folds and of every randomised estimator
+RANDOM_STATE = 42
+
+# encoded training sets, keyed by the checksums of the source file and of
+# the code encoding it
+CACHE_DIR = os.environ.get(
+    'TRAINING_CACHE_DIR',
+    os.path.join(tempfile.gettempdir(), 'customer-response-training'),
+)
+
+# estimator and parameter grid of every model in the manifest
+search_spaces = {
+    'dtc': (
+        DecisionTreeClassifier(random_state=RANDOM_STATE),
+        {
+            'max_depth': [3, 5, 8, None],
+            'min_samples_leaf': [1, 5, 20],
+            'class_weight': [None, 'balanced'],
+        },
+    ),
+    'rfc': (
+        RandomForestClassifier(random_state=RANDOM_STATE, n_jobs=1),
+        {
+            'n_estimators': [100, 300],
+            'max_depth': [8, None],
+            'min_samples_leaf': [1, 5],
+            'class_weight': [None, 'balanced'],
+        },
+    ),
+    'gbc': (
+        GradientBoostingClassifier(random_state=RANDOM_STATE),
+        {
+            'n_estimators': [100, 300],
+            'learning_rate': [0.05, 0.1],
+            'max_depth': [2, 3],
+        },
+    ),
+    'svc': (
+        SVC(random_state=RANDOM_STATE),
+        {
+            'C': [0.1, 1.0, 10.0],
+            'gamma': ['scale'],
+            'class_weight': [None, 'balanced'],
+        },
+    ),
+    'gaus': (
+        GaussianNB(),
+        {'var_smoothing': [1e-9, 1e-6, 1e-3]},
+    ),
+    'log_reg': (
+        LogisticRegression(max_iter=2000),
+        {
+            'C': [0.01, 0.1, 1.0, 10.0],
+            'class_weight': [None, 'balanced'],
+        },
+    ),
+    'xgb': (
+        XGBClassifier(random_state=RANDOM_STATE, n_jobs=1),
+        {
+            'n_estimators': [100, 300],
+            'learning_rate': [0.05, 0.1],
+            'max_depth': [3, 5],
+        },
+    ),
+}
+
+# metrics computed on every validation fold
+METRICS = ['f1', 'roc_auc', 'accuracy']
+
+# training set memory-mapped once in each worker process
+_worker_data = None
+
+
+def load_training_data(source):
+    """Read and clean a labelled file, return the cleaned frame and labels"""
+    df = read_customer_file(source, columns=input_columns + ['Response'])
+    if 'Response' not in df.columns:
+        raise ValueError(f"{source} has no Response column to train on")
+    df = df[df['Response'].notna()]
+    return clean_file_data(df), df['Response'].to_numpy(dtype=np.int8)
+
+
+def encoding_checksum():
+    """Checksum of the modules that read, clean and encode a labelled file"""
+    digest = hashlib.sha256()
+    # this module too, it drops the unlabelled and incomplete rows
+    for code in (
+        read_customer_file,
+        clean_file_data,
+        FeatureEncoder,
+        load_training_data,
+    ):
+        digest.update(file_checksum(inspect.getsourcefile(code)).encode())
+    return digest.hexdigest()
+
+
+def encode_training_data(source, cache_dir=CACHE_DIR):
+    """
+    Encode a labelled file once and cache it, return the cache directory.
+
+    The vectorizer is fitted a single time on the cleaned records and the
+    matrix is built with ``FeatureEncoder``, as it is when scoring. Rows
+    with missing features are dropped. The cache holds ``X.npy``,
+    ``y.npy`` and the pickled vectorizer, a change to the file or to the
+    code of ``encoding_checksum`` encodes it again.
+    """
+    key = f"{file_checksum(source)[:16]}-{encoding_checksum()[:8]}"
+    path = os.path.join(cache_dir, key)
+    if os.path.exists(os.path.join(path, 'vectorizer.pkl')):
+        return path
+
+    df_clean, y = load_training_data(source)
+    vectorizer = DictVectorizer(sparse=False)
+    vectorizer.fit(df_clean.to_dict('records'))
+    X = FeatureEncoder(vectorizer).transform(df_clean)
+
+    # most estimators cannot fit missing values, leave those customers out
+    complete = np.isfinite(X).all(axis=1)
+    X, y = X[complete], y[complete]
+
+    # write to a temporary directory first, another run may be reading
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_path = tempfile.mkdtemp(dir=cache_dir, suffix='.tmp')
+    np.save(os.path.join(tmp_path, 'X.npy'), X)
+    np.save(os.path.join(tmp_path, 'y.npy'), y)
+    with open(os.path.join(tmp_path, 'vectorizer.pkl'), 'wb') as f_out:
+        pickle.dump(vectorizer, f_out)
+    try:
+        os.replace(tmp_path, path)
+    except OSError:
+        # encoded concurrently by another run, keep theirs
+        shutil.rmtree(tmp_path)
+    return path
+
+
+def _init_worker(data_path):
+    """Memory-map the cached training set when a worker process starts"""
+    global _worker_data  # pylint: disable=global-statement
+    _worker_data = (
+        np.load(os.path.join(data_path, 'X.npy'), mmap_mode='r'),
+        np.load(os.path.join(data_path, 'y.npy'), mmap_mode='r'),
+    )
+
+
+def _scores(estimator, X, y):
+    """Validation metrics of a fitted estimator"""
+    predictions = estimator.predict(X)
+    if hasattr(estimator, 'predict_proba'):
+        ranking = estimator.predict_proba(X)[:, 1]
+    else:
+        ranking = estimator.decision_function(X)
+    return {
+        'f1': f1_score(y, predictions),
+        'roc_auc': roc_auc_score(y, ranking),
+        'accuracy': accuracy_score(y, predictions),
+    }
+
+
+def _summary(scores):
+    """Mean and standard deviation of each metric over the folds"""
+    return {
+        metric: {
+            'mean': float(np.mean([s[metric] for s in scores])),
+            'std': float(np.std([s[metric] for s in scores])),
+        }
+        for metric in METRICS
+    }
+
+
+def _fit_fold(name, params, train_rows, test_rows):
+    """Fit one parameter set on one fold inside a worker"""
+    X, y = _worker_data
+    estimator = clone(search_spaces[name][0]).set_params(**params)
+    start = time.perf_counter()
+    estimator.fit(X[train_rows], y[train_rows])
+    fit_s = time.perf_counter() - start
+    return _scores(estimator, X[test_rows], y[test_rows]), fit_s
+
+
+def _refit(name, params):
+    """Fit the chosen parameters on every row inside a worker"""
+    X, y = _worker_data
+    estimator = clone(search_spaces[name][0]).set_params(**params)
+    start = time.perf_counter()
+    estimator.fit(X, y)
+    return estimator, time.perf_counter() - start
+
+
+def _best_candidate(grid, runs, scoring):
+    """
+    Pick the parameter set with the best mean ``scoring`` metric, given
+    the (scores, fit seconds) of each fold of each parameter set.
+    """
+    candidates = [
+        {
+            'params': params,
+            'metrics': _summary([scores for scores, _ in param_runs]),
+            'fit_s': float(sum(fit_s for _, fit_s in param_runs)),
+        }
+        for params, param_runs in zip(grid, runs)
+    ]
+    # ties go to the first parameter set, for reproducible choices
+    best = max(
+        candidates,
+        key=lambda candidate: candidate['metrics'][scoring]['mean'],
+    )
+    return {
+        'params': best['params'],
+        'metrics': best['metrics'],
+        'candidates': len(candidates),
+        'search_fit_s': sum(c['fit_s'] for c in candidates),
+    }
+
+
+def _cross_validate(pool, grids, splits):
+    """
+    Fit every parameter set of every grid on every fold as separate tasks,
+    returns the (scores, fit seconds) of each fold of each parameter set.
+    """
+    futures = {
+        name: [
+            [
+                pool.submit(_fit_fold, name, params, train_rows, test_rows)
+                for train_rows, test_rows in splits
+            ]
+            for params in grid
+        ]
+        for name, grid in grids.items()
+    }
+    return {
+        name: [[future.result() for future in runs] for runs in param_runs]
+        for name, param_runs in futures.items()
+    }
+
+
+def _refit_best(pool, results):
+    """Refit the best parameters of each estimator on all rows"""
+    refits = {
+        name: pool.submit(_refit, name, result['params'])
+        for name, result in results.items()
+    }
+    for name, future in refits.items():
+        estimator, refit_s = future.result()
+        results[name].update(estimator=estimator, refit_s=refit_s)
+
+
+def search(data_path, names, folds=5, scoring='f1', workers=None):
+    """
+    Cross-validated grid search of several estimators in one process pool.
+
+    Every (estimator, parameter set, fold) is a separate task, so all
+    cores stay busy regardless of how the grids are sized. Returns, per
+    estimator, the fitted best estimator, its parameters, the mean and
+    standard deviation of each metric over the folds and the timings.
+    """
+    y = np.load(os.path.join(data_path, 'y.npy'), mmap_mode='r')
+    splitter = StratifiedKFold(folds, shuffle=True, random_state=RANDOM_STATE)
+    splits = list(splitter.split(np.zeros(len(y)), y))
+    grids = {
+        name: list(ParameterGrid(search_spaces[name][1])) for name in names
+    }
+
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context('spawn'),
+        initializer=_init_worker,
+        initargs=(data_path,),
+    ) as pool:
+        start = time.perf_counter()
+        runs = _cross_validate(pool, grids, splits)
+        search_s = time.perf_counter() - start
+
+        results = {
+            name: _best_candidate(grids[name], runs[name], scoring)
+            for name in names
+        }
+        _refit_best(pool, results)
+    return results, search_s
+
+
+def _training_vectorizer(data_path):
+    """The cached vectorizer and the mean income of the training rows"""
+    with open(os.path.join(data_path, 'vectorizer.pkl'), 'rb') as f_in:
+        vectorizer = pickle.load(f_in)
+    X = np.load(os.path.join(data_path, 'X.npy'), mmap_mode='r')
+    return vectorizer, float(X[:, vectorizer.vocabulary_['Income']].mean())
+
+
+def _read_or_new_manifest(manifest_path):
+    try:
+        with open(manifest_path, 'r', encoding='utf-8') as f_in:
+            return json.load(f_in)
+    except FileNotFoundError:
+        return {'models': {}}
+
+
+def write_models(results, data_path, manifest_path=MANIFEST, meta=None):
+    """
+    Write the refit pipelines as versioned pickles and update the manifest.
+
+    Each pipeline is the cached vectorizer followed by its estimator,
+    saved as ``<name>-<version>.pkl`` with the version one above the one
+    in the manifest. Other models in the manifest are kept as they are.
+    """
+    model_dir = os.path.dirname(manifest_path)
+    vectorizer, income_mean = _training_vectorizer(data_path)
+    manifest = _read_or_new_manifest(manifest_path)
+
+    for name, result in results.items():
+        previous = manifest['models'].get(name, {}).get('version', '0')
+        version = str(int(previous) + 1)
+        pipeline = Pipeline(
+            [('vectorizer', vectorizer), ('estimator', result['estimator'])]
+        )
+        file_name = f"{name}-{version}.pkl"
+        with open(os.path.join(model_dir, file_name), 'wb') as f_out:
+            pickle.dump(pipeline, f_out)
+        manifest['models'][name] = {
+            'file': file_name,
+            'version': version,
+            'sha256': file_checksum(os.path.join(model_dir, file_name)),
+            'income_mean': round(income_mean, 2),
+            'params': result['params'],
+            'metrics': result['metrics'],
+            'timings': {
+                'candidates': result['candidates'],
+                'search_fit_s': round(result['search_fit_s'], 3),
+                'refit_s': round(result['refit_s'], 3),
+            },
+        }
+    if meta is not None:
+        manifest['training'] = meta
+
+    # the registry re-reads the manifest when it changes, swap it at once
+    with open(manifest_path + '.tmp', 'w', encoding='utf-8') as f_out:
+        json.dump(manifest, f_out, indent=4)
+    os.replace(manifest_path + '.tmp', manifest_path)
+    return manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('source', help='labelled customer file')
+    parser.add_argument(
+        '--models', nargs='+', choices=list(search_spaces), default=None
+    )
+    parser.add_argument('--folds', type=int, default=5)
+    parser.add_argument('--scoring', choices=METRICS, default='f1')
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--manifest', default=MANIFEST)
+    parser.add_argument('--cache-dir', default=CACHE_DIR)
+    args = parser.parse_args()
+    names = args.models or list(search_spaces)
+
+    start = time.perf_counter()
+    data_path = encode_training_data(args.source, args.cache_dir)
+    encode_s = time.perf_counter() - start
+    results, search_s = search(
+        data_path, names, args.folds, args.scoring, args.workers
+    )
+    meta = {
+        'source': os.path.basename(args.source),
+        'sha256': file_checksum(args.source),
+        'trained': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'rows': len(np.load(os.path.join(data_path, 'y.npy'), mmap_mode='r')),
+        'folds': args.folds,
+        'scoring': args.scoring,
+        'random_state': RANDOM_STATE,
+        'workers': args.workers,
+        'encode_s': round(encode_s, 3),
+        'search_s': round(search_s, 3),
+        'total_s': round(time.perf_counter() - start, 3),
+    }
+    manifest = write_models(results, data_path, args.manifest, meta)
+
+    print(f"{'model':<8} {'version':>7} {args.scoring:>9} {'std':>7}")
+    for name in names:
+        entry = manifest['models'][name]
+        metric = entry['metrics'][args.scoring]
+        print(
+            f"{name:<8} {entry['version']:>7} "
+            f"{metric['mean']:>9.3f} {metric['std']:>7.3f}"
+        )
+    print(
+        f"encoded in {meta['encode_s']:.1f} s, searched in "
+        f"{meta['search_s']:.1f} s on {args.workers} workers"
+    )
+
+
+if __name__ == '__main__':
+    main()
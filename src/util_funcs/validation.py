@@ -0,0 +1,223 @@
+import numpy as np
+import pandas as pd
+
+from util_funcs.metrics import timed
+from util_funcs.readers import input_columns, narrow_dtypes
+from util_funcs.pre_process import (
+    DATE_FORMAT,
+    FILE_REFERENCE_DATE,
+    spend_cols,
+    file_dtypes,
+    marital_codes,
+    education_codes,
+)
+
+# column added to the rejected rows
+REASON_COLUMN = 'Rejection_Reason'
+
+# inclusive bounds of the numeric columns, the activity limits match the
+# profile form and ages must be between 18 and 120 at the reference date
+value_ranges = {
+    'ID': (0, None),
+    'Income': (0, None),
+    'Kidhome': (0, None),
+    'Teenhome': (0, None),
+    'Recency': (0, 110),
+    'NumDealsPurchases': (0, 20),
+    'NumWebPurchases': (0, 35),
+    'NumCatalogPurchases': (0, 35),
+    'NumStorePurchases': (0, 20),
+    'NumWebVisitsMonth': (0, 25),
+    **{col: (0, None) for col in spend_cols},
+}
+
+# yes/no columns, 0 or 1
+flag_columns = [
+    'Complain',
+    'AcceptedCmp1',
+    'AcceptedCmp2',
+    'AcceptedCmp3',
+    'AcceptedCmp4',
+    'AcceptedCmp5',
+]
+
+# raw values accepted by the re-coding of each categorical column
+category_values = {
+    'Education': education_codes[0],
+    'Marital_Status': marital_codes[0],
+}
+
+# missing incomes are imputed, every other value is required
+optional_columns = ['Income']
+
+
+class ValidationError(ValueError):
+    """A customer file that cannot be scored at all"""
+
+
+def _numbers(values):
+    """Numeric values and the mask of values that are not numbers"""
+    numbers = pd.to_numeric(values.astype(object), errors='coerce')
+    return numbers, (numbers.isna() & values.notna()).to_numpy()
+
+
+def _number_checks(col, values):
+    """
+    Checks of one numeric column, and the column converted from text or
+    None when it already was numeric.
+    """
+    checks = []
+    converted, not_number = None, None
+    if not pd.api.types.is_numeric_dtype(values):
+        converted, not_number = _numbers(values)
+        checks.append((not_number, f"{col} is not a number"))
+        values = converted
+
+    if isinstance(values.dtype, np.dtype) and values.dtype.kind in 'iu':
+        # whole and present by construction, compared in their own dtype
+        values = values.to_numpy()
+        is_nan = None
+    else:
+        values = values.to_numpy(dtype=np.float64, na_value=np.nan)
+        is_nan = np.isnan(values)
+        # text that is not a number is reported as such, not as missing
+        missing = is_nan if not_number is None else is_nan & ~not_number
+        if col not in optional_columns:
+            checks.append((missing, f"{col} is missing"))
+        if file_dtypes[col].startswith('int') and col not in flag_columns:
+            fraction = (np.trunc(values) != values) & ~is_nan
+            checks.append((fraction, f"{col} is not a whole number"))
+
+    if col in flag_columns:
+        flag = (values == 0) | (values == 1)
+        if is_nan is not None:
+            flag |= is_nan
+        checks.append((~flag, f"{col} is not 0 or 1"))
+        return converted, checks
+    low, high = value_ranges.get(col, (None, None))
+    if low is not None:
+        checks.append((values < low, f"{col} is below {low}"))
+    if high is not None:
+        checks.append((values > high, f"{col} is above {high}"))
+    return converted, checks
+
+
+def _category_checks(col, values, accepted):
+    """Checks of one categorical column against its accepted raw values"""
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        known = accepted.get_indexer(values.cat.categories) >= 0
+        unknown = ~np.append(known, True)[values.cat.codes.to_numpy()]
+    else:
+        unknown = accepted.get_indexer(values.astype(object)) < 0
+    present = values.notna().to_numpy()
+    return [
+        (unknown & present, f"{col} is not a known value"),
+        (~present, f"{col} is missing"),
+    ]
+
+
+def _dates(values):
+    """Enrollment dates, NaT where a value is missing or not a date"""
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return pd.DatetimeIndex(values)
+    # dates repeat a lot, only the distinct ones are parsed
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        codes, uniques = values.cat.codes.to_numpy(), values.cat.categories
+    else:
+        codes, uniques = pd.factorize(values.astype(object))
+    uniques = pd.Series(uniques, dtype=object)
+    dates = pd.to_datetime(uniques, format=DATE_FORMAT, errors='coerce')
+    # other date formats are still understood, as when cleaning
+    retry = dates.isna() & uniques.notna()
+    if retry.any():
+        dates[retry] = pd.to_datetime(uniques[retry], errors='coerce')
+    dates = np.append(dates.to_numpy(), np.datetime64('NaT'))
+    return pd.DatetimeIndex(dates[codes])
+
+
+def _date_checks(values, reference_date):
+    """Checks of the enrollment dates"""
+    dates = _dates(values)
+    present = values.notna().to_numpy()
+    return [
+        (dates.isna() & present, "Dt_Customer is not a date"),
+        (~present, "Dt_Customer is missing"),
+        (
+            np.asarray(dates > pd.Timestamp(reference_date)),
+            "Dt_Customer is after the reference date",
+        ),
+    ]
+
+
+def rejection_masks(df, reference_date=FILE_REFERENCE_DATE):
+    """
+    Check every row of a customer frame at once.
+
+    Returns the frame with numeric columns converted from text and a list
+    of (mask, reason) pairs, one per failed check. Raises
+    ``ValidationError`` when a column scoring needs is missing.
+    """
+    missing = [col for col in input_columns if col not in df.columns]
+    if missing:
+        raise ValidationError(
+            f"The file is missing the columns {', '.join(missing)}"
+        )
+
+    checks = []
+    converted = {}
+    for col in input_columns:
+        if col in category_values or col == 'Dt_Customer':
+            continue
+        numbers, col_checks = _number_checks(col, df[col])
+        if numbers is not None:
+            converted[col] = numbers
+        checks.extend(col_checks)
+
+    birth_years = converted.get('Year_Birth', df['Year_Birth'])
+    age = reference_date.year - birth_years.to_numpy(
+        dtype=np.float64, na_value=np.nan
+    )
+    checks.append(
+        ((age < 18) | (age > 120), "Year_Birth gives an age outside 18-120")
+    )
+
+    for col, accepted in category_values.items():
+        checks.extend(_category_checks(col, df[col], accepted))
+    checks.extend(_date_checks(df['Dt_Customer'], reference_date))
+
+    # the caller's frame is kept, converted columns go in a new one
+    if converted:
+        df = pd.DataFrame(
+            {col: converted.get(col, values) for col, values in df.items()}
+        )
+    return df, checks
+
+
+@timed('validate', rows=len)
+def validate_customers(df, reference_date=FILE_REFERENCE_DATE):
+    """
+    Split a customer frame into the rows that can be scored and the ones
+    that cannot.
+
+    Types, ranges, categories and dates are checked with one vectorized
+    mask per check, before cleaning. Valid rows come back with narrow
+    dtypes, rejected rows as they were read with a ``Rejection_Reason``
+    listing every failed check.
+    """
+    checked, checks = rejection_masks(df, reference_date)
+    rejected = np.zeros(len(df), dtype=bool)
+    for mask, _ in checks:
+        rejected |= mask
+
+    # integer columns can only be narrowed once the bad rows are gone
+    if rejected.any():
+        checked = checked[~rejected].copy()
+    valid = narrow_dtypes(checked)
+    rejects = df[rejected].copy()
+    reasons = pd.Series('', index=rejects.index, dtype=object)
+    for mask, reason in checks:
+        failed = mask[rejected]
+        if failed.any():
+            reasons[failed] += reason + '; '
+    rejects[REASON_COLUMN] = reasons.str[:-2]
+    return valid, rejects
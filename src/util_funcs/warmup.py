@@ -0,0 +1,84 @@
+import threading
+from datetime import date
+
+from util_funcs.metrics import timed
+from util_funcs.registry import get_registry
+
+# models the pages predict with, loaded before the other ones
+PAGE_MODELS = ['dtc', 'xgb']
+
+# a plausible profile form submission, used for the first predictions
+SAMPLE_RECORD = {
+    'ID': 0,
+    'Year_Birth': 1970,
+    'Education': 'Graduation',
+    'Marital_Status': 'Married',
+    'Income': 52_000.0,
+    'Dt_Customer': date(2013, 6, 1),
+    'Kidhome': 0,
+    'Teenhome': 1,
+    'NumDealsPurchases': 2,
+    'NumWebPurchases': 4,
+    'NumCatalogPurchases': 2,
+    'NumStorePurchases': 6,
+    'NumWebVisitsMonth': 5,
+    'Recency': 49,
+    'MntWines': 300,
+    'MntFruits': 25,
+    'MntMeatProducts': 160,
+    'MntFishProducts': 35,
+    'MntSweetProducts': 25,
+    'MntGoldProds': 45,
+    'Complain': 0,
+    'AcceptedCmp1': 0,
+    'AcceptedCmp2': 0,
+    'AcceptedCmp3': 0,
+    'AcceptedCmp4': 0,
+    'AcceptedCmp5': 0,
+}
+
+_thread = None
+_lock = threading.Lock()
+
+
+def warm_up(names=None):
+    """
+    Import the scoring stack, load the models and predict once with each.
+
+    The page models come first so they are ready soonest. The first
+    prediction of an estimator pays for its lazy initialisation, which
+    is then off the path of the first real request. A model that fails
+    to load or predict is skipped, its request raises the error again.
+    Returns the error of each skipped model by name.
+    """
+    # pylint: disable=import-outside-toplevel
+    with timed('warmup_imports'):
+        from util_funcs.encoder import predict_record
+        from util_funcs.pre_process import clean_form_record
+
+    registry = get_registry()
+    names = names or registry.names()
+    ordered = [n for n in PAGE_MODELS if n in names] + [
+        n for n in names if n not in PAGE_MODELS
+    ]
+    features = clean_form_record(SAMPLE_RECORD)
+    errors = {}
+    for name in ordered:
+        try:
+            with timed('warmup_model'):
+                predict_record(registry.get(name), features)
+        except Exception as exc:  # pylint: disable=broad-except
+            errors[name] = exc
+    return errors
+
+
+def start_warmup(names=None):
+    """Warm up in a background thread, once per process"""
+    global _thread  # pylint: disable=global-statement
+    with _lock:
+        if _thread is None:
+            _thread = threading.Thread(
+                target=warm_up, args=(names,), name='warm-up', daemon=True
+            )
+            _thread.start()
+        return _thread
@@ -5,7 +5,18 @@ import streamlit as st
 import streamlit.components.v1 as components
 from dateutil.relativedelta import relativedelta
 
-from util_funcs.pre_process import load_model, clean_form_data
+from util_funcs.encoder import encode_record
+from util_funcs.metrics import timed
+from util_funcs.batching import get_scheduler
+from util_funcs.registry import get_registry
+from util_funcs.pre_process import clean_form_record
+from util_funcs.segment_cube import (
+    SPEND_EDGES,
+    TENURE_EDGES,
+    get_cube,
+    segment_of,
+)
+from util_funcs.prediction_cache import get_prediction_cache
 
 styling_pred_output = """
 <style>
@@ -35,11 +46,10 @@ styling_pred_output = """
 st.markdown(styling_pred_output, unsafe_allow_html=True)
 
 
-# load model and cache it
-@st.cache_resource()
+# the registry keeps the model loaded and swaps in new versions
 def get_model():
-    """Caches the model loaded"""
-    return load_model('dtc.pkl')
+    """Returns the pinned model from the registry"""
+    return get_registry().get('dtc')
 
 
 # user can be between 18 to 120 years
@@ -201,25 +211,24 @@ def process_data(all_fields):
         # join both dictionaries
         non_binary_response_data.update(binary_response_data)
 
-        # convert to DataFrame
-        df = pd.DataFrame([non_binary_response_data])
-
-        return df
+        return non_binary_response_data
     st.error("You might have forgotten something 😊.")
     return None
 
 
 # customer profile from the processed and cleaned data
 # fmt: off
-def customer_profile(processed_df, cleaned_df):
+def customer_profile(processed_record, cleaned_record):
     """Create a customer profile based on the processed and clean data."""
 
-    processed_fields = [ID, Income, Marital_Status, Education]
-    processed_df = pd.DataFrame([processed_fields],
+    processed_fields = ['ID', 'Income', 'Marital_Status', 'Education']
+    processed_df = pd.DataFrame([[processed_record[field] for field in processed_fields]],
                                 columns=['ID', 'Income', 'Marital Status', 'Education Level'])
     clean_fields = ['Spending', 'Children', 'Tenure', 'Age_Group', 'Recency']
+    cleaned_df = pd.DataFrame([[cleaned_record[field] for field in clean_fields]],
+                              columns=clean_fields)
 
-    profile_df = pd.concat([processed_df, cleaned_df[clean_fields]], axis=1)
+    profile_df = pd.concat([processed_df, cleaned_df], axis=1)
     st.markdown("""
              To better understand why, here is a quick summary of his/her profile that
              you can compare to the dashboard below for those who accepted the offer:
@@ -244,6 +253,74 @@ def load_dashboard():
 # pylint: enable=line-too-long
 
 
+def _bins(edges):
+    """Histogram bin labels from their edges"""
+    return [
+        f"{low:g}+" if high == float('inf') else f"{low:g}-{high:g}"
+        for low, high in zip(edges[:-1], edges[1:])
+    ]
+
+
+def segment_comparison(cleaned_record):
+    """
+    Compare the customer's segment with all customers, from the segment
+    cube. Returns False when there is no cube or segment to show.
+    """
+    cube = get_cube()
+    segment = segment_of(cleaned_record)
+    if cube is None or segment is None:
+        return False
+    with timed('segment_query', rows=1):
+        stats = cube.query(**segment)
+        overall = cube.query()
+
+    st.markdown(
+        "Customers in the same segment "
+        f"({', '.join(str(value) for value in segment.values())}) "
+        "compared to all customers:"
+    )
+    columns = st.columns(4)
+    columns[0].metric(
+        "Customers", f"{stats['customers']:,}", f"of {overall['customers']:,}"
+    )
+    columns[1].metric(
+        "Response rate",
+        f"{stats['response_rate']:.1%}",
+        f"{stats['response_rate'] - overall['response_rate']:+.1%}",
+    )
+    columns[2].metric(
+        "Mean spending",
+        f"{stats['spend_mean']:,.0f}",
+        f"{cleaned_record['Spending'] - stats['spend_mean']:+,.0f} this customer",
+    )
+    columns[3].metric(
+        "Mean tenure (months)",
+        f"{stats['tenure_mean']:.1f}",
+        f"{cleaned_record['Tenure'] - stats['tenure_mean']:+.1f} this customer",
+    )
+
+    def shares(histogram):
+        total = histogram.sum()
+        return histogram / total if total else histogram
+
+    for title, key, edges in [
+        ("Spending", 'spend_hist', SPEND_EDGES),
+        ("Tenure (months)", 'tenure_hist', TENURE_EDGES),
+    ]:
+        st.caption(f"{title}, share of customers")
+        st.bar_chart(
+            pd.DataFrame(
+                {
+                    'Segment': shares(stats[key]),
+                    'All customers': shares(overall[key]),
+                },
+                index=_bins(edges),
+            ),
+            stack=False,
+        )
+    return True
+
+
 if submitted:
     # fmt: off
     input_fields = [
@@ -254,16 +331,26 @@ if submitted:
         AcceptedCmp4, AcceptedCmp5,
     ]
     # fmt: on
-    df_processed = process_data(input_fields)
-    if df_processed is not None:
+    processed_data = process_data(input_fields)
+    if processed_data is not None:
         # load the model
         model = get_model()
 
-        # cleaned data
-        df_clean = clean_form_data(df_processed)
-
-        # give prediction
-        prediction = model.predict(df_clean.to_dict('records'))[0]
+        # cleaned data, without building a one-row DataFrame
+        cleaned_data = clean_form_record(processed_data)
+
+        # give prediction, from the cache when this customer was scored
+        # before, otherwise batched with other sessions predicting now
+        with timed('encode_record', rows=1):
+            features = encode_record(model, cleaned_data)
+        with timed('predict_record', rows=1):
+            predictions, _ = get_prediction_cache().predict(
+                'dtc',
+                get_registry().version('dtc'),
+                features,
+                get_scheduler('dtc').predict,
+            )
+        prediction = predictions[0]
         if prediction == 1:
             st.markdown(
                 f"<div class='positive'>Customer {ID} is likely to accept the offer</div>",
@@ -276,8 +363,13 @@ if submitted:
             )
 
         # get customer profile
-        customer_profile(processed_df=df_processed, cleaned_df=df_clean)
+        with timed('render_profile', rows=1):
+            customer_profile(
+                processed_record=processed_data,
+                cleaned_record=cleaned_data,
+            )
 
-        # tableau dashboard
+        # segment statistics, the tableau dashboard until a cube is built
         with st.expander("Show Dashboard"):
-            load_dashboard()
+            if not segment_comparison(cleaned_data):
+                load_dashboard()
@@ -1,67 +1,431 @@
 import pandas as pd
 import streamlit as st
 
-from util_funcs.pre_process import load_model, clean_file_data
+from util_funcs.jobs import DONE, FAILED, get_job_queue
+from util_funcs.compare import compare_models
+from util_funcs.encoder import encode
+from util_funcs.metrics import timed
+from util_funcs.ranking import quota_columns, rank_customers
+from util_funcs.readers import (
+    file_format,
+    upload_types,
+    write_results,
+    read_customer_file,
+)
+from util_funcs.results import (
+    PAGE_SIZES,
+    n_pages,
+    page_rows,
+    row_order,
+    positive_ids,
+    segment_columns,
+    segment_summary,
+)
+from util_funcs.parallel import ScoringEngine
+from util_funcs.registry import get_registry
+from util_funcs.validation import ValidationError, validate_customers
+from util_funcs.pre_process import labels, clean_file_data, education_codes
+from util_funcs.segment_cube import submit_update
+from util_funcs.prediction_cache import get_prediction_cache
 
 
-# load model and cache it
-@st.cache_resource
+# the registry keeps the model loaded and swaps in new versions
 def get_model():
-    """Caches the model loaded"""
-    return load_model('xgb.pkl')
+    """Returns the pinned model from the registry"""
+    return get_registry().get('xgb')
+
+
+# start the scoring pool once per server
+@st.cache_resource
+def get_engine():
+    """Caches the scoring process pool"""
+    return ScoringEngine('xgb')
 
 
 # file upload function
 def file_upload_form():
-    upload_file = st.file_uploader("Choose a CSV file", type="csv")
+    upload_file = st.file_uploader(
+        "Choose a CSV, Parquet or Feather file", type=upload_types
+    )
+    background = st.checkbox(
+        'Score in the background',
+        help='Scores large files chunk by chunk without blocking the page, '
+        'results stay downloadable by job ID',
+    )
+    compare_names = st.multiselect(
+        'Compare models',
+        get_registry().names(),
+        help='Scores the file with every selected model to show where '
+        'they disagree',
+    )
+    with st.expander('Contact budget'):
+        budget = st.number_input(
+            'Customers to contact',
+            min_value=0,
+            step=100,
+            help='Ranks the customers by their probability to accept and '
+            'keeps the most likely ones, 0 scores every customer',
+        )
+        segment_column = st.selectbox(
+            'Quotas by',
+            [None, *quota_columns],
+            format_func=lambda column: column or 'No quotas',
+        )
+        quotas = {}
+        if budget and segment_column:
+            segments = (
+                labels if segment_column == 'Age_Group' else education_codes[1]
+            )
+            edited = st.data_editor(
+                pd.DataFrame({'Segment': segments, 'Quota': budget}),
+                disabled=['Segment'],
+                hide_index=True,
+            )
+            quotas = {
+                segment: int(quota)
+                for segment, quota in zip(edited['Segment'], edited['Quota'])
+            }
+    ranking = (budget, segment_column, quotas) if budget else None
     process_file = st.button('Process File')
-    return upload_file, process_file
+    return upload_file, background, compare_names, ranking, process_file
 
 
-# process the csv file
+# process the customer file
 def process_uploaded_file(uploaded_file):
     if uploaded_file is not None:
-        df = pd.read_csv(uploaded_file)
+        with timed('read_file') as timer:
+            df = read_customer_file(uploaded_file)
+            timer.rows = len(df)
+        df, rejects = validate_customers(df)
+        if df.empty:
+            show_rejects_download(len(rejects), rejects_csv(rejects))
+            raise ValidationError(
+                f"None of the {len(rejects)} customers in the file can be "
+                "scored."
+            )
         df_clean = clean_file_data(df)
-        model = get_model()
-        predictions = model.predict(df_clean.to_dict('records'))
-        df['Prediction'] = predictions
-        return df
+        with timed('encode', rows=len(df)):
+            X = encode(get_model(), df_clean)
+
+        # only customers not scored before reach the model
+        version = get_registry().version('xgb')
+        with timed('predict', rows=len(df)):
+            df['Prediction'], n_hits = get_prediction_cache().predict(
+                'xgb', version, X, get_engine().predict_encoded
+            )
+
+        # keep the segment statistics of the profile page current, the
+        # cube file is written in the background
+        submit_update(df_clean, df['Prediction'], df['ID'])
+        return {
+            'scored': df,
+            'segments': df_clean[segment_columns],
+            'format': file_format(uploaded_file)[0],
+            'cache_hits': n_hits,
+            'rejects': rejects,
+        }
     return None
 
 
-# generate output
-uploaded_csv, processed_file = file_upload_form()
-if processed_file and uploaded_csv is not None:
-    df_with_predictions = process_uploaded_file(uploaded_csv)
-    if df_with_predictions is not None:
-        st.subheader("Prediction Results")
-
-        # get those who would accept offer and their IDs
-        filtered_df = df_with_predictions[
-            df_with_predictions['Prediction'] == 1
-        ]
-        count_client = filtered_df.shape[0]
-        ids_ = filtered_df['ID'].astype(str).tolist()
-        ids_string = ", ".join(ids_)
-        st.success(
-            f"""
-                   There are {count_client} customers who are likely to accept the offer.
-                   These are customers with the following IDs: {ids_string}."""
-        )
+def rejects_csv(rejects):
+    return rejects.to_csv(index=False).encode('utf-8')
+
 
-        # display the results in a table
-        st.write(df_with_predictions)
+# rows that failed validation, with the reasons
+def show_rejects_download(n_rejected, data, key=None):
+    st.warning(
+        f"{n_rejected} customers were not scored because their values "
+        "are missing or invalid. The rejected rows list the reasons."
+    )
+    st.download_button(
+        label=f"Download the {n_rejected} rejected rows",
+        data=data,
+        file_name="rejected_rows.csv",
+        mime="text/csv",
+        key=None if key is None else f'rejects-{key}',
+    )
 
-        # download link for the results
-        csv = df_with_predictions.to_csv(index=False)
-        st.download_button(
-            label="Download predictions as CSV",
-            data=csv,
-            file_name="predictions.csv",
-            mime="text/csv",
+
+# queue the customer file for scoring in the background
+def submit_background_job(uploaded_file):
+    job_id = get_job_queue().submit(uploaded_file, uploaded_file.name)
+    st.session_state.setdefault('job_ids', []).append(job_id)
+    st.info(
+        f"Job {job_id} is scoring the file in the background. Its results "
+        "stay available under this job ID."
+    )
+
+
+# progress of the running jobs, refreshed without rerunning the page
+@st.fragment(run_every=2)
+def show_running_jobs(job_ids):
+    queue = get_job_queue()
+    for job_id in job_ids:
+        state = queue.status(job_id)
+        if state is None or state['status'] in (DONE, FAILED):
+            # render the finished job with its download outside the fragment
+            st.rerun()
+        total = state['total_rows']
+        if total:
+            rate = state['rows_per_s'] or 0
+            checked = state['rows_done'] + state.get('rows_rejected', 0)
+            st.progress(
+                min(checked / total, 1.0),
+                text=f"Job {job_id}: {checked} of {total} rows "
+                f"checked, {rate:,.0f} rows/s",
+            )
+        else:
+            st.progress(0.0, text=f"Job {job_id}: counting rows")
+
+
+# status of the jobs of this session, with the downloads of finished ones
+def show_jobs(job_ids):
+    queue = get_job_queue()
+    st.subheader("Background Jobs")
+    running = []
+    for job_id in job_ids:
+        state = queue.status(job_id)
+        if state is None:
+            st.warning(f"Job {job_id} was not found.")
+        elif state['status'] == DONE:
+            st.success(
+                f"""
+                       Job {job_id} ({state['name']}): there are
+                       {state['positives']} out of {state['rows_done']}
+                       customers who are likely to accept the offer."""
+            )
+            with open(queue.result_path(job_id), 'rb') as f_in:
+                st.download_button(
+                    label=f"Download predictions of job {job_id}",
+                    data=f_in,
+                    file_name=f"predictions-{job_id}.csv",
+                    mime="text/csv",
+                    key=f'download-{job_id}',
+                )
+            n_rejected = state.get('rows_rejected', 0)
+            if n_rejected:
+                with open(queue.rejects_path(job_id), 'rb') as f_in:
+                    show_rejects_download(n_rejected, f_in, key=job_id)
+        elif state['status'] == FAILED:
+            st.error(f"Job {job_id} failed: {state['error']}")
+        else:
+            running.append(job_id)
+    if running:
+        show_running_jobs(running)
+
+
+# score the customer file with several models side by side
+def process_uploaded_file_comparison(uploaded_file, names):
+    df, rejects = validate_customers(read_customer_file(uploaded_file))
+    if not rejects.empty:
+        show_rejects_download(len(rejects), rejects_csv(rejects))
+    if df.empty:
+        raise ValidationError("None of the customers in the file is valid.")
+    registry = get_registry()
+    models = {name: registry.get(name) for name in names}
+    scores, timings = compare_models(
+        models, clean_file_data(df), max_workers=len(models)
+    )
+
+    st.subheader("Model Comparison")
+    disagree = scores['Agreement'] < 1
+    st.success(
+        f"""
+               The models disagree on {disagree.sum()} out of {len(scores)}
+               customers. {(scores['Majority_Vote'] == 1).sum()} customers
+               are likely to accept the offer by majority vote."""
+    )
+
+    # positive predictions and scoring time of each model
+    st.write(
+        pd.DataFrame(
+            {
+                'Likely to accept': [
+                    (scores[f'Prediction_{name}'] == 1).sum() for name in names
+                ],
+                'Seconds': [timings[name] for name in names],
+            },
+            index=names,
         )
-    else:
-        st.error(
-            "Error processing the file. Please check the format and try again."
+    )
+    st.caption(f"Encoding the file took {timings['encode']:.2f} seconds.")
+
+    # first rows the models disagree on, the rest is in the download
+    df_compared = pd.concat([df, scores], axis=1)
+    st.dataframe(df_compared[disagree].head(PAGE_SIZES[-1]))
+
+    fmt, _ = file_format(uploaded_file)
+    data, mime, suffix = write_results(df_compared, fmt)
+    label = 'CSV' if fmt == 'csv' else fmt.capitalize()
+    st.download_button(
+        label=f"Download comparison as {label}",
+        data=data,
+        file_name="comparison" + suffix,
+        mime=mime,
+    )
+
+
+# the customers most likely to accept within the contact budget
+def process_uploaded_file_ranking(uploaded_file, budget, column, quotas):
+    ranked = rank_customers(
+        uploaded_file,
+        get_model(),
+        budget,
+        segment_column=column,
+        quotas=quotas,
+        name=uploaded_file.name,
+    )
+
+    st.subheader("Customers to Contact")
+    st.success(
+        f"""
+               These are the {len(ranked)} customers most likely to accept
+               the offer. About {ranked['Probability'].sum():,.0f} of them
+               are expected to accept."""
+    )
+    if column:
+        st.write(
+            ranked.groupby('Segment')['Probability']
+            .agg(['size', 'mean'])
+            .rename(columns={'size': 'Customers', 'mean': 'Mean probability'})
         )
+    st.dataframe(ranked.head(PAGE_SIZES[-1]), hide_index=True)
+
+    fmt, _ = file_format(uploaded_file)
+    data, mime, suffix = write_results(ranked, fmt)
+    label = 'CSV' if fmt == 'csv' else fmt.capitalize()
+    st.download_button(
+        label=f"Download the ranked customers as {label}",
+        data=data,
+        file_name="customers_to_contact" + suffix,
+        mime=mime,
+    )
+
+
+# one page of the scored rows, sorted and filtered
+def show_results_page(df):
+    # sorting and filtering run on the server, only one page is sent
+    filter_col, sort_col, order_col, size_col = st.columns(4)
+    shown = filter_col.selectbox(
+        'Show', ['All customers', 'Likely to accept', 'Likely to reject']
+    )
+    sort_by = sort_col.selectbox('Sort by', [None, *df.columns])
+    descending = order_col.checkbox('Descending')
+    page_size = size_col.selectbox('Rows per page', PAGE_SIZES)
+
+    prediction = {'Likely to accept': 1, 'Likely to reject': 0}.get(shown)
+    positions = row_order(df, sort_by, not descending, prediction)
+    # a new filter or page size starts again from the first page
+    page = st.number_input(
+        'Page',
+        min_value=1,
+        max_value=n_pages(len(positions), page_size),
+        key=f'page-{shown}-{page_size}',
+    )
+    with timed('render_table', rows=page_size):
+        st.dataframe(page_rows(df, positions, page, page_size))
+    first = min((page - 1) * page_size + 1, len(positions))
+    last = min(page * page_size, len(positions))
+    st.caption(f"Rows {first} to {last} of {len(positions)}.")
+
+
+# downloads of the scored file, its rejected rows and the positive IDs
+def show_batch_downloads(results, n_positive):
+    df = results['scored']
+
+    # serialize the downloads once per scored file
+    if 'download' not in results:
+        with timed('write_results', rows=len(df)):
+            results['download'] = write_results(df, results['format'])
+    data, mime, suffix = results['download']
+    fmt = results['format']
+    label = 'CSV' if fmt == 'csv' else fmt.capitalize()
+
+    rejects = results['rejects']
+    if not rejects.empty:
+        if 'rejects_download' not in results:
+            results['rejects_download'] = rejects_csv(rejects)
+        show_rejects_download(len(rejects), results['rejects_download'])
+
+    download_col, ids_col = st.columns(2)
+    download_col.download_button(
+        label=f"Download predictions as {label}",
+        data=data,
+        file_name="predictions" + suffix,
+        mime=mime,
+    )
+    ids_col.download_button(
+        label=f"Download the {n_positive} IDs likely to accept",
+        data=positive_ids(df),
+        file_name="likely_to_accept_ids.csv",
+        mime="text/csv",
+    )
+
+
+# summary, one page of rows and downloads of the scored file
+def show_batch_results(results):
+    df = results['scored']
+    n_positive = int((df['Prediction'] == 1).sum())
+
+    st.subheader("Prediction Results")
+    st.success(
+        f"""
+               There are {n_positive} out of {len(df)} customers who are
+               likely to accept the offer."""
+    )
+    st.caption(
+        f"{results['cache_hits']} of {len(df)} customers were served from "
+        "the prediction cache."
+    )
+
+    st.markdown("**Acceptance by segment**")
+    st.dataframe(
+        segment_summary(df['Prediction'], results['segments']),
+        hide_index=True,
+        use_container_width=True,
+    )
+
+    show_results_page(df)
+    show_batch_downloads(results, n_positive)
+
+
+# generate output
+(
+    uploaded_csv,
+    in_background,
+    compared_models,
+    ranking_options,
+    processed_file,
+) = file_upload_form()
+if processed_file and uploaded_csv is not None:
+    st.session_state.pop('batch_results', None)
+    try:
+        if in_background:
+            submit_background_job(uploaded_csv)
+        elif compared_models:
+            process_uploaded_file_comparison(uploaded_csv, compared_models)
+        elif ranking_options:
+            process_uploaded_file_ranking(uploaded_csv, *ranking_options)
+        else:
+            batch_results = process_uploaded_file(uploaded_csv)
+            if batch_results is not None:
+                # kept across the reruns triggered by paging
+                st.session_state['batch_results'] = batch_results
+            else:
+                st.error(
+                    "Error processing the file. Please check the format and "
+                    "try again."
+                )
+    except ValidationError as exc:
+        st.error(str(exc))
+
+if 'batch_results' in st.session_state:
+    show_batch_results(st.session_state['batch_results'])
+
+# look up earlier jobs, for instance after the browser disconnected
+lookup = st.text_input('Job ID', placeholder='Look up a background job')
+lookup = lookup.strip()
+if lookup and lookup not in st.session_state.get('job_ids', []):
+    st.session_state.setdefault('job_ids', []).append(lookup)
+if st.session_state.get('job_ids'):
+    show_jobs(st.session_state['job_ids'])
@@ -3,14 +3,23 @@ from datetime import datetime
 
 import streamlit as st
 
+from util_funcs.warmup import start_warmup
+from util_funcs.metrics import enabled, get_metrics
+
 st.set_page_config(layout="wide")
 
+# import the scoring stack and load the models in the background, the
+# pages import them on their first run and find them already loaded
+start_warmup()
+
 # Navigation setup
 pg = st.navigation(
     [
         st.Page("home_page.py", title="About", icon="🏠"),
         st.Page(
-            "customer_profile.py", title="Customer Profiling Toolkit", icon="👨‍🏫"
+            "customer_profile.py",
+            title="Customer Profiling Toolkit",
+            icon="👨‍🏫",
         ),
         st.Page("file_upload.py", title="Batch Analysis Toolkit", icon="📂"),
     ]
@@ -29,3 +38,26 @@ st.sidebar.markdown(
 )
 
 pg.run()
+
+# stage timings of this server, when SCORING_METRICS=1
+if enabled():
+    import pandas as pd  # pylint: disable=import-outside-toplevel
+
+    with st.sidebar.expander("Debug: stage timings"):
+        metrics = get_metrics()
+        summary = metrics.summary()
+        if summary:
+            st.dataframe(
+                pd.DataFrame(summary).set_index('stage'),
+                use_container_width=True,
+            )
+        else:
+            st.caption("No stage has been timed yet.")
+        st.download_button(
+            label="Export Prometheus metrics",
+            data=metrics.to_prometheus(),
+            file_name="metrics.prom",
+            mime="text/plain",
+        )
+        if st.button("Reset timings"):
+            metrics.reset()
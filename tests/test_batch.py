@@ -0,0 +1,48 @@
+import io
+
+import pandas as pd
+import pytest
+
+from util_funcs.batch import income_mean, score_chunk
+from util_funcs.readers import read_customer_file, iter_customer_chunks
+from util_funcs.registry import get_registry
+from util_funcs.synthetic import make_customers
+
+
+def csv_file(df):
+    source = io.BytesIO(df.to_csv(index=False).encode())
+    source.name = 'customers.csv'
+    return source
+
+
+@pytest.mark.parametrize('chunksize', [None, 7])
+def test_income_mean_skips_rejected_customers(chunksize):
+    df = make_customers(40, seed=3)
+    df.loc[::5, 'Income'] = 10_000_000.0
+    df.loc[::5, 'Recency'] = 500
+
+    mean, n_rows = income_mean(csv_file(df), chunksize)
+    assert n_rows == len(df)
+    assert mean == pytest.approx(df.loc[df['Recency'] <= 110, 'Income'].mean())
+
+
+def test_chunks_score_like_the_whole_file():
+    df = make_customers(60, seed=4, missing_income=0.1)
+    df.loc[::9, 'Recency'] = 500
+    model = get_registry().get('xgb')
+    mean, _ = income_mean(csv_file(df), chunksize=None)
+
+    whole, whole_rejects = score_chunk(
+        read_customer_file(csv_file(df)), model, mean
+    )
+    chunks = [
+        score_chunk(chunk, model, mean)
+        for chunk in iter_customer_chunks(csv_file(df), chunksize=7)
+    ]
+    scored = pd.concat([valid for valid, _ in chunks])
+    rejects = pd.concat([rejected for _, rejected in chunks])
+
+    assert 0 < len(whole_rejects) < len(df)
+    assert scored['ID'].tolist() == whole['ID'].tolist()
+    assert scored['Prediction'].tolist() == whole['Prediction'].tolist()
+    assert rejects['ID'].tolist() == whole_rejects['ID'].tolist()
@@ -0,0 +1,89 @@
+import time
+import threading
+
+import numpy as np
+import pytest
+
+from util_funcs.batching import BatchScheduler
+
+
+# pylint: disable-next=too-few-public-methods
+class BlockingPredict:
+    """Times ten of the rows, the first call waits until released"""
+
+    def __init__(self):
+        self.release = threading.Event()
+        self.started = threading.Event()
+        self.calls = []
+
+    def __call__(self, rows):
+        rows = np.asarray(rows)
+        self.calls.append(len(rows))
+        if len(self.calls) == 1:
+            self.started.set()
+            self.release.wait(5)
+        if (rows < 0).any():
+            raise ValueError('negative row')
+        return rows * 10
+
+
+@pytest.fixture(name='predict_fn')
+def fixture_predict_fn():
+    return BlockingPredict()
+
+
+def queue_behind_first(scheduler, predict_fn, requests):
+    """Submit requests while a first one is predicted, so they batch"""
+    first = scheduler.submit(np.array([0]))
+    assert predict_fn.started.wait(5)
+    futures = [scheduler.submit(rows) for rows in requests]
+    predict_fn.release.set()
+    assert first.result(5).tolist() == [0]
+    return futures
+
+
+def test_lone_request_is_not_held_back():
+    scheduler = BatchScheduler(lambda rows: rows, max_wait_ms=5000)
+    start = time.monotonic()
+    assert scheduler.predict(np.array([1, 2]), timeout=5).tolist() == [1, 2]
+    assert time.monotonic() - start < 1
+
+
+def test_each_request_gets_its_own_rows(predict_fn):
+    scheduler = BatchScheduler(predict_fn, max_wait_ms=50)
+    requests = [np.arange(start, start + n) for start, n in [(1, 3), (4, 1)]]
+    requests.append(np.arange(5, 10))
+    futures = queue_behind_first(scheduler, predict_fn, requests)
+
+    for rows, future in zip(requests, futures):
+        assert future.result(5).tolist() == (rows * 10).tolist()
+    # the three queued requests went through as one batch
+    assert predict_fn.calls == [1, 9]
+
+
+def test_failed_batch_falls_back_to_single_requests(predict_fn):
+    scheduler = BatchScheduler(predict_fn, max_wait_ms=50)
+    requests = [np.array([1, 2]), np.array([-1]), np.array([3])]
+    good, bad, last = queue_behind_first(scheduler, predict_fn, requests)
+
+    assert good.result(5).tolist() == [10, 20]
+    assert last.result(5).tolist() == [30]
+    with pytest.raises(ValueError, match='negative row'):
+        bad.result(5)
+    assert predict_fn.calls == [1, 4, 2, 1, 1]
+
+
+def test_counters(predict_fn):
+    scheduler = BatchScheduler(predict_fn, max_batch_size=8, max_wait_ms=50)
+    requests = [np.arange(3), np.arange(2)]
+    for future in queue_behind_first(scheduler, predict_fn, requests):
+        future.result(5)
+
+    stats = scheduler.stats()
+    assert stats['requests'] == 3
+    assert stats['rows'] == 6
+    assert stats['batches'] == 2
+    assert stats['max_queue_depth'] == 2
+    assert stats['queue_depth'] == 0
+    assert stats['mean_batch_size'] == 3
+    assert stats['fill_ratio'] == 3 / 8
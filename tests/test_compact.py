@@ -0,0 +1,78 @@
+# tests reach into the internals they check
+# pylint: disable=protected-access
+import os
+import shutil
+import argparse
+
+import numpy as np
+import pytest
+
+from util_funcs.compact import (
+    prune_trees,
+    compact_entry,
+    split_holdout,
+    _float32_forest,
+    float32_thresholds,
+)
+from util_funcs.encoder import encode
+from util_funcs.registry import MODEL_DIR, get_registry, read_manifest
+from util_funcs.synthetic import make_customers
+from util_funcs.flat_trees import flatten_model
+from util_funcs.pre_process import clean_file_data
+
+
+@pytest.fixture(name='df_clean', scope='module')
+def fixture_df_clean():
+    return clean_file_data(make_customers(2000, seed=3))
+
+
+@pytest.mark.parametrize('strict', [False, True])
+def test_float32_inputs_stay_on_their_side_of_a_split(strict):
+    thresholds = np.random.default_rng(0).normal(0, 1e3, 5000)
+    rounded = float32_thresholds(thresholds, strict)
+    assert rounded.dtype == np.float32
+
+    # the float32 values around every threshold are the ones that move
+    near = rounded.astype(np.float32)
+    for x in (
+        np.nextafter(near, np.float32(-np.inf)),
+        near,
+        np.nextafter(near, np.float32(np.inf)),
+    ):
+        if strict:
+            assert np.array_equal(x < thresholds, x < rounded)
+        else:
+            assert np.array_equal(x <= thresholds, x <= rounded)
+
+
+@pytest.mark.parametrize('min_agreement', [0.99, 0.5])
+def test_pruned_trees_agree_on_the_rows_they_were_pruned_on(
+    df_clean, min_agreement
+):
+    model = get_registry().get('xgb')
+    forest = _float32_forest(flatten_model(model))
+    X = encode(model, df_clean).astype(np.float32)
+    pruned = prune_trees(forest, X, min_agreement)
+
+    assert 1 <= pruned.n_trees < forest.n_trees
+    assert np.mean(pruned.predict(X) == forest.predict(X)) >= min_agreement
+
+
+def test_holdout_parts_are_disjoint(df_clean):
+    prune_rows, check_rows = split_holdout(df_clean)
+    assert len(prune_rows) + len(check_rows) == len(df_clean)
+    assert not set(prune_rows.index) & set(check_rows.index)
+
+
+def test_compact_model_below_min_agreement_is_refused(tmp_path, df_clean):
+    entry = read_manifest()['rfc']
+    shutil.copy(os.path.join(MODEL_DIR, entry['file']), tmp_path)
+    args = argparse.Namespace(min_agreement=0.999, prune_agreement=0.5)
+
+    file_name, report = compact_entry(
+        'rfc', entry, str(tmp_path), df_clean, args
+    )
+    assert file_name is None
+    assert report['agreement'] < args.min_agreement
+    assert report['checked_rows'] == len(df_clean) // 2
+    assert os.listdir(tmp_path) == [entry['file']]
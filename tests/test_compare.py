@@ -0,0 +1,52 @@
+# tests reach into the internals they check
+# pylint: disable=protected-access
+import numpy as np
+import pytest
+
+from util_funcs.compare import _majority_vote, compare_models
+from util_funcs.registry import get_registry
+from util_funcs.synthetic import make_customers
+from util_funcs.pre_process import clean_file_data
+
+NAMES = ['dtc', 'gaus', 'log_reg', 'xgb']
+
+
+@pytest.fixture(name='df_clean', scope='module')
+def fixture_df_clean():
+    return clean_file_data(make_customers(500, seed=13))
+
+
+def test_majority_vote_and_agreement():
+    votes = np.array([[1, 1, 0], [0, 0, 1], [1, 1, 1], [0, 0, 0]])
+    majority, agreement = _majority_vote(votes)
+    assert majority.tolist() == [1, 0, 1, 0]
+    np.testing.assert_allclose(agreement, [2 / 3, 2 / 3, 1, 1])
+
+
+def test_ties_vote_zero():
+    votes = np.array([[1, 1, 0, 0], [0, 1, 0, 1], [1, 1, 1, 0], [0, 0, 0, 0]])
+    majority, agreement = _majority_vote(votes)
+    assert majority.tolist() == [0, 0, 1, 0]
+    np.testing.assert_allclose(agreement, [0.5, 0.5, 0.75, 1])
+
+
+@pytest.mark.parametrize('max_workers', [None, 4])
+def test_comparison_summarises_each_model(df_clean, max_workers):
+    registry = get_registry()
+    models = {name: registry.get(name) for name in NAMES}
+    scores, timings = compare_models(models, df_clean, max_workers)
+
+    assert set(timings) == {'encode', *NAMES}
+    for name in NAMES:
+        assert scores[f'Probability_{name}'].between(0, 1).all()
+    votes = scores[[f'Prediction_{name}' for name in NAMES]].to_numpy()
+    majority = scores['Majority_Vote'].to_numpy()
+    assert majority.tolist() == (votes.mean(axis=1) > 0.5).tolist()
+    agreeing = (votes == majority[:, None]).mean(axis=1)
+    np.testing.assert_allclose(scores['Agreement'], agreeing)
+    assert (scores['Agreement'] >= 0.5).all()
+
+
+def test_comparison_needs_a_model(df_clean):
+    with pytest.raises(ValueError, match='At least one model'):
+        compare_models({}, df_clean)
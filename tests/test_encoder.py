@@ -0,0 +1,36 @@
+import numpy as np
+import pytest
+from sklearn.feature_extraction import DictVectorizer
+
+from util_funcs.encoder import FeatureEncoder
+from util_funcs.synthetic import make_customers
+from util_funcs.pre_process import FILE_REFERENCE_DATE, clean_data
+
+
+@pytest.fixture(name='cleaned')
+def fixture_cleaned():
+    df = make_customers(300, seed=5, missing_income=0.2)
+    # a value the vectorizer never saw is dropped by both
+    df.loc[3, 'Education'] = 'Unknown'
+    return clean_data(df, FILE_REFERENCE_DATE, impute_income=None)
+
+
+@pytest.fixture(name='vectorizer')
+def fixture_vectorizer(cleaned):
+    records = cleaned.iloc[10:].to_dict('records')
+    return DictVectorizer(sparse=False).fit(records)
+
+
+def test_frames_encode_like_the_vectorizer(cleaned, vectorizer):
+    expected = vectorizer.transform(cleaned.to_dict('records'))
+    X = FeatureEncoder(vectorizer).transform(cleaned)
+    assert X.dtype == expected.dtype
+    assert np.isnan(X).any()
+    assert X.tobytes() == expected.tobytes()
+
+
+def test_records_encode_like_the_vectorizer(cleaned, vectorizer):
+    encoder = FeatureEncoder(vectorizer)
+    for record in cleaned.to_dict('records'):
+        expected = vectorizer.transform([record])
+        assert encoder.transform_record(record).tobytes() == expected.tobytes()
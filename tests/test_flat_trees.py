@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+from xgboost import XGBClassifier
+
+from util_funcs.encoder import encode, get_encoder
+from util_funcs.registry import get_registry
+from util_funcs.synthetic import make_customers
+from util_funcs.flat_trees import flatten_model
+from util_funcs.pre_process import clean_file_data
+
+
+@pytest.fixture(name='df_clean', scope='module')
+def fixture_df_clean():
+    return clean_file_data(make_customers(3000, seed=4))
+
+
+def with_missing(X, share, seed):
+    X = np.array(X, dtype=np.float32)
+    X[np.random.default_rng(seed).random(X.shape) < share] = np.nan
+    return X
+
+
+def assert_same_predictions(estimator, forest, X):
+    assert np.array_equal(forest.predict(X), estimator.predict(X))
+    np.testing.assert_allclose(
+        forest.predict_proba(X), estimator.predict_proba(X), atol=1e-6
+    )
+
+
+@pytest.mark.parametrize('name', ['dtc', 'rfc', 'gbc', 'xgb'])
+def test_flat_forest_predicts_like_the_estimator(df_clean, name):
+    model = get_registry().get(name)
+    _, estimator = get_encoder(model)
+    assert_same_predictions(
+        estimator, flatten_model(model), encode(model, df_clean)
+    )
+
+
+def test_flat_xgboost_follows_the_missing_branches(df_clean):
+    model = get_registry().get('xgb')
+    _, estimator = get_encoder(model)
+    X = with_missing(encode(model, df_clean), 0.2, seed=5)
+    assert_same_predictions(estimator, flatten_model(model), X)
+
+
+def test_flat_xgboost_trained_with_missing_values(df_clean):
+    model = get_registry().get('xgb')
+    X = with_missing(encode(model, df_clean), 0.3, seed=6)
+    y = np.random.default_rng(7).integers(0, 2, len(X))
+    estimator = XGBClassifier(n_estimators=20, max_depth=4).fit(X, y)
+    assert_same_predictions(estimator, flatten_model(estimator), X)
@@ -0,0 +1,107 @@
+# tests reach into the internals they check
+# pylint: disable=protected-access
+import pandas as pd
+import pytest
+
+from util_funcs import jobs
+from util_funcs.jobs import DONE, FAILED, RUNNING, JobQueue
+from util_funcs.synthetic import make_customers
+from util_funcs.validation import REASON_COLUMN
+
+
+@pytest.fixture(name='customer_file')
+def fixture_customer_file(tmp_path):
+    df = make_customers(450, seed=9)
+    # two customers far too old to be scored
+    df.loc[[30, 320], 'Year_Birth'] = 1800
+    path = tmp_path / 'customers.csv'
+    df.to_csv(path, index=False)
+    return str(path)
+
+
+def run_job(jobs_dir, customer_file):
+    """Score a file in a fresh queue and wait for the job to end"""
+    queue = JobQueue(str(jobs_dir), workers=1, chunksize=100)
+    job_id = queue.submit(customer_file)
+    queue._pool.shutdown(wait=True)
+    return queue, job_id
+
+
+def read_bytes(path):
+    with open(path, 'rb') as f_in:
+        return f_in.read()
+
+
+def assert_same_output(queue, job_id, reference, reference_id):
+    for path in ['result_path', 'rejects_path']:
+        assert read_bytes(getattr(queue, path)(job_id)) == read_bytes(
+            getattr(reference, path)(reference_id)
+        )
+    state, expected = queue.status(job_id), reference.status(reference_id)
+    for key in ['rows_done', 'rows_rejected', 'positives', 'bytes_written']:
+        assert state[key] == expected[key]
+
+
+def test_rejected_rows_are_kept_apart(tmp_path, customer_file):
+    queue, job_id = run_job(tmp_path / 'jobs', customer_file)
+    state = queue.status(job_id)
+    assert state['status'] == DONE
+    assert state['rows_done'] == 448
+    assert state['rows_rejected'] == 2
+
+    predictions = pd.read_csv(queue.result_path(job_id))
+    rejects = pd.read_csv(queue.rejects_path(job_id))
+    assert len(predictions) == 448
+    assert set(predictions['Prediction']) <= {0, 1}
+    assert rejects['ID'].tolist() == [30, 320]
+    assert rejects[REASON_COLUMN].str.contains('Year_Birth').all()
+    assert state['positives'] == int(predictions['Prediction'].sum())
+
+
+def test_interrupted_job_resumes_with_the_same_output(
+    tmp_path, customer_file, monkeypatch
+):
+    reference, reference_id = run_job(tmp_path / 'reference', customer_file)
+
+    # the job dies while scoring its third chunk
+    calls, fail_at = [], [3]
+    score_chunk = jobs.score_chunk
+
+    def counted_score_chunk(*args):
+        calls.append(args)
+        if len(calls) in fail_at:
+            raise RuntimeError('interrupted')
+        return score_chunk(*args)
+
+    monkeypatch.setattr(jobs, 'score_chunk', counted_score_chunk)
+    queue, job_id = run_job(tmp_path / 'jobs', customer_file)
+    state = queue.status(job_id)
+    assert state['status'] == FAILED
+    assert state['chunks_done'] == 2
+
+    # as if the process was killed mid chunk, after a partial write
+    state['status'] = RUNNING
+    queue._save(state)
+    with open(queue.result_path(job_id), 'ab') as f_out:
+        f_out.write(b'partial row,')
+
+    calls.clear()
+    fail_at.clear()
+    resumed = JobQueue(str(tmp_path / 'jobs'), workers=1, chunksize=100)
+    resumed._pool.shutdown(wait=True)
+    state = resumed.status(job_id)
+    assert state['status'] == DONE
+    # only the chunks after the checkpoint were scored again
+    assert len(calls) == 3
+    assert_same_output(resumed, job_id, reference, reference_id)
+
+
+@pytest.mark.parametrize(
+    'job_id', ['..', '../jobs', '0123456789ab/..', 'ABCDEF012345', 'abc']
+)
+def test_job_ids_outside_the_format_are_refused(tmp_path, job_id):
+    queue = JobQueue(str(tmp_path / 'jobs'), workers=1)
+    with pytest.raises(ValueError, match='Invalid job ID'):
+        queue.status(job_id)
+    with pytest.raises(ValueError, match='Invalid job ID'):
+        queue.result_path(job_id)
@@ -0,0 +1,75 @@
+# tests reach into the internals they check
+# pylint: disable=protected-access
+import pytest
+
+from util_funcs import metrics
+from util_funcs.metrics import MetricsRegistry, timed
+
+
+@pytest.fixture(name='registry')
+def fixture_registry(monkeypatch):
+    registry = MetricsRegistry()
+    monkeypatch.setattr(metrics, '_registry', registry)
+    monkeypatch.setattr(metrics, '_enabled', False)
+    return registry
+
+
+def test_prometheus_text(registry):
+    registry.observe('clean', 0.003, rows=10, rss_delta=2048)
+    registry.observe('clean', 0.2, rows=5, rss_delta=-4096)
+    registry.observe('encode', 20.0)
+    lines = registry.to_prometheus().splitlines()
+
+    assert lines[:2] == [
+        '# HELP scoring_stage_seconds Time spent in each scoring stage.',
+        '# TYPE scoring_stage_seconds histogram',
+    ]
+    buckets = [line for line in lines if 'stage="clean",le=' in line]
+    assert len(buckets) == len(metrics.BUCKETS)
+    assert 'scoring_stage_seconds_bucket{stage="clean",le="0.0025"} 0' in lines
+    assert 'scoring_stage_seconds_bucket{stage="clean",le="0.005"} 1' in lines
+    assert 'scoring_stage_seconds_bucket{stage="clean",le="0.1"} 1' in lines
+    assert 'scoring_stage_seconds_bucket{stage="clean",le="0.25"} 2' in lines
+    assert buckets[-1] == (
+        'scoring_stage_seconds_bucket{stage="clean",le="+Inf"} 2'
+    )
+    assert 'scoring_stage_seconds_bucket{stage="encode",le="10.0"} 0' in lines
+    assert 'scoring_stage_seconds_bucket{stage="encode",le="+Inf"} 1' in lines
+    assert f'scoring_stage_seconds_sum{{stage="clean"}} {0.203!r}' in lines
+    assert 'scoring_stage_seconds_count{stage="clean"} 2' in lines
+    assert 'scoring_stage_rows_total{stage="clean"} 15' in lines
+    assert 'scoring_stage_rows_total{stage="encode"} 0' in lines
+    # memory given back is not counted as negative growth
+    assert 'scoring_stage_rss_growth_bytes_total{stage="clean"} 2048' in lines
+    assert '# TYPE scoring_stage_rows_total counter' in lines
+    assert registry.to_prometheus().endswith('\n')
+
+
+def test_disabled_timers_record_nothing(registry):
+    @timed('decorated', rows=len)
+    def stage():
+        return [1, 2, 3]
+
+    with timed('block', rows=4) as timer:
+        pass
+    assert stage() == [1, 2, 3]
+    assert timer._start is None
+    assert not registry.summary()
+
+
+def test_enabled_timers_record_calls_and_rows(registry):
+    metrics.enable()
+
+    @timed('decorated', rows=len)
+    def stage():
+        return [1, 2, 3]
+
+    with timed('block') as timer:
+        timer.rows = 4
+    stage()
+    stage()
+    summary = {row['stage']: row for row in registry.summary()}
+    assert summary['block']['calls'] == 1
+    assert summary['block']['rows'] == 4
+    assert summary['decorated']['calls'] == 2
+    assert summary['decorated']['rows'] == 6
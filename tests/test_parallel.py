@@ -0,0 +1,43 @@
+# tests reach into the internals they check
+# pylint: disable=protected-access
+import numpy as np
+import pytest
+
+from util_funcs.encoder import encode, get_encoder
+from util_funcs.parallel import ScoringEngine
+from util_funcs.registry import get_registry
+from util_funcs.synthetic import make_customers
+from util_funcs.pre_process import clean_file_data
+
+
+@pytest.fixture(name='rows', scope='module')
+def fixture_rows():
+    model = get_registry().get('xgb')
+    X = encode(model, clean_file_data(make_customers(1000, seed=8)))
+    _, estimator = get_encoder(model)
+    return X, estimator.predict(X)
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_sharded_predictions_keep_the_row_order(rows, workers):
+    X, expected = rows
+    engine = ScoringEngine('xgb', workers=workers, shard_size=97)
+    try:
+        assert np.array_equal(engine.predict_encoded(X), expected)
+        assert len(engine.predict_encoded(X[:0])) == 0
+    finally:
+        engine.shutdown()
+
+
+def test_pool_restarts_when_the_model_version_changes(monkeypatch):
+    registry = get_registry()
+    engine = ScoringEngine('xgb', workers=2)
+    pool = engine._get_pool()
+    assert engine._get_pool() is pool
+
+    monkeypatch.setattr(registry, 'version', lambda name: 'new-version')
+    restarted = engine._get_pool()
+    assert restarted is not pool
+    assert engine._version == 'new-version'
+    assert pool._shutdown_thread
+    engine.shutdown()
@@ -0,0 +1,71 @@
+import io
+from datetime import datetime
+
+import pandas as pd
+import pytest
+
+from util_funcs import pre_process
+from util_funcs.readers import read_customer_file
+from util_funcs.synthetic import make_customers
+
+
+def step_by_step(df):
+    """The cleaning of customer files before it was fused into one pass"""
+    df = df.copy()
+    df['Year_Birth'] = pd.to_datetime(df['Year_Birth'], format='%Y')
+    df['Dt_Customer'] = pd.to_datetime(df['Dt_Customer'])
+    df['Age'] = 2014 - df['Year_Birth'].dt.year
+    df['Age_Group'] = pd.cut(
+        df['Age'],
+        bins=pre_process.bins,
+        labels=pre_process.labels,
+        right=False,
+    )
+    df['Tenure'] = (datetime(2014, 6, 30) - df['Dt_Customer']).dt.days
+    df['Tenure'] = (df['Tenure'] / 30.44).round(1)
+    df['Spending'] = df[pre_process.spend_cols].sum(axis=1)
+    df['Marital_Status'] = df['Marital_Status'].replace(
+        pre_process.marital_status
+    )
+    df['Education'] = df['Education'].replace(pre_process.education_level)
+    df['Children'] = df['Kidhome'] + df['Teenhome']
+    df['Income'] = df['Income'].fillna(df['Income'].mean())
+    categorical = pre_process.categorical_ftrs
+    df[categorical] = df[categorical].astype('category')
+    redundant = [
+        col for col in pre_process.redundant_features if col in df.columns
+    ]
+    return df.drop(columns=redundant)
+
+
+@pytest.fixture(name='customers')
+def fixture_customers():
+    return make_customers(500, seed=4, missing_income=0.1)
+
+
+def test_file_cleaning_matches_the_step_by_step_pipeline(customers):
+    pd.testing.assert_frame_equal(
+        pre_process.clean_file_data(customers), step_by_step(customers)
+    )
+
+
+def test_narrow_dtypes_clean_to_the_same_values(customers):
+    source = io.BytesIO(customers.to_csv(index=False).encode())
+    source.name = 'customers.csv'
+    df = read_customer_file(source)
+    pd.testing.assert_frame_equal(
+        pre_process.clean_file_data(df),
+        step_by_step(customers),
+        check_dtype=False,
+        check_categorical=False,
+    )
+
+
+def test_form_records_clean_like_one_row_frames(customers):
+    reference_date = pre_process.FILE_REFERENCE_DATE
+    cleaned = pre_process.clean_data(
+        customers, reference_date, impute_income=None
+    )
+    for i, record in enumerate(customers.head(50).to_dict('records')):
+        features = pre_process.clean_form_record(record, reference_date)
+        assert features == cleaned.iloc[[i]].to_dict('records')[0]
@@ -0,0 +1,80 @@
+import numpy as np
+import pytest
+
+from util_funcs.prediction_cache import PredictionCache
+
+
+def test_row_keys_follow_values_and_version():
+    X = np.random.default_rng(0).integers(0, 5, (20_000, 26)).astype(float)
+    keys = PredictionCache.row_keys('xgb:1', X)
+    assert len(keys) == len(X)
+    assert len(set(keys)) == len(np.unique(X, axis=0))
+    assert keys == PredictionCache.row_keys('xgb:1', X.astype(np.float32))
+    assert keys[:5] == PredictionCache.row_keys('xgb:1', X[:5].copy())
+    assert not set(keys) & set(PredictionCache.row_keys('xgb:2', X))
+
+
+def test_row_keys_ignore_zero_signs_and_nan_payloads():
+    X = np.array([[0.0, np.nan, 1.0]])
+    same = np.array([[-0.0, -np.nan, 1.0]])
+    assert PredictionCache.row_keys('v', X) == PredictionCache.row_keys(
+        'v', same
+    )
+
+
+@pytest.mark.parametrize(
+    'X',
+    [
+        np.array([[{'Income': 1.0}]], dtype=object),
+        np.array([['1.0', '2.0']]),
+        np.zeros(3),
+    ],
+)
+def test_row_keys_reject_non_numeric_matrices(X):
+    with pytest.raises(TypeError):
+        PredictionCache.row_keys('v', X)
+
+
+def counting(calls):
+    def predict_fn(X):
+        calls.append(len(X))
+        return X[:, 0] * 2
+
+    return predict_fn
+
+
+def test_distinct_rows_are_scored_once_then_hit_memory():
+    cache = PredictionCache(db_path=None)
+    X = np.array([[1.0, 0.0], [2.0, 0.0], [1.0, 0.0]])
+    calls = []
+
+    first, first_hits = cache.predict('xgb', '1', X, counting(calls))
+    second, second_hits = cache.predict('xgb', '1', X, counting(calls))
+
+    np.testing.assert_array_equal(first, [2.0, 4.0, 2.0])
+    np.testing.assert_array_equal(second, first)
+    assert calls == [2]
+    assert (first_hits, second_hits) == (0, 3)
+    stats = cache.stats()
+    assert (stats['misses'], stats['memory_hits'], stats['disk_hits']) == (
+        3,
+        3,
+        0,
+    )
+    assert stats['hit_rate'] == 0.5
+
+
+def test_new_versions_miss_and_the_disk_tier_survives_restarts(tmp_path):
+    db_path = str(tmp_path / 'predictions.sqlite')
+    X = np.array([[1.0, 0.0], [2.0, 0.0]])
+    calls = []
+    PredictionCache(db_path=db_path).predict('xgb', '1', X, counting(calls))
+
+    cache = PredictionCache(db_path=db_path)
+    assert cache.predict('xgb', '1', X, counting(calls))[1] == 2
+    assert calls == [2]
+    assert cache.stats()['disk_hits'] == 2
+
+    cache.predict('xgb', '2', X, counting(calls))
+    assert calls == [2, 2]
+    assert cache.stats()['misses'] == 2
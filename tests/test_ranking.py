@@ -0,0 +1,105 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from util_funcs.ranking import (
+    TopK,
+    SegmentedTopK,
+    top_positions,
+    rank_customers,
+)
+from util_funcs.registry import get_registry
+from util_funcs.synthetic import make_customers
+
+
+def scored_rows(n_rows, seed, segments=('a', 'b', 'c')):
+    """Rows with few distinct probabilities, so the cut-offs tie"""
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame(
+        {
+            'Probability': rng.integers(0, 6, n_rows) / 5,
+            '_order': np.arange(n_rows),
+            'Segment': rng.choice(list(segments), n_rows),
+        }
+    )
+
+
+def full_sort(rows):
+    return rows.sort_values(
+        ['Probability', '_order'], ascending=[False, True], kind='stable'
+    )
+
+
+def push_chunks(selection, rows, chunk_rows):
+    for start in range(0, len(rows), chunk_rows):
+        selection.push(rows.iloc[start : start + chunk_rows])
+    return selection.result()
+
+
+@pytest.mark.parametrize('k', [0, 1, 17, 100, 500])
+def test_top_positions_take_the_first_of_tied_rows(k):
+    rows = scored_rows(300, seed=k)
+    # shuffled positions, ties are broken by order and not by position
+    rows = rows.sample(frac=1, random_state=k)
+    positions = top_positions(
+        rows['Probability'].to_numpy(), rows['_order'].to_numpy(), k
+    )
+    assert sorted(rows['_order'].iloc[positions]) == sorted(
+        full_sort(rows)['_order'].head(k)
+    )
+
+
+@pytest.mark.parametrize('chunk_rows', [1, 7, 64, 1000])
+@pytest.mark.parametrize('k', [1, 25, 300])
+def test_chunked_top_k_matches_a_full_sort(chunk_rows, k):
+    rows = scored_rows(400, seed=1)
+    result = push_chunks(TopK(k), rows, chunk_rows)
+    pd.testing.assert_frame_equal(result, full_sort(rows).head(k))
+
+
+@pytest.mark.parametrize('chunk_rows', [5, 64, 1000])
+def test_segment_quotas_cap_each_segment(chunk_rows):
+    rows = scored_rows(400, seed=2)
+    quotas = {'a': 3, 'b': 40}
+    result = push_chunks(SegmentedTopK(30, 'Segment', quotas), rows, chunk_rows)
+
+    per_segment = [
+        full_sort(segment_rows).head(quotas.get(segment, 30))
+        for segment, segment_rows in rows.groupby('Segment')
+    ]
+    expected = full_sort(pd.concat(per_segment)).head(30)
+    pd.testing.assert_frame_equal(result, expected)
+    counts = result['Segment'].value_counts()
+    assert counts['a'] == 3
+    assert len(result) == 30
+
+
+@pytest.fixture(name='customer_file')
+def fixture_customer_file(tmp_path):
+    path = tmp_path / 'customers.csv'
+    make_customers(1000, seed=12).to_csv(path, index=False)
+    return str(path)
+
+
+@pytest.mark.parametrize(
+    'segment_column, quotas',
+    [(None, None), ('Education', {'Undergraduate': 2})],
+)
+def test_ranking_in_chunks_matches_the_whole_file(
+    customer_file, segment_column, quotas
+):
+    model = get_registry().get('xgb')
+    whole = rank_customers(
+        customer_file, model, 60, segment_column, quotas, chunksize=10**6
+    )
+    chunked = rank_customers(
+        customer_file, model, 60, segment_column, quotas, chunksize=77
+    )
+    # categories of the input columns depend on the chunks they came in
+    pd.testing.assert_frame_equal(
+        chunked, whole, check_dtype=False, check_categorical=False
+    )
+    assert whole['Rank'].tolist() == list(range(1, 61))
+    assert whole['Probability'].is_monotonic_decreasing
+    if quotas:
+        assert (whole['Segment'] == 'Undergraduate').sum() == 2
@@ -0,0 +1,65 @@
+import io
+
+import numpy as np
+import pytest
+
+from util_funcs.readers import read_customer_file, iter_customer_chunks
+from util_funcs.synthetic import make_customers
+
+
+def csv_file(df):
+    buffer = io.BytesIO()
+    df.to_csv(buffer, index=False)
+    buffer.seek(0)
+    buffer.name = 'customers.csv'
+    return buffer
+
+
+@pytest.mark.parametrize('with_missing', [False, True])
+def test_ids_above_float32_precision_are_exact(with_missing):
+    df = make_customers(10)
+    df['ID'] = np.arange(123_456_789, 123_456_799)
+    if with_missing:
+        # forces the float64 retry of the integer columns
+        df['Kidhome'] = df['Kidhome'].astype(float)
+        df.loc[3, 'Kidhome'] = np.nan
+
+    read = read_customer_file(csv_file(df))
+
+    assert read['ID'].dtype == np.int64
+    assert read['ID'].tolist() == df['ID'].tolist()
+
+
+def test_ids_above_int32_are_not_wrapped():
+    df = make_customers(3)
+    df['ID'] = [5_000_000_000, 4_294_967_297, 7]
+
+    read = read_customer_file(csv_file(df))
+
+    assert read['ID'].tolist() == [5_000_000_000, 4_294_967_297, 7]
+
+
+def test_values_overflowing_narrow_dtypes_are_kept():
+    df = make_customers(3)
+    df.loc[1, 'MntWines'] = 40_000
+    df.loc[2, 'Recency'] = 70_000
+
+    read = read_customer_file(csv_file(df))
+
+    assert read.loc[1, 'MntWines'] == 40_000
+    assert read.loc[2, 'Recency'] == 70_000
+    # columns that fit are still narrowed
+    assert read['Kidhome'].dtype == np.int8
+
+
+def test_chunks_match_whole_file():
+    df = make_customers(1_000)
+    df.loc[500, 'MntFruits'] = 100_000
+
+    whole = read_customer_file(csv_file(df))
+    chunks = list(iter_customer_chunks(csv_file(df), chunksize=300))
+
+    assert sum(len(chunk) for chunk in chunks) == len(whole)
+    for col in ['ID', 'MntFruits', 'Income']:
+        values = np.concatenate([chunk[col].to_numpy() for chunk in chunks])
+        np.testing.assert_array_equal(values, whole[col].to_numpy())
@@ -0,0 +1,121 @@
+# tests reach into the internals they check
+# pylint: disable=protected-access
+import os
+import json
+import pickle
+import shutil
+import threading
+
+import pytest
+from sklearn.base import clone
+
+from util_funcs.registry import (
+    MODEL_DIR,
+    ModelRegistry,
+    file_checksum,
+    read_manifest,
+)
+
+
+@pytest.fixture(name='registry')
+def fixture_registry(tmp_path):
+    model_dir = tmp_path / 'models'
+    model_dir.mkdir()
+    entries = {
+        name: entry
+        for name, entry in read_manifest().items()
+        if name in ('gaus', 'log_reg')
+    }
+    for entry in entries.values():
+        shutil.copy(os.path.join(MODEL_DIR, entry['file']), model_dir)
+    manifest_path = model_dir / 'manifest.json'
+    manifest_path.write_text(json.dumps({'models': entries}))
+    return ModelRegistry(str(manifest_path), str(tmp_path / 'mmap'))
+
+
+def test_altered_mmap_copies_are_written_again(registry):
+    registry.get('log_reg')
+    mmap_path = registry._mmap_path('log_reg', registry.entry('log_reg'))
+    with open(mmap_path, 'r+b') as f_out:
+        f_out.seek(-8, os.SEEK_END)
+        f_out.write(b'\0' * 8)
+
+    fresh = ModelRegistry(registry.manifest_path, registry.mmap_dir)
+    assert hasattr(fresh.get('log_reg'), 'predict')
+    assert ModelRegistry._mmap_copy_is_valid(mmap_path)
+
+
+def test_altered_pickles_are_refused(registry):
+    registry.get('gaus')
+    model_path = os.path.join(registry.model_dir, 'gaus.pkl')
+    with open(model_path, 'ab') as f_out:
+        f_out.write(b'\0')
+
+    fresh = ModelRegistry(registry.manifest_path, registry.mmap_dir)
+    with pytest.raises(ValueError, match='Checksum mismatch'):
+        fresh.get('gaus')
+
+
+def test_a_slow_load_does_not_block_other_models(registry, monkeypatch):
+    started, release = threading.Event(), threading.Event()
+    load = registry._load
+
+    def slow_load(name, entry):
+        if name == 'gaus':
+            started.set()
+            release.wait(10)
+        return load(name, entry)
+
+    monkeypatch.setattr(registry, '_load', slow_load)
+    thread = threading.Thread(target=registry.get, args=('gaus',))
+    thread.start()
+    try:
+        assert started.wait(10)
+        assert hasattr(registry.get('log_reg'), 'predict')
+        assert registry.version('gaus')
+    finally:
+        release.set()
+        thread.join()
+    assert hasattr(registry.get('gaus'), 'predict')
+
+
+def edit_manifest(registry, name, **changes):
+    with open(registry.manifest_path, 'r', encoding='utf-8') as f_in:
+        manifest = json.load(f_in)
+    manifest['models'][name].update(changes)
+    with open(registry.manifest_path, 'w', encoding='utf-8') as f_out:
+        json.dump(manifest, f_out)
+    # the registry notices changes by mtime, make sure this one moves
+    stat = os.stat(registry.manifest_path)
+    os.utime(
+        registry.manifest_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9)
+    )
+
+
+def test_manifest_checksum_mismatches_are_refused(registry):
+    edit_manifest(registry, 'gaus', sha256='0' * 64)
+    with pytest.raises(ValueError, match='Checksum mismatch'):
+        registry.get('gaus')
+    assert not os.path.exists(registry.mmap_dir) or not any(
+        path.startswith('gaus') for path in os.listdir(registry.mmap_dir)
+    )
+
+
+def test_changed_model_files_get_a_new_mmap_copy(registry):
+    old_path = registry._mmap_path('gaus', registry.entry('gaus'))
+    model = registry.get('gaus')
+    assert os.path.exists(old_path)
+
+    # retrained in place, under the same file name
+    retrained = clone(model).set_params(gaussiannb__var_smoothing=1e-3)
+    retrained.fit([{'Income': 1.0}, {'Income': 2.0}], [0, 1])
+    model_path = os.path.join(registry.model_dir, 'gaus.pkl')
+    with open(model_path, 'wb') as f_out:
+        pickle.dump(retrained, f_out)
+    edit_manifest(registry, 'gaus', sha256=file_checksum(model_path))
+
+    swapped = registry.get('gaus')
+    new_path = registry._mmap_path('gaus', registry.entry('gaus'))
+    assert new_path != old_path
+    assert ModelRegistry._mmap_copy_is_valid(new_path)
+    assert swapped[-1].var_smoothing == retrained[-1].var_smoothing
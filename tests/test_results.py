@@ -0,0 +1,92 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from util_funcs.results import (
+    n_pages,
+    page_rows,
+    row_order,
+    positive_ids,
+    segment_summary,
+)
+
+
+@pytest.fixture(name='scored')
+def fixture_scored():
+    return pd.DataFrame(
+        {
+            'ID': [10, 11, 12, 13, 14, 15, 16],
+            'Income': [30.0, np.nan, 10.0, 20.0, 10.0, np.nan, 50.0],
+            'Prediction': [1, 0, 1, 1, 0, 1, 0],
+        },
+        # a scored upload keeps the index of the rows that passed
+        index=[0, 2, 3, 5, 6, 7, 9],
+    )
+
+
+def test_row_order_sorts_with_missing_values_last(scored):
+    ascending = scored['ID'].iloc[row_order(scored, 'Income')]
+    assert ascending.tolist() == [12, 14, 13, 10, 16, 11, 15]
+    descending = scored['ID'].iloc[row_order(scored, 'Income', False)]
+    assert descending.tolist() == [16, 10, 13, 12, 14, 11, 15]
+
+
+def test_row_order_filters_on_the_prediction(scored):
+    assert scored['ID'].iloc[row_order(scored)].tolist() == list(range(10, 17))
+    accepted = row_order(scored, 'Income', prediction=1)
+    assert scored['ID'].iloc[accepted].tolist() == [12, 13, 10, 15]
+    assert len(row_order(scored, prediction=2)) == 0
+
+
+@pytest.mark.parametrize(
+    'page, ids',
+    [(1, [12, 14, 13]), (2, [10, 16, 11]), (3, [15]), (4, [])],
+)
+def test_pages_end_with_a_partial_and_then_no_page(scored, page, ids):
+    positions = row_order(scored, 'Income')
+    assert page_rows(scored, positions, page, 3)['ID'].tolist() == ids
+
+
+def test_page_count():
+    assert n_pages(0, 25) == 1
+    assert n_pages(25, 25) == 1
+    assert n_pages(26, 25) == 2
+
+
+def test_segment_summary_groups_missing_segments():
+    segments = pd.DataFrame(
+        {
+            'Education': pd.Categorical(
+                ['Undergraduate', 'Postgraduate', None, 'Postgraduate']
+            ),
+            'Age_Group': ['18-29', '18-29', '30-39', '18-29'],
+        }
+    )
+    summary = segment_summary([1, 0, 1, 1], segments, by=['Education'])
+    assert summary.to_dict('records') == [
+        {
+            'Education': 'Postgraduate',
+            'Customers': 2,
+            'Likely to accept': 1,
+            'Acceptance rate': 0.5,
+        },
+        {
+            'Education': 'Undergraduate',
+            'Customers': 1,
+            'Likely to accept': 1,
+            'Acceptance rate': 1.0,
+        },
+        {
+            'Education': 'Unknown',
+            'Customers': 1,
+            'Likely to accept': 1,
+            'Acceptance rate': 1.0,
+        },
+    ]
+    by_two = segment_summary([1, 0, 1, 1], segments, ['Age_Group', 'Education'])
+    assert by_two['Customers'].sum() == 4
+    assert len(by_two) == 3
+
+
+def test_positive_ids(scored):
+    assert positive_ids(scored) == 'ID\n10\n12\n13\n15\n'
@@ -0,0 +1,115 @@
+import multiprocessing
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from util_funcs.synthetic import make_customers
+from util_funcs.pre_process import clean_file_data
+from util_funcs.segment_cube import (
+    SegmentCube,
+    get_cube,
+    update_cube,
+    submit_update,
+)
+
+
+@pytest.fixture(name='cube_path')
+def fixture_cube_path(tmp_path):
+    path = str(tmp_path / 'data' / 'segment_cube.npz')
+    SegmentCube().add(clean_file_data(make_customers(200, seed=1))).save(path)
+    return path
+
+
+def scored_batch(start, n_rows, seed):
+    df = make_customers(n_rows, seed=seed)
+    df['ID'] = np.arange(start, start + n_rows)
+    predictions = np.random.default_rng(seed).integers(0, 2, n_rows)
+    return clean_file_data(df), predictions, df['ID']
+
+
+def test_rescored_customers_replace_their_rows(cube_path):
+    df_clean, predictions, ids = scored_batch(0, 100, seed=2)
+    once = update_cube(df_clean, predictions, ids, cube_path).query()
+    twice = update_cube(df_clean, predictions, ids, cube_path).query()
+    assert once['customers'] == twice['customers']
+
+    flipped = update_cube(df_clean, 1 - predictions, ids, cube_path).query()
+    assert flipped['customers'] == once['customers']
+    assert flipped['predicted_rate'] == pytest.approx(
+        1 - once['predicted_rate']
+    )
+
+
+def test_updates_survive_a_reload(cube_path):
+    update_cube(*scored_batch(0, 100, seed=2), path=cube_path)
+    cube = SegmentCube.load(cube_path)
+    assert cube.arrays['scored'].sum() == len(cube.scored) > 0
+    for name, values in get_cube(cube_path).arrays.items():
+        np.testing.assert_array_equal(values, cube.arrays[name])
+
+
+def test_deltas_match_a_cube_built_from_the_last_scores():
+    first = scored_batch(0, 100, seed=2)
+    second = scored_batch(50, 100, seed=3)
+    cube = SegmentCube().add_scored(*first).add_scored(*second)
+
+    # customers 50-99 were scored again, their second score counts
+    df_clean, predictions, ids = first
+    last = pd.concat([df_clean[:50], second[0]], ignore_index=True)
+    rebuilt = SegmentCube().add_scored(
+        last,
+        np.concatenate([predictions[:50], second[1]]),
+        np.concatenate([ids[:50], second[2]]),
+    )
+    assert sorted(cube.scored.index) == sorted(rebuilt.scored.index)
+    for name, values in rebuilt.arrays.items():
+        np.testing.assert_allclose(cube.arrays[name], values, atol=1e-6)
+
+
+def test_only_the_last_scored_ids_are_remembered():
+    cube = SegmentCube(max_scored=50)
+    for start in [0, 30, 60]:
+        cube.add_scored(*scored_batch(start, 30, seed=start))
+    assert cube.scored.index.tolist() == list(range(40, 90))
+    # forgotten customers stay in the totals
+    assert cube.arrays['scored'].sum() == 90
+
+    cube.add_scored(*scored_batch(60, 30, seed=1))
+    assert cube.arrays['scored'].sum() == 90
+
+
+def test_background_updates_match_synchronous_ones(cube_path, tmp_path):
+    other_path = str(tmp_path / 'other.npz')
+    SegmentCube.load(cube_path).save(other_path)
+    batches = [scored_batch(start, 40, seed=start) for start in [0, 20, 40]]
+
+    futures = [submit_update(*batch, path=cube_path) for batch in batches]
+    for future in futures:
+        future.result()
+    for batch in batches:
+        update_cube(*batch, path=other_path)
+
+    expected = SegmentCube.load(other_path)
+    for name, values in get_cube(cube_path).arrays.items():
+        np.testing.assert_allclose(values, expected.arrays[name])
+
+
+def _update(args):
+    path, start = args
+    for seed in range(3):
+        update_cube(*scored_batch(start, 50, seed), path=path)
+
+
+def test_concurrent_updates_are_not_lost(cube_path):
+    starts = [0, 1_000, 2_000, 3_000]
+    context = multiprocessing.get_context('fork')
+    with context.Pool(len(starts)) as pool:
+        pool.map(_update, [(cube_path, start) for start in starts])
+    # every process ends with the batch of its last seed
+    expected = SegmentCube()
+    for start in starts:
+        expected.add_scored(*scored_batch(start, 50, seed=2))
+    cube = SegmentCube.load(cube_path)
+    assert sorted(cube.scored.index) == sorted(expected.scored.index)
+    assert cube.arrays['scored'].sum() == len(expected.scored)
@@ -0,0 +1,56 @@
+# tests reach into the internals they check
+# pylint: disable=protected-access
+import json
+import asyncio
+
+import numpy as np
+
+from util_funcs.server import MicroBatcher, ScoringServer
+from util_funcs.synthetic import make_customers
+
+
+class Writer:
+    def __init__(self):
+        self.data = b''
+        self.closed = False
+
+    def write(self, data):
+        self.data += data
+
+    async def drain(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+
+def test_missing_incomes_do_not_depend_on_the_batch():
+    batcher = MicroBatcher('xgb', income_mean=52_000.0)
+    customers = make_customers(50, seed=1, missing_income=0.2)
+    others = make_customers(50, seed=2)
+    others['Income'] *= 3
+
+    alone = batcher._score([customers])
+    together = batcher._score([customers, others])
+    for values, batched in zip(alone, together):
+        np.testing.assert_array_equal(values, batched[: len(customers)])
+
+
+def test_malformed_content_length_is_a_bad_request():
+    async def send(request):
+        reader = asyncio.StreamReader()
+        reader.feed_data(request)
+        reader.feed_eof()
+        writer = Writer()
+        server = ScoringServer(MicroBatcher('xgb', income_mean=52_000.0))
+        await server.handle(reader, writer)
+        return writer
+
+    writer = asyncio.run(
+        send(b'POST /predict HTTP/1.1\r\nContent-Length: twelve\r\n\r\n{}')
+    )
+    head, _, body = writer.data.partition(b'\r\n\r\n')
+    assert head.startswith(b'HTTP/1.1 400 Bad Request')
+    assert b'Connection: close' in head
+    assert 'Content-Length' in json.loads(body)['error']
+    assert writer.closed
@@ -0,0 +1,109 @@
+import os
+import json
+import pickle
+
+import numpy as np
+import pytest
+
+from util_funcs import train
+from util_funcs.train import (
+    search,
+    write_models,
+    search_spaces,
+    _best_candidate,
+    encode_training_data,
+)
+from util_funcs.synthetic import make_customers
+from util_funcs.pre_process import clean_file_data
+
+MODELS = ['dtc', 'gaus']
+
+
+@pytest.fixture(name='source', scope='module')
+def fixture_source(tmp_path_factory):
+    df = make_customers(600, seed=10)
+    # a response the trees can learn, recent customers answer
+    df['Response'] = (df['Recency'] < 20).astype(int)
+    path = tmp_path_factory.mktemp('train') / 'campaign.csv'
+    df.to_csv(path, index=False)
+    return str(path)
+
+
+@pytest.fixture(name='searched', scope='module')
+def fixture_searched(source, tmp_path_factory):
+    data_path = encode_training_data(source, str(tmp_path_factory.mktemp('c')))
+    results, _ = search(data_path, MODELS, folds=3, workers=2)
+    return data_path, results
+
+
+def test_cache_is_keyed_by_the_encoding_code(source, tmp_path, monkeypatch):
+    cache_dir = str(tmp_path)
+    data_path = encode_training_data(source, cache_dir)
+    assert encode_training_data(source, cache_dir) == data_path
+
+    monkeypatch.setattr(train, 'encoding_checksum', lambda: 'f' * 64)
+    changed_path = encode_training_data(source, cache_dir)
+    assert changed_path != data_path
+    assert sorted(os.listdir(cache_dir)) == sorted(
+        os.path.basename(path) for path in [data_path, changed_path]
+    )
+
+
+def test_best_candidate_prefers_the_first_of_ties():
+    grid = [{'C': 1}, {'C': 2}, {'C': 3}]
+    fold = {'f1': 0.5, 'roc_auc': 0.5, 'accuracy': 0.5}
+    better = dict(fold, f1=0.8)
+    runs = [
+        [(fold, 1.0), (fold, 1.0)],
+        [(better, 2.0), (better, 2.0)],
+        [(better, 3.0), (better, 3.0)],
+    ]
+    best = _best_candidate(grid, runs, 'f1')
+    assert best['params'] == {'C': 2}
+    assert best['metrics']['f1'] == {'mean': 0.8, 'std': 0.0}
+    assert best['candidates'] == 3
+    assert best['search_fit_s'] == 12.0
+
+
+def test_search_refits_the_best_parameters(searched):
+    data_path, results = searched
+    X = np.load(os.path.join(data_path, 'X.npy'))
+    y = np.load(os.path.join(data_path, 'y.npy'))
+    for name in MODELS:
+        result = results[name]
+        grid = search_spaces[name][1]
+        assert result['candidates'] == np.prod([len(v) for v in grid.values()])
+        assert result['estimator'].get_params().items() >= (
+            result['params'].items()
+        )
+        assert set(result['metrics']) == set(train.METRICS)
+        assert len(result['estimator'].predict(X)) == len(y)
+    # the trees find the recency rule on every fold
+    assert results['dtc']['metrics']['f1']['mean'] > 0.95
+
+
+def test_manifest_records_each_written_model(searched, tmp_path):
+    data_path, results = searched
+    manifest_path = str(tmp_path / 'manifest.json')
+    kept = {'file': 'svc.pkl', 'version': '3', 'sha256': '0' * 64}
+    with open(manifest_path, 'w', encoding='utf-8') as f_out:
+        json.dump({'models': {'svc': kept, 'dtc': {'version': '4'}}}, f_out)
+
+    manifest = write_models(results, data_path, manifest_path, {'rows': 1})
+    with open(manifest_path, 'r', encoding='utf-8') as f_in:
+        assert json.load(f_in) == manifest
+    assert manifest['models']['svc'] == kept
+    assert manifest['training'] == {'rows': 1}
+    assert manifest['models']['dtc']['version'] == '5'
+    assert manifest['models']['gaus']['version'] == '1'
+
+    df_clean = clean_file_data(make_customers(50, seed=11))
+    for name in MODELS:
+        entry = manifest['models'][name]
+        assert entry['params'] == results[name]['params']
+        assert entry['timings']['candidates'] == results[name]['candidates']
+        path = tmp_path / entry['file']
+        assert entry['sha256'] == train.file_checksum(str(path))
+        with open(path, 'rb') as f_in:
+            pipeline = pickle.load(f_in)
+        assert len(pipeline.predict(df_clean.to_dict('records'))) == 50
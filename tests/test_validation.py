@@ -0,0 +1,49 @@
+import pandas as pd
+import pytest
+
+from util_funcs.synthetic import count_limits, make_customers
+from util_funcs.validation import (
+    REASON_COLUMN,
+    ValidationError,
+    value_ranges,
+    validate_customers,
+)
+
+
+def test_every_failed_check_is_a_reason():
+    df = make_customers(10, seed=6).astype({'Income': object})
+    df.loc[1, 'Recency'] = 500
+    df.loc[2, 'Education'] = 'Kindergarten'
+    df.loc[3, 'Dt_Customer'] = 'yesterday'
+    df.loc[4, 'Income'] = 'a lot'
+    df.loc[5, ['Complain', 'Year_Birth']] = [2, 2010]
+    df.loc[6, 'Income'] = None
+
+    valid, rejects = validate_customers(df)
+
+    assert valid['ID'].tolist() == [0, 6, 7, 8, 9]
+    assert rejects[REASON_COLUMN].to_dict() == {
+        1: 'Recency is above 110',
+        2: 'Education is not a known value',
+        3: 'Dt_Customer is not a date',
+        4: 'Income is not a number',
+        5: 'Complain is not 0 or 1; Year_Birth gives an age outside 18-120',
+    }
+    # rejected rows are returned as they were read
+    pd.testing.assert_frame_equal(
+        rejects.drop(columns=REASON_COLUMN), df.loc[[1, 2, 3, 4, 5]]
+    )
+
+
+def test_missing_columns_reject_the_whole_file():
+    df = make_customers(3).drop(columns=['Recency', 'Dt_Customer'])
+    with pytest.raises(ValidationError, match='Dt_Customer, Recency'):
+        validate_customers(df)
+
+
+def test_synthetic_customers_pass_validation():
+    for col, limit in count_limits.items():
+        assert limit - 1 <= value_ranges[col][1]
+    valid, rejects = validate_customers(make_customers(2000, seed=7))
+    assert rejects.empty
+    assert len(valid) == 2000
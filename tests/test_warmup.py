@@ -0,0 +1,52 @@
+import pytest
+
+from util_funcs import warmup
+from util_funcs.registry import get_registry
+
+
+class RecordingRegistry:
+    """The process registry, recording the models asked for"""
+
+    def __init__(self, names, broken=()):
+        self._names = names
+        self.broken = broken
+        self.loaded = []
+
+    def names(self):
+        return list(self._names)
+
+    def get(self, name):
+        self.loaded.append(name)
+        if name in self.broken:
+            raise ValueError(f"Checksum mismatch for model '{name}'")
+        return get_registry().get(name)
+
+
+@pytest.fixture(name='recording')
+def fixture_recording(monkeypatch):
+    def install(names, broken=()):
+        registry = RecordingRegistry(names, broken)
+        monkeypatch.setattr(warmup, 'get_registry', lambda: registry)
+        return registry
+
+    return install
+
+
+def test_page_models_are_warmed_up_first(recording):
+    registry = recording(['gaus', 'log_reg', 'xgb', 'dtc'])
+    assert not warmup.warm_up()
+    assert registry.loaded == ['dtc', 'xgb', 'gaus', 'log_reg']
+
+
+def test_requested_names_keep_the_page_models_first(recording):
+    registry = recording(['dtc', 'gaus', 'log_reg', 'xgb'])
+    assert not warmup.warm_up(['log_reg', 'xgb'])
+    assert registry.loaded == ['xgb', 'log_reg']
+
+
+def test_a_failing_model_does_not_stop_the_others(recording):
+    registry = recording(['gaus', 'xgb', 'dtc'], broken={'xgb'})
+    errors = warmup.warm_up()
+    assert registry.loaded == ['dtc', 'xgb', 'gaus']
+    assert list(errors) == ['xgb']
+    assert 'Checksum mismatch' in str(errors['xgb'])